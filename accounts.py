@@ -0,0 +1,353 @@
+"""
+Several MT5 accounts traded from one process tree.
+
+config.json lists the accounts under "accounts"; each entry has a name, its own
+"details" (account, password, server, webhook_url and optionally terminal_path)
+and any config sections to override for that account, e.g.
+
+    "accounts": [
+        {"name": "deriv-1", "details": {...}, "trading_config": {"symbols": ["EURJPY", "GBPJPY"]}},
+        {"name": "deriv-2", "details": {...}, "engine": {"status_port": 8800}}
+    ]
+
+Every account gets its own terminal worker process, TradeEngine, bots, databases
+(under engine.data_dir/<name>) and notification webhook. The timer, market status
+and thread manager are shared, and accounts on the same trade server share that
+server's market data (ServerMarketData).
+"""
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+
+import mt5utilities as util
+from core import TradeEngine, InspireTraders
+from market_snapshot import MarketSnapshotWriter
+from mt5api import mt5
+from scheduler import BrokerClock, timeframe_seconds
+from session_boxes import SessionBoxes
+
+
+# last_error() codes of the MetaTrader5 package for a terminal that cannot be reached
+IPC_NO_CONNECTION = -10004
+IPC_TIMEOUT = -10005
+
+
+def _serve(conn, sim=None):
+    """Worker process: run the terminal calls received on `conn` and send back (ok, result or exception)."""
+    from mt5api import mt5
+    if sim is not None:
+        mt5.reset(**sim)
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+        name, args, kwargs = request
+        try:
+            reply = (True, getattr(mt5, name)(*args, **kwargs))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            conn.send((False, RuntimeError(f"Result of {name} could not be sent back: {e}")))
+    try:
+        mt5.shutdown()
+    except Exception:
+        pass
+
+
+class TerminalWorker:
+    """
+    One account's MT5 terminal, called from its own process.
+
+    The MetaTrader5 package attaches a process to a single terminal, so the terminal
+    calls of each account run in a small worker process holding only the terminal
+    binding, while the engines, bots and timers of all accounts share the parent.
+    A worker is passed to MT5Connector as its terminal: functions are forwarded over
+    a pipe one call at a time, constants are read from the local module. A worker
+    that died or stopped answering makes last_error() report an IPC error, which
+    MT5Connector handles as a lost connection; the reconnect's initialize() starts
+    a new worker.
+    """
+
+    def __init__(self, name, path=None, sim=None, timeout=60, logger=None):
+        self.name = name
+        self.path = path  # This account's terminal64.exe, passed to initialize()
+        self.sim = sim  # sim_mt5.reset() settings when the worker runs the simulated broker
+        self.timeout = timeout
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.process = None
+        self.conn = None
+        self.error = None  # Set while the worker cannot be reached
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        value = getattr(mt5, name)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+
+        setattr(self, name, call)
+        return call
+
+    def start(self):
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        self._stop_process()
+        context = multiprocessing.get_context('spawn')
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child, self.sim), name=f"Terminal-{self.name}", daemon=True)
+        self.process.start()
+        child.close()
+        self.error = None
+        self.logger.info(f"Terminal worker for {self.name} started (pid {self.process.pid}).")
+
+    def call(self, name, *args, **kwargs):
+        """Run one terminal function in the worker; None (see last_error()) if the worker cannot be reached."""
+        if name == 'last_error' and self.error is not None:
+            return self.error
+        if name == 'initialize' and self.path and not args and 'path' not in kwargs:
+            kwargs['path'] = self.path
+        with self._lock:
+            if self.process is None or not self.process.is_alive():
+                if name != 'initialize':
+                    self.error = (IPC_NO_CONNECTION, f"Terminal worker for {self.name} is not running")
+                    return None
+                self._start()
+            try:
+                self.conn.send((name, args, kwargs))
+                if not self.conn.poll(self.timeout):
+                    self.logger.error(f"Terminal worker for {self.name} did not answer {name} in {self.timeout}s, stopping it.")
+                    self._stop_process()
+                    self.error = (IPC_TIMEOUT, f"Terminal worker for {self.name} timed out")
+                    return None
+                ok, value = self.conn.recv()
+            except (EOFError, OSError) as e:
+                self.error = (IPC_NO_CONNECTION, f"Terminal worker for {self.name} is gone: {e}")
+                return None
+            self.calls += 1
+            self.error = None
+        if not ok:
+            raise value
+        return value
+
+    def stop(self, timeout=5):
+        with self._lock:
+            self._stop_process(timeout)
+
+    def _stop_process(self, timeout=5):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+        self.conn.close()
+        self.process, self.conn = None, None
+
+
+class ServerMarketData:
+    """
+    Market data of one trade server, shared by the engines of every account on it:
+    the broker clock, session boxes, the shared memory feed and the bars each symbol
+    was seeded with. Prices are the server's, so a symbol's history is pulled by one
+    account and published by one bot, however many accounts trade it.
+    """
+
+    def __init__(self, server, symbols, timeframes, terminal=None, snapshot_name=None, snapshot_bars=500, logger=None):
+        self.server = server
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.broker_clock = BrokerClock(symbols[:3], logger=self.logger, terminal=terminal)
+        self.market_snapshot = None
+        if snapshot_name:
+            try:
+                self.market_snapshot = MarketSnapshotWriter(snapshot_name, symbols, timeframes, capacity=snapshot_bars, logger=self.logger)
+            except OSError as e:
+                self.logger.error(f"Shared market snapshot of {server} disabled: {e}")
+        self.feed_owners = {}  # symbol -> engine whose bot publishes it
+        self.states = {}  # (symbol, timeframes) -> BarAggregator.state() of the last bot seeded
+        self.boxes = {}  # sessions (JSON) -> SessionBoxes
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def session_boxes(self, sessions):
+        """The SessionBoxes of these session windows; engines with the same windows share one cache."""
+        key = json.dumps(sessions, sort_keys=True)
+        with self._lock:
+            if key not in self.boxes:
+                self.boxes[key] = SessionBoxes(sessions, clock=self.broker_clock, logger=self.logger)
+            return self.boxes[key]
+
+    def claim_feed(self, symbol, owner):
+        """True if `owner` publishes `symbol` to the feed: the first engine to ask does, from then on."""
+        with self._lock:
+            return self.feed_owners.setdefault(symbol, owner) is owner
+
+    def seeding(self, symbol):
+        """Held while a bot seeds `symbol`, so bots of several accounts starting together pull its history once."""
+        with self._lock:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def bars(self, symbol, timeframes):
+        """Bars of `symbol` published by a bot with these timeframes (BarAggregator.state()), or None."""
+        return self.states.get((symbol, tuple(sorted(timeframes))))
+
+    def publish(self, symbol, state):
+        self.states[(symbol, tuple(sorted(state)))] = state
+
+    def close(self):
+        if self.market_snapshot is not None:
+            self.market_snapshot.close()
+            self.market_snapshot = None
+
+
+class Account:
+    def __init__(self, name, config, connector, messenger, inspirer, logger):
+        self.name = name
+        self.config = config
+        self.connector = connector
+        self.messenger = messenger
+        self.inspirer = inspirer
+        self.logger = logger
+        self.engine = None
+
+
+class AccountManager:
+    """
+    Runs one TradeEngine per account of config['accounts'] in this process, on a shared
+    timer, market status and thread manager. Each account's terminal runs in its own
+    TerminalWorker (or whatever `terminal_factory(name, details)` returns, e.g. a
+    sim_mt5.SimBroker), and its databases live under its own data_dir.
+    """
+
+    def __init__(self, config, market_status, thread_manager, timer_service, logger, inspirer_file='inspirer1.json', terminal_factory=None):
+        self.config = config
+        self.market_status = market_status
+        self.thread_manager = thread_manager
+        self.timer_service = timer_service
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.inspirer_file = inspirer_file
+        self.terminal_factory = terminal_factory if terminal_factory else self.terminal_worker
+        self.accounts = []
+        self.servers = {}  # server -> ServerMarketData
+        self.workers = []
+
+        for index, entry in enumerate(self.config['accounts']):
+            self.accounts.append(self.build_account(entry, index))
+        self.build_servers()
+        for account in self.accounts:
+            account.engine = TradeEngine(mt5_connector=account.connector,
+                                         market_status=self.market_status,
+                                         config=account.config,
+                                         messenger=account.messenger,
+                                         inspirer=account.inspirer,
+                                         logger=account.logger,
+                                         thread_manager=self.thread_manager,
+                                         timer_service=self.timer_service,
+                                         market_data=self.servers[account.connector.server])
+        self.logger.info("-------------------------------------------------")
+        self.logger.info(f"AccountManager initialized: {len(self.accounts)} account(s) on {len(self.servers)} server(s).")
+
+    def terminal_worker(self, name, details):
+        worker = TerminalWorker(name, path=details.get('terminal_path'), sim=details.get('sim'), logger=self.logger.getChild(name))
+        self.workers.append(worker)
+        return worker
+
+    def account_config(self, entry, index):
+        """The base config with the account's sections merged over it, plus its own data_dir and status port."""
+        config = copy.deepcopy({key: value for key, value in self.config.items() if key != 'accounts'})
+        for section, values in entry.items():
+            if section == 'name':
+                continue
+            if isinstance(values, dict) and isinstance(config.get(section), dict):
+                config[section].update(copy.deepcopy(values))
+            else:
+                config[section] = copy.deepcopy(values)
+        name = entry.get('name') or str(config['details']['account'])
+        base_engine = self.config.get('engine', {})
+        own_engine = entry.get('engine', {})
+        engine = config.setdefault('engine', {})
+        if 'data_dir' not in own_engine:
+            engine['data_dir'] = os.path.join(base_engine.get('data_dir') or 'accounts', name)
+        if 'status_port' not in own_engine and base_engine.get('status_port', 8765):
+            engine['status_port'] = base_engine.get('status_port', 8765) + index
+        timeframe = config['trading_config']['timeframe']
+        if isinstance(timeframe, str):
+            config['trading_config']['timeframe'] = getattr(mt5, timeframe)
+        return name, config
+
+    def build_account(self, entry, index):
+        name, config = self.account_config(entry, index)
+        details = config['details']
+        logger = self.logger.getChild(name)
+        connector = util.MT5Connector(account=details['account'], password=details['password'], server=details['server'],
+                                      logger=logger, terminal=self.terminal_factory(name, details))
+        messenger = util.Messenger(details['webhook_url'], logger=logger)
+        inspirer = InspireTraders(messenger, self.inspirer_file, None, logger=logger)
+        return Account(name, config, connector, messenger, inspirer, logger)
+
+    def build_servers(self):
+        """One ServerMarketData per trade server, covering the symbols and timeframes of all its accounts."""
+        by_server = {}
+        for account in self.accounts:
+            by_server.setdefault(account.connector.server, []).append(account)
+        snapshot_name = self.config.get('engine', {}).get('snapshot_name', 'tracy_feed')
+        for server, accounts in by_server.items():
+            symbols, timeframes = [], {mt5.TIMEFRAME_M1, mt5.TIMEFRAME_H1}
+            for account in accounts:
+                symbols += [symbol for symbol in account.config['trading_config']['symbols'] if symbol not in symbols]
+                timeframes.add(account.config['trading_config']['timeframe'])
+            self.servers[server] = ServerMarketData(
+                server, symbols, sorted(timeframes, key=timeframe_seconds), terminal=accounts[0].connector.mt5,
+                snapshot_name=f"{snapshot_name}_{re.sub(r'[^0-9A-Za-z]+', '_', server).lower()}" if snapshot_name else None,
+                snapshot_bars=self.config.get('engine', {}).get('snapshot_bars', 500), logger=self.logger)
+            self.logger.info(f"{server}: {len(accounts)} account(s), {len(symbols)} symbol(s).")
+
+    @property
+    def engines(self):
+        return [account.engine for account in self.accounts]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        for account in self.accounts:
+            account.engine.start()
+            account.inspirer.schedule_messages(self.timer_service)
+        self.logger.info("-------------------------------------------------")
+        self.logger.info(f"AccountManager started {len(self.accounts)} engine(s).")
+
+    def status(self):
+        return {account.name: account.engine.status() for account in self.accounts}
+
+    def stop(self):
+        for account in self.accounts:
+            account.engine.stop_bots()
+            account.engine.bar_scheduler.stop()
+            account.engine.stop_status_server()
+            account.inspirer.cancel_messages(self.timer_service)
+            if account.connector.is_connected:
+                account.connector.disconnect()
+        for market_data in self.servers.values():
+            market_data.close()
+        for worker in self.workers:
+            worker.stop()
+        self.logger.info("-------------------------------------------------")
+        self.logger.info("AccountManager stopped all accounts.")
@@ -0,0 +1,508 @@
+from mt5api import mt5
+import logging
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from scheduler import timeframe_seconds
+
+
+BAR_FIELDS = ('time', 'open', 'high', 'low', 'close', 'tick_volume')
+
+
+def ticks_after(ticks, cursor):
+    """
+    Split off the ticks that come after `cursor`.
+    The cursor is (time_msc, ticks already seen at that millisecond), which stays
+    exact when several ticks share a millisecond. Returns (new ticks, advanced cursor);
+    a None cursor accepts every tick.
+    """
+    if not len(ticks):
+        return ticks, cursor
+    times = ticks['time_msc']
+    cursor_msc, seen = cursor if cursor is not None else (None, 0)
+    if cursor_msc is not None:
+        first = int(np.searchsorted(times, cursor_msc, side='left'))
+        at_cursor = int(np.searchsorted(times, cursor_msc, side='right')) - first
+        ticks = ticks[first + min(seen, at_cursor):]
+        if not len(ticks):
+            return ticks, cursor
+    last = int(ticks['time_msc'][-1])
+    at_last = len(ticks) - int(np.searchsorted(ticks['time_msc'], last, side='left'))
+    return ticks, (last, seen + at_last if last == cursor_msc else at_last)
+
+
+class BarSeries:
+    """Closed bars of one timeframe in preallocated ring arrays, plus the bar still forming."""
+
+    def __init__(self, timeframe, capacity):
+        self.timeframe = timeframe
+        self.period = timeframe_seconds(timeframe)
+        self.capacity = capacity
+        self.time = np.zeros(capacity, dtype=np.int64)
+        self.open = np.zeros(capacity)
+        self.high = np.zeros(capacity)
+        self.low = np.zeros(capacity)
+        self.close = np.zeros(capacity)
+        self.tick_volume = np.zeros(capacity, dtype=np.int64)
+        self.count = 0  # Closed bars held (at most capacity)
+        self.next = 0  # Ring slot the next closed bar is written to
+        self.total = 0  # Closed bars appended so far; bar number n is held in slot n % capacity
+        self.forming = None  # [time, open, high, low, close, tick_volume]
+        self.ranges = None  # RangeIndex, built on the first range query
+
+    @classmethod
+    def from_rates(cls, timeframe, rates, capacity=None):
+        """Series holding an MT5 rates array (or DataFrame, or dict of columns), e.g. history loaded for a backtest."""
+        held = len(rates['time'])
+        series = cls(timeframe, capacity or max(held, 1))
+        count = min(held, series.capacity)
+        for field in BAR_FIELDS:
+            getattr(series, field)[:count] = np.asarray(rates[field])[held - count:]
+        series.count = series.total = count
+        series.next = count % series.capacity
+        return series
+
+    def append(self, bar):
+        i = self.next
+        self.time[i], self.open[i], self.high[i], self.low[i], self.close[i], self.tick_volume[i] = bar
+        self.next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.total += 1
+
+    def extend(self, time, open, high, low, close, tick_volume):
+        """Append many closed bars at once (arrays, oldest first)."""
+        n = len(time)
+        keep = min(n, self.capacity)
+        slots = (self.next + n - keep + np.arange(keep)) % self.capacity
+        for field, values in zip(BAR_FIELDS, (time, open, high, low, close, tick_volume)):
+            getattr(self, field)[slots] = np.asarray(values)[n - keep:]
+        self.next = (self.next + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+        self.total += n
+
+    def frame(self, first, count):
+        """DataFrame of `count` closed bars starting `first` bars after the oldest held."""
+        import pandas as pd
+        idx = (self.next - self.count + first + np.arange(count)) % self.capacity
+        return pd.DataFrame({
+            'time': self.time[idx],
+            'open': self.open[idx],
+            'high': self.high[idx],
+            'low': self.low[idx],
+            'close': self.close[idx],
+            'tick_volume': self.tick_volume[idx],
+        })
+
+    def values(self, field, count):
+        """The last `count` closed values of one field ('close', 'high', ...) as an array, oldest first."""
+        count = min(count, self.count)
+        idx = (self.next - count + np.arange(count)) % self.capacity
+        return getattr(self, field)[idx]
+
+    def stamp(self):
+        """Changes whenever a bar closes (or the series is reseeded)."""
+        return (self.count, int(self.time[(self.next - 1) % self.capacity]))
+
+    def latest(self, count, offset=1):
+        """
+        Bars as copy_rates_from_pos(start_pos=offset, count) would return them, oldest
+        first: position 0 is the forming bar, 1 the last closed one. None if not held.
+        """
+        include_forming = offset == 0 and self.forming is not None
+        closed = count - 1 if include_forming else count
+        skip = max(offset - 1, 0)
+        if closed + skip > self.count:
+            return None
+        data = self.frame(self.count - skip - closed, closed)
+        if include_forming:
+            data.loc[len(data)] = self.forming
+        return data
+
+    def window(self, start, end):
+        """Closed bars opening in [start, end) (server time, epoch seconds), oldest first."""
+        if not self.count:
+            return None
+        data = self.frame(0, self.count)
+        data = data[(data['time'] >= start) & (data['time'] < end)]
+        return data.reset_index(drop=True)
+
+    def position(self, when):
+        """Number of the first held bar opening at or after `when` (server time, epoch seconds)."""
+        low, high = self.total - self.count, self.total
+        while low < high:
+            middle = (low + high) // 2
+            if self.time[middle % self.capacity] < when:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def extrema(self, first, end):
+        """High/low/close extremes of bars number [first, end); None unless all of them are held."""
+        if self.ranges is None:
+            self.ranges = RangeIndex(self)
+        return self.ranges.extrema(first, end)
+
+    def window_extrema(self, start, end):
+        """extrema() of the closed bars opening in [start, end) server time; None if there are none."""
+        first, last = self.position(start), self.position(end)
+        return self.extrema(first, last) if last > first else None
+
+
+class RangeIndex:
+    """
+    Sparse tables over a BarSeries for range extremes in O(1): row k holds, for
+    every bar j, the highest high, lowest low and highest/lowest close of bars
+    j .. j + 2**k - 1, so any range is covered by two overlapping rows. Columns
+    use the series' ring slots and the tables are extended lazily, one vectorized
+    pass per row for the bars closed since the last query. Rows go up to spans of
+    `max_span` bars (a day by default); longer ranges are reduced directly.
+    """
+
+    TABLES = (('high', 'high', np.maximum), ('low', 'low', np.minimum),
+              ('close_high', 'close', np.maximum), ('close_low', 'close', np.minimum))
+
+    def __init__(self, series, max_span=None):
+        self.series = series
+        max_span = max_span or 86400 // series.period
+        self.levels = max(min(max_span, series.capacity).bit_length(), 1)
+        self.tables = {name: np.zeros((self.levels, series.capacity)) for name, _, _ in self.TABLES}
+        self.indexed = 0  # Bars taken into the tables (bar numbers below this)
+
+    def update(self):
+        series = self.series
+        total, capacity = series.total, series.capacity
+        if self.indexed == total:
+            return
+        oldest = total - series.count
+        start = max(self.indexed, oldest)
+        new = np.arange(start, total) % capacity
+        for name, field, reduce in self.TABLES:
+            table = self.tables[name]
+            table[0, new] = getattr(series, field)[new]
+            for k in range(1, self.levels):
+                # Spans of 2**k bars that end on a new bar
+                first, last = max(start - (1 << k) + 1, oldest), total - (1 << k)
+                if last < first:
+                    break
+                slots = np.arange(first, last + 1)
+                table[k, slots % capacity] = reduce(table[k - 1, slots % capacity], table[k - 1, (slots + (1 << (k - 1))) % capacity])
+        self.indexed = total
+
+    def extrema(self, first, end):
+        series = self.series
+        if end <= first or first < series.total - series.count or end > series.total:
+            return None
+        self.update()
+        k = min((end - first).bit_length() - 1, self.levels - 1)
+        result = {'bars': end - first}
+        if end - first > 2 << k:
+            # Longer than the tables cover
+            slots = np.arange(first, end) % series.capacity
+            for name, field, reduce in self.TABLES:
+                result[name] = float(reduce.reduce(getattr(series, field)[slots]))
+            return result
+        a, b = first % series.capacity, (end - (1 << k)) % series.capacity
+        for name, _, reduce in self.TABLES:
+            result[name] = float(reduce(self.tables[name][k, a], self.tables[name][k, b]))
+        return result
+
+    def extrema_many(self, firsts, ends):
+        """extrema() of many ranges at once (arrays of bar numbers); NaN where a range is not held or too long."""
+        series = self.series
+        self.update()
+        firsts = np.asarray(firsts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        lengths = ends - firsts
+        valid = (lengths > 0) & (firsts >= series.total - series.count) & (ends <= series.total)
+        k = np.floor(np.log2(np.maximum(lengths, 1))).astype(np.int64)
+        valid &= k < self.levels
+        k = np.minimum(k, self.levels - 1)
+        a = firsts % series.capacity
+        b = (ends - (1 << k)) % series.capacity
+        result = {'bars': np.where(valid, lengths, 0)}
+        for name, _, reduce in self.TABLES:
+            table = self.tables[name]
+            result[name] = np.where(valid, reduce(table[k, a], table[k, b]), np.nan)
+        return result
+
+
+class BarAggregator:
+    """
+    Builds rolling OHLC bars for one symbol from the tick stream.
+
+    Ticks are grouped into M1 bars with numpy; every higher timeframe is derived
+    from closed M1 bars, so only M1 history is ever fetched (once, to seed).
+    A bar closes when the first tick of a later bar arrives, when its last minute
+    closes, or when advance() is called past its end, and each closed bar is
+    announced to the listeners as listener(symbol, timeframe, bar).
+    Times are broker server time, like the bars MT5 returns.
+    """
+
+    def __init__(self, symbol, timeframes=(), capacity=2000, seed_bars=30, max_age=120, clock=None, logger=None):
+        self.symbol = symbol
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.seed_bars = seed_bars  # Bars of the longest timeframe to seed from history
+        self.max_age = max_age  # Bars are served only if ticks were taken in within this many seconds
+        self.clock = clock  # Optional BrokerClock; otherwise server time is estimated from the ticks
+        self.series = {}
+        for timeframe in sorted({mt5.TIMEFRAME_M1, *timeframes}, key=timeframe_seconds):
+            series = BarSeries(timeframe, capacity)
+            if series.period % 60:
+                raise ValueError(f"Timeframe {timeframe} is not a whole number of minutes")
+            self.series[timeframe] = series
+        self.base = self.series[mt5.TIMEFRAME_M1]
+        self.derived = [s for tf, s in self.series.items() if tf != mt5.TIMEFRAME_M1]
+        self.listeners = []
+        self.cursor = None  # Last tick taken in, see ticks_after()
+        self.last_price = None
+        self.updated_at = None
+        self.offset = None  # server epoch - local epoch, estimated from tick times
+
+    # ------------------------------------------------------------------
+    # Input
+    # ------------------------------------------------------------------
+
+    def load_history(self, mt5_connector):
+        """
+        Seed every timeframe from M1 history, aligned to the longest timeframe.
+        Returns the server time (ms) from which ticks should be fed, or None on failure.
+        """
+        tick = mt5_connector.call('symbol_info_tick', self.symbol)
+        if tick is None:
+            self.logger.warning(f"Cannot seed bars for {self.symbol}: no current tick.")
+            return None
+        now = tick.time_msc // 1000
+        longest = max(s.period for s in self.series.values())
+        start = (now // longest - self.seed_bars) * longest
+        current_minute = now // 60 * 60
+        rates = mt5_connector.call('copy_rates_range', self.symbol, mt5.TIMEFRAME_M1,
+                                   datetime.fromtimestamp(start, tz=timezone.utc),
+                                   datetime.fromtimestamp(current_minute - 60, tz=timezone.utc))
+        if rates is None:
+            error_code, error_message = mt5_connector.mt5.last_error()
+            self.logger.error(f"Failed to seed bars for {self.symbol}. Error code: {error_code}, message: '{error_message}'")
+            return None
+        self.seed(rates)
+        self.logger.info(f"Seeded bars for {self.symbol} from {len(rates)} M1 bars.")
+        return self._resume(now, current_minute)
+
+    def _resume(self, now, current_minute):
+        """Take ticks from the start of the current minute; returns that time (ms)."""
+        self.cursor = (current_minute * 1000, 0)
+        self.offset = now - time.time()
+        self.updated_at = time.time()
+        return current_minute * 1000
+
+    def state(self, count=None):
+        """
+        Copy of the last `count` closed bars of every timeframe and the forming higher-timeframe
+        bars, for warm_start(). Must be taken on the thread that feeds the aggregator.
+        """
+        state = {}
+        for timeframe, series in self.series.items():
+            n = series.count if count is None else min(count, series.count)
+            idx = (series.next - n + np.arange(n)) % series.capacity
+            forming = series.forming if series is not self.base else None  # The minute is fetched again
+            state[timeframe] = {'bars': {field: getattr(series, field)[idx].copy() for field in BAR_FIELDS},
+                                'forming': list(forming) if forming is not None else None}
+        return state
+
+    def warm_start(self, state, mt5_connector):
+        """
+        Seed from a state() saved earlier plus the M1 bars closed since, fetched in one call. The
+        first bar fetched is the last one saved and has to match it (time and close), which checks
+        the saved bars against the broker's history. Returns the time (ms) from which ticks should
+        be fed, as load_history() does, or None when the state cannot be used.
+        """
+        saved = state.get(mt5.TIMEFRAME_M1)
+        if set(state) != set(self.series) or saved is None or not len(saved['bars']['time']):
+            return None
+        last_time, last_close = int(saved['bars']['time'][-1]), float(saved['bars']['close'][-1])
+        tick = mt5_connector.call('symbol_info_tick', self.symbol)
+        if tick is None:
+            return None
+        now = tick.time_msc // 1000
+        current_minute = now // 60 * 60
+        longest = max(s.period for s in self.series.values())
+        if current_minute - last_time > longest * self.seed_bars:
+            return None  # Too old: the tail would be as long as a full seed
+        rates = mt5_connector.call('copy_rates_range', self.symbol, mt5.TIMEFRAME_M1,
+                                   datetime.fromtimestamp(last_time, tz=timezone.utc),
+                                   datetime.fromtimestamp(current_minute - 60, tz=timezone.utc))
+        if rates is None or not len(rates) or int(rates['time'][0]) != last_time \
+                or abs(float(rates['close'][0]) - last_close) > 1e-6 * abs(last_close):
+            self.logger.info(f"Saved bars of {self.symbol} do not match the broker's history.")
+            return None
+        for timeframe, series in self.series.items():
+            bars = state[timeframe]['bars']
+            series.extend(*(bars[field] for field in BAR_FIELDS))
+            series.forming = list(state[timeframe]['forming']) if state[timeframe]['forming'] is not None else None
+        self.seed(rates[1:])
+        self.logger.info(f"Warm started bars for {self.symbol}: {len(saved['bars']['time'])} saved, {len(rates) - 1} new M1 bars.")
+        return self._resume(now, current_minute)
+
+    def seed(self, rates):
+        """
+        Take in closed M1 history (MT5 rates, oldest first) in bulk, without bar events: the M1
+        bars are appended as arrays and each higher timeframe is reduced from them in one pass,
+        continuing its forming bar and leaving its last bar forming when its period is not over,
+        as _merge() would.
+        """
+        if not len(rates):
+            return
+        times = np.asarray(rates['time'], dtype=np.int64)
+        opens, highs, lows, closes = (np.asarray(rates[field], dtype=float) for field in ('open', 'high', 'low', 'close'))
+        volumes = np.asarray(rates['tick_volume'], dtype=np.int64)
+        self.base.extend(times, opens, highs, lows, closes, volumes)
+        for series in self.derived:
+            periods = times // series.period * series.period
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(periods)) + 1))
+            ends = np.append(starts[1:], len(times))
+            bars = (periods[starts], opens[starts], np.maximum.reduceat(highs, starts), np.minimum.reduceat(lows, starts),
+                    closes[ends - 1], np.add.reduceat(volumes, starts))
+            forming = series.forming
+            if forming is not None and forming[0] == bars[0][0]:
+                bars[1][0] = forming[1]
+                bars[2][0] = max(bars[2][0], forming[2])
+                bars[3][0] = min(bars[3][0], forming[3])
+                bars[5][0] += forming[5]
+            elif forming is not None:
+                series.append(forming)
+            # A period closes when the next one starts, or with its last minute
+            closed = len(starts) if times[-1] + 60 >= periods[-1] + series.period else len(starts) - 1
+            series.extend(*(values[:closed] for values in bars))
+            series.forming = None if closed == len(starts) else [int(bars[0][-1]), float(bars[1][-1]), float(bars[2][-1]),
+                                                                 float(bars[3][-1]), float(bars[4][-1]), int(bars[5][-1])]
+
+    def on_ticks(self, ticks, received_at=None):
+        """Take in a batch of ticks (MT5 tick array); ticks already taken in are ignored."""
+        received_at = time.time() if received_at is None else received_at
+        self.updated_at = received_at
+        ticks, self.cursor = ticks_after(ticks, self.cursor)
+        if len(ticks):
+            times = ticks['time_msc']
+            bids = ticks['bid']
+            minutes = times // 60000 * 60
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(minutes)) + 1))
+            ends = np.append(starts[1:], len(bids))
+            highs = np.maximum.reduceat(bids, starts)
+            lows = np.minimum.reduceat(bids, starts)
+            for j in range(len(starts)):
+                self._update_base(int(minutes[starts[j]]), float(bids[starts[j]]), float(highs[j]), float(lows[j]),
+                                  float(bids[ends[j] - 1]), int(ends[j] - starts[j]))
+            self.last_price = float(bids[-1])
+            # Ticks are never stamped in the future, so the freshest sample is the best estimate
+            sample = times[-1] / 1000.0 - received_at
+            self.offset = sample if self.offset is None else max(sample, self.offset)
+        now = self.server_now()
+        if now is not None:
+            self.advance(now)
+
+    def advance(self, server_now):
+        """Close every bar whose period ended by `server_now` (server time, epoch seconds)."""
+        forming = self.base.forming
+        if forming is not None and server_now >= forming[0] + 60:
+            self.base.forming = None
+            self._close(self.base, forming)
+        for series in self.derived:
+            forming = series.forming
+            if forming is not None and server_now >= forming[0] + series.period:
+                series.forming = None
+                self._close(series, forming)
+
+    def _update_base(self, minute, o, h, l, c, volume):
+        forming = self.base.forming
+        if forming is None:
+            series = self.base
+            if series.count and minute <= series.time[(series.next - 1) % series.capacity]:
+                return  # Late tick for a minute advance() already closed
+        else:
+            if minute == forming[0]:
+                forming[2] = max(forming[2], h)
+                forming[3] = min(forming[3], l)
+                forming[4] = c
+                forming[5] += volume
+                return
+            if minute < forming[0]:
+                return  # Late tick for a bar already replaced
+            self._close(self.base, forming)
+        self.base.forming = [minute, o, h, l, c, volume]
+
+    def _close(self, series, bar):
+        series.append(bar)
+        self._emit(series.timeframe, bar)
+        if series is self.base:
+            for higher in self.derived:
+                self._merge(higher, bar)
+
+    def _merge(self, series, bar):
+        """Fold a closed M1 bar into a higher timeframe."""
+        start = bar[0] // series.period * series.period
+        forming = series.forming
+        if forming is not None and forming[0] == start:
+            forming[2] = max(forming[2], bar[2])
+            forming[3] = min(forming[3], bar[3])
+            forming[4] = bar[4]
+            forming[5] += bar[5]
+        else:
+            if forming is not None:
+                series.forming = None
+                self._close(series, forming)
+            series.forming = forming = [start, bar[1], bar[2], bar[3], bar[4], bar[5]]
+        if bar[0] + 60 >= start + series.period:
+            # Last minute of the period: the higher bar is complete
+            series.forming = None
+            self._close(series, forming)
+
+    def _emit(self, timeframe, bar):
+        event = dict(zip(BAR_FIELDS, bar))
+        for listener in self.listeners:
+            try:
+                listener(self.symbol, timeframe, event)
+            except Exception as e:
+                self.logger.error(f"Bar listener failed for {self.symbol}: {e}", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # Output
+    # ------------------------------------------------------------------
+
+    def server_now(self):
+        if self.clock is not None:
+            return self.clock.server_now()
+        return time.time() + self.offset if self.offset is not None else None
+
+    def is_live(self):
+        return self.updated_at is not None and time.time() - self.updated_at <= self.max_age
+
+    def _ready(self, timeframe):
+        if timeframe not in self.series or not self.is_live():
+            return None
+        now = self.server_now()
+        if now is not None:
+            self.advance(now)
+        return self.series[timeframe]
+
+    def closed_series(self, timeframe):
+        """The BarSeries of `timeframe` with every bar that is due closed; None when not available."""
+        return self._ready(timeframe)
+
+    def latest(self, timeframe, count, offset=1):
+        """Local equivalent of copy_rates_from_pos; None when the bars are not available."""
+        series = self._ready(timeframe)
+        return series.latest(count, offset) if series is not None else None
+
+    def window(self, timeframe, start, end):
+        """Closed bars opening in [start, end) server time; None when not available."""
+        series = self._ready(timeframe)
+        return series.window(start, end) if series is not None else None
+
+    def window_extrema(self, timeframe, start, end):
+        """High/low/close extremes of the closed bars opening in [start, end) server time; None when not available."""
+        series = self._ready(timeframe)
+        return series.window_extrema(start, end) if series is not None else None
+
+    def current_price(self):
+        return self.last_price if self.is_live() else None
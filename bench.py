@@ -0,0 +1,390 @@
+"""
+Benchmarks for the engine's hot paths.
+
+Everything runs against the in-process simulated broker (sim_mt5), so the
+suite needs no terminal and no network and runs on Linux CI:
+
+    python bench.py                       # full run
+    python bench.py --quick               # smaller sizes, fewer repeats
+    python bench.py --only reconcile db   # cases whose name contains any of the words
+
+Each run is appended to a JSON lines history file. A case whose median is
+slower than its most recent result at the same size by more than --threshold
+is reported as a regression and the process exits with status 1.
+"""
+import os
+
+# The harness always runs on the simulated broker; set before any project import
+os.environ['TRACY_MT5'] = 'sim'
+
+import argparse
+import json
+import logging
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+
+import sim_mt5
+import mt5utilities as util
+import position as pos
+from bot import Bot
+from db_manager import DatabaseManager
+from stops import StopManager
+from portfolio import Portfolio
+from symbols import SymbolSpecCache
+from bars import BarSeries
+
+
+BOT_SYMBOLS = ['EURUSD', 'GBPUSD', 'USDJPY', 'EURJPY', 'GBPJPY', 'CADJPY', 'AUDUSD', 'USDCAD', 'USDCHF', 'EURGBP']
+
+BOT_PARAMS = dict(timeframe=sim_mt5.TIMEFRAME_M15, from_data=1, to_data=16, lot=0.01, deviation=10,
+                  magic1=360, magic2=361, magic3=362, tp_pips=50, atr_sl_multiplier=1.5, atr_period=14,
+                  max_dist_atr_multiplier=2, trail_atr_multiplier=1, webhook_url='http://127.0.0.1:9/',
+                  pip_range=10)
+
+
+def symbols(count):
+    """Majors first, then generated names, so small runs look like production."""
+    names = BOT_SYMBOLS[:count]
+    names += [f"SIM{i:04d}" for i in range(count - len(names))]
+    return names
+
+
+def summarize(samples, unit):
+    ordered = sorted(samples)
+    return {
+        'median': statistics.median(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'min': ordered[0],
+        'n': len(ordered),
+        'unit': unit,
+    }
+
+
+def timed(func, repeat, warmup=1):
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+class WebhookSink(BaseHTTPRequestHandler):
+    """Local stand-in for the Discord webhook: accepts everything with 204."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Bench:
+    def __init__(self, workdir, quick=False):
+        self.workdir = workdir
+        self.quick = quick
+        self.broker = sim_mt5.reset(seed=7)
+        self.connector = util.MT5Connector(1, 'bench', 'Sim-Server')
+        self.connector.connect()
+
+    def make_bot(self, symbol):
+        bot = Bot(self.connector, None, symbol, **BOT_PARAMS)
+        # Mid-session state: levels known, waiting for a breakout that will not come,
+        # so every cycle runs the full breakout check without trading
+        bot.daily_data_reset = True
+        bot.levels_calculated = True
+        bot.box_calculated = True
+        bot.box = {'buy_level': 1e9, 'sell_level': 0.0, 'buy_stoploss': 0.0, 'sell_stoploss': 1e9, 'box_height': 1e9}
+        return bot
+
+    # ------------------------------------------------------------------
+    # Cases
+    # ------------------------------------------------------------------
+
+    def bot_cycle(self, count):
+        """One run_cycle() of every bot, i.e. the work of one engine minute for `count` symbols."""
+        bots = [self.make_bot(symbol) for symbol in symbols(count)]
+
+        def cycle():
+            for bot in bots:
+                bot.run_cycle()
+
+        return timed(cycle, repeat=3 if self.quick or count >= 500 else 10)
+
+    def reconcile(self, count):
+        bot = self.make_bot('EURUSD')
+        tick = self.broker.symbol_info_tick('EURUSD')
+        positions = {}
+        rows = []
+        for i in range(count):
+            result = self.broker.order_send({'action': sim_mt5.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'volume': 0.01,
+                                             'type': i % 2, 'magic': 360, 'deviation': 1000})
+            position = pos.Position('EURUSD', i % 2, 0.01, 360, 0.0, 0.0, 10, logger=bot.logger,
+                                    database_manager=bot.db_manager)
+            position.ticket_id = result.order
+            position.open_price = result.price
+            positions[result.order] = position
+            rows.append((str(datetime.now()), result.order, 'EURUSD', str(i % 2), tick.ask, 360, 0.01, 0.0, 0.0, 10, 1))
+        with sqlite3.connect(os.path.join(self.workdir, 'trades.db')) as conn:
+            conn.execute('DELETE FROM opened_trade')
+            conn.executemany('INSERT INTO opened_trade(date_time_open, ticket_id, symbol, trade_type, open_price, '
+                             'magic_number, lot, stop_loss, take_profit, deviation, status) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+        def run():
+            bot.positions = dict(positions)
+            bot.reconcile_positions()
+
+        try:
+            return timed(run, repeat=3 if self.quick or count >= 10000 else 10)
+        finally:
+            # Leave the broker flat for the following cases
+            for ticket in positions:
+                self.broker.order_send({'action': sim_mt5.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'position': ticket})
+
+    def stop_pass(self, count):
+        """One StopManager pass over `count` trailed positions none of which needs a modification (the steady state)."""
+        tick = self.broker.symbol_info_tick('EURUSD')
+        tickets = []
+        for i in range(count):
+            result = self.broker.order_send({'action': sim_mt5.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'volume': 0.01,
+                                             'type': i % 2, 'magic': 361, 'deviation': 1000,
+                                             'sl': tick.bid - 0.01 if i % 2 == 0 else tick.ask + 0.01})
+            tickets.append(result.order)
+        manager = StopManager(self.connector, SymbolSpecCache(self.connector, ['EURUSD']))
+        manager.set_trail('EURUSD', 361, 1.0, 0.5)
+        try:
+            return timed(manager.run, repeat=3 if self.quick else 10)
+        finally:
+            for ticket in tickets:
+                self.broker.order_send({'action': sim_mt5.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'position': ticket})
+
+    def portfolio_mark(self, count):
+        """Portfolio.mark() of `count` positions spread over a few symbols against one tick snapshot."""
+        names = symbols(5)
+        tickets = []
+        for i in range(count):
+            result = self.broker.order_send({'action': sim_mt5.TRADE_ACTION_DEAL, 'symbol': names[i % 5], 'volume': 0.01,
+                                             'type': i % 2, 'magic': 360, 'deviation': 1000})
+            tickets.append((names[i % 5], result.order))
+        portfolio = Portfolio(SymbolSpecCache(self.connector, names))
+        portfolio.refresh(self.connector)
+        ticks = {name: self.broker.symbol_info_tick(name) for name in names}
+        try:
+            return timed(lambda: portfolio.mark(ticks), repeat=20 if self.quick else 100)
+        finally:
+            for name, ticket in tickets:
+                self.broker.order_send({'action': sim_mt5.TRADE_ACTION_DEAL, 'symbol': name, 'position': ticket})
+
+    def db(self, operation):
+        """Seconds per DatabaseManager operation (each opens, commits and closes its own connection)."""
+        db = DatabaseManager(os.path.join(self.workdir, 'bench_db.db'))
+        db.create_table('bench', 'ticket_id INTEGER PRIMARY KEY, symbol TEXT, stop_loss REAL, status TEXT')
+        count = 100 if self.quick else 500
+        for i in range(count):
+            db.insert_item('bench', ['ticket_id', 'symbol', 'stop_loss', 'status'], [i, 'EURUSD', 1.0, 'open'])
+        samples = []
+        for i in range(count):
+            started = time.perf_counter()
+            if operation == 'insert':
+                db.insert_item('bench', ['ticket_id', 'symbol', 'stop_loss', 'status'], [count + i, 'EURUSD', 1.0, 'open'])
+            elif operation == 'update':
+                db.update_item('bench', {'stop_loss': 1.1, 'status': 'open'}, f"ticket_id = {i}")
+            else:
+                db.remove_item('bench', f"ticket_id = {i}")
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    def atr(self):
+        calculator = util.IndicatorCalculator(util.DataFetcher(self.connector, 'EURUSD', sim_mt5.TIMEFRAME_M15, 1, 100))
+        return timed(lambda: calculator.calculate_atr(14), repeat=20 if self.quick else 100)
+
+    def box_windows(self):
+        """Every 16-bar box window of a day of M15 bars, read from the range index."""
+        rates = self.broker.copy_rates_from_pos('EURUSD', sim_mt5.TIMEFRAME_M15, 0, 2000)
+        series = BarSeries.from_rates(sim_mt5.TIMEFRAME_M15, rates)
+        starts = series.total - 96 - 16 + np.arange(96)
+        series.extrema(0, 1)  # Build the tables
+        return timed(lambda: series.ranges.extrema_many(starts, starts + 16), repeat=20 if self.quick else 100)
+
+    def messenger(self):
+        """Caller-side cost of Messenger.send against a local webhook sink."""
+        server = HTTPServer(('127.0.0.1', 0), WebhookSink)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            messenger = util.Messenger(f"http://127.0.0.1:{server.server_port}/webhook")
+            return timed(lambda: messenger.send('bench'), repeat=20 if self.quick else 100)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def startup(self, count):
+        """Engine construction and connection until every bot has completed its first cycle."""
+        try:
+            import core
+        except ImportError as e:
+            raise SkipCase(f"core is not importable here: {e}")
+        from sessions import SessionCalendar
+        from timers import TimerService
+
+        config = {
+            'trading_config': {'symbols': symbols(count), 'timeframe': sim_mt5.TIMEFRAME_M15, 'lot': 0.01,
+                               'deviation': 10, 'pip_range': 10},
+            'date_range': {'from_data': 1, 'to_data': 16},
+            'strategy_params': {'magic_numbers': {'magic1': 360, 'magic2': 361, 'magic3': 362}, 'tp_pips': 50,
+                                'atr_sl_multiplier': 1.5, 'atr_period': 14, 'max_dist_atr_multiplier': 2,
+                                'trail_atr_multiplier': 1},
+            'details': {'webhook_url': BOT_PARAMS['webhook_url']},
+        }
+        logger = logging.getLogger('bench')
+        samples = []
+        for _ in range(2 if self.quick else 5):
+            started = time.perf_counter()
+            timer_service = TimerService(logger=logger)
+            engine = core.TradeEngine(util.MT5Connector(1, 'bench', 'Sim-Server'),
+                                      core.MarketStatus(SessionCalendar()), config, None, None, logger,
+                                      core.ThreadManager(logger), timer_service=timer_service)
+            timer_service.start()
+            engine.connect_to_market()
+            while any(bot.last_state is None for bot in engine.bots) or len(engine.bots) < count:
+                time.sleep(0.001)
+            samples.append(time.perf_counter() - started)
+            engine.stop_bots()
+            engine.bar_scheduler.stop()
+            timer_service.stop()
+            engine.close_snapshot()
+        return samples
+
+    def cases(self):
+        bot_counts = (5, 50) if self.quick else (5, 50, 500)
+        position_counts = (10, 1000) if self.quick else (10, 1000, 10000)
+        cases = [(f"bot_cycle[{n}]", 's/cycle', lambda n=n: self.bot_cycle(n)) for n in bot_counts]
+        cases += [(f"reconcile[{n}]", 's/call', lambda n=n: self.reconcile(n)) for n in position_counts]
+        cases += [(f"stop_pass[{n}]", 's/call', lambda n=n: self.stop_pass(n)) for n in position_counts]
+        cases += [(f"portfolio_mark[{n}]", 's/call', lambda n=n: self.portfolio_mark(n)) for n in position_counts]
+        cases += [(f"db_{op}", 's/op', lambda op=op: self.db(op)) for op in ('insert', 'update', 'remove')]
+        cases += [
+            ('atr', 's/call', self.atr),
+            ('box_windows', 's/call', self.box_windows),
+            ('messenger_send', 's/call', self.messenger),
+            ('engine_startup[5]', 's', lambda: self.startup(5)),
+        ]
+        return cases
+
+
+class SkipCase(Exception):
+    pass
+
+
+# ----------------------------------------------------------------------
+# History and regression check
+# ----------------------------------------------------------------------
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def previous_results(history, quick):
+    """Latest result of every case from earlier runs of the same size (partial runs included)."""
+    latest = {}
+    for entry in history:
+        if entry.get('quick') == quick:
+            latest.update(entry['results'])
+    return latest
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(results, previous, threshold):
+    """Return [(case, previous median, current median, ratio)] for cases slower than the threshold allows."""
+    regressions = []
+    for name, result in results.items():
+        before = previous.get(name)
+        if not before or before['median'] <= 0:
+            continue
+        ratio = result['median'] / before['median']
+        if ratio > 1 + threshold:
+            regressions.append((name, before['median'], result['median'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', default='bench_history.jsonl', help="JSON lines file results are appended to")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed slowdown of a median, e.g. 0.25 = 25%%")
+    parser.add_argument('--quick', action='store_true', help="smaller sizes and fewer repeats")
+    parser.add_argument('--only', nargs='*', help="run only cases whose name contains one of these words")
+    parser.add_argument('--no-save', action='store_true', help="do not append this run to the history")
+    args = parser.parse_args(argv)
+
+    # Bots log every step; keep the measurement about the code, not the handlers
+    logging.disable(logging.CRITICAL)
+    history_path = os.path.abspath(args.history)
+    workdir = tempfile.mkdtemp(prefix='tracy-bench-')
+    cwd = os.getcwd()
+    os.chdir(workdir)  # Bots open trades.db in the working directory
+    results = {}
+    try:
+        bench = Bench(workdir, quick=args.quick)
+        for name, unit, case in bench.cases():
+            if args.only and not any(word in name for word in args.only):
+                continue
+            try:
+                results[name] = summarize(case(), unit)
+            except SkipCase as e:
+                print(f"{name:<22} skipped: {e}")
+                continue
+            result = results[name]
+            print(f"{name:<22} median {result['median'] * 1000:10.3f} ms   p95 {result['p95'] * 1000:10.3f} ms   ({unit}, n={result['n']})")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    history = load_history(history_path)
+    previous = previous_results(history, args.quick)
+    regressions = compare(results, previous, args.threshold)
+    for name, before, after, ratio in regressions:
+        print(f"REGRESSION {name}: {before * 1000:.3f} ms -> {after * 1000:.3f} ms ({(ratio - 1) * 100:+.0f}%)")
+
+    if not args.no_save:
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': args.quick,
+            'results': results,
+            'regressions': [name for name, *_ in regressions],
+        }
+        with open(history_path, 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
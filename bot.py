@@ -1,15 +1,62 @@
-import MetaTrader5 as mt5
+from mt5api import mt5
 import mt5utilities as util
 import config as cfg
 from db_manager import DatabaseManager
 from datetime import datetime, timedelta
 import time
+import threading
 import logging
 import traceback
 import position as pos
+from bars import BarAggregator
+from symbols import SymbolSpecCache
+from stops import StopManager
+from trade_history import TradeHistory
+from fills import FillRecorder
+from strategies import StrategyRuntime, STRATEGIES
+from session_boxes import SessionBoxes
+
+
+# Schemas of the trade tables, created once per engine (or by a bot running on its own)
+OPENED_TRADE_SCHEMA = """
+    date_time_open TEXT NOT NULL,
+    ticket_id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    trade_type TEXT NOT NULL,
+    open_price REAL NOT NULL,
+    magic_number INTEGER NOT NULL,
+    lot REAL NOT NULL,
+    stop_loss REAL,  -- Added field for stop loss
+    take_profit REAL,  -- Added field for take profit
+    deviation REAL,  -- Added field for deviation
+    status BOOLEAN NOT NULL,
+    date_time_close TEXT,
+    close_price REAL,
+    profit_loss REAL
+"""
+
+CLOSED_TRADE_SCHEMA = """
+    ticket_id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    trade_type TEXT NOT NULL,
+    open_price REAL NOT NULL,
+    open_time TEXT NOT NULL,
+    close_price REAL NOT NULL,
+    close_time TEXT NOT NULL,
+    profit_loss REAL NOT NULL,
+    magic_number INTEGER NOT NULL,
+    lot REAL NOT NULL,
+    stop_loss REAL,  -- Added field for stop loss
+    take_profit REAL,  -- Added field for take profit
+    deviation REAL,  -- Added field for deviation
+    status BOOLEAN NOT NULL
+"""
+
+TRADE_TABLES = {'opened_trade': OPENED_TRADE_SCHEMA, 'closed_trade': CLOSED_TRADE_SCHEMA}
+
 
 class Bot:
-    def __init__(self, mt5_connector, market_status, symbol, timeframe, from_data, to_data, lot, deviation, magic1, magic2, magic3, tp_pips, atr_sl_multiplier, atr_period, max_dist_atr_multiplier, trail_atr_multiplier, webhook_url, pip_range, logger=None):
+    def __init__(self, mt5_connector, market_status, symbol, timeframe, from_data, to_data, lot, deviation, magic1, magic2, magic3, tp_pips, atr_sl_multiplier, atr_period, max_dist_atr_multiplier, trail_atr_multiplier, webhook_url, pip_range, logger=None, scheduler=None, box_close_time='02:00', reset_times=('01:00', '22:00'), timer_service=None, symbol_specs=None, stop_manager=None, portfolio=None, trade_history=None, fill_recorder=None, market_snapshot=None, indicator_cache=None, strategies=('london_break',), session_boxes=None, create_tables=True, started_at=None, warm_start=None, db_name='trades.db', shared_bars=None):
         self.mt5_connector = mt5_connector
         self.market_status = market_status
         self.symbol = symbol
@@ -32,7 +79,16 @@ class Bot:
         self.retracement_trade_executed = False
 
         self.level_broken = False
-        self.pip_range = pip_range
+        self.pip_range = pip_range  # In pips, converted with the symbol's specification
+        # Broker symbol specifications, normally shared by all bots and loaded once per connection
+        self.symbol_specs = symbol_specs if symbol_specs else SymbolSpecCache(mt5_connector, [symbol], logger=logger)
+        # Trailing stops are modified by the account's stop manager; a bot without a shared one runs its own
+        self.owns_stop_manager = stop_manager is None
+        self.stop_manager = stop_manager if stop_manager else StopManager(mt5_connector, self.symbol_specs, logger=logger)
+        # Account-wide mark-to-market (engine owned); None when the bot runs on its own
+        self.portfolio = portfolio
+        # Box levels of every configured session window, cached per day (normally shared by all bots)
+        self.session_boxes = session_boxes if session_boxes else SessionBoxes(clock=scheduler.clock if scheduler else None, logger=logger)
 
 
         self.username = 'Tracy'
@@ -43,16 +99,30 @@ class Bot:
         self.retracment_notice = False
 
 
-        #initialize data fetcher
-        self.data_fetcher = util.DataFetcher(mt5_connector, symbol, timeframe, from_data, to_data)
+        # Local M1/timeframe/H1 bars built from the tick stream; once seeded they serve the
+        # box, ATR and price reads instead of the terminal
+        self.bar_aggregator = BarAggregator(symbol, (mt5.TIMEFRAME_M1, timeframe, mt5.TIMEFRAME_H1),
+                                            clock=scheduler.clock if scheduler else None, logger=logger)
+        self.bars_seeded = False
+        # Bars saved by the last run (WarmStart); the bot's bars are saved back on request
+        self.warm_start = warm_start
+        self.bar_state = None
+        self.bar_state_due = False
+        # Bars of this server's symbols seeded by another account (accounts.ServerMarketData)
+        self.shared_bars = shared_bars
+        self.cycle_ticks = None  # Ticks taken in this cycle, shared with the breakout scan
 
-        #initialize position manager
-        self.position_manager = util.OpenPositionManager(mt5_connector, self.symbol, self.timeframe, self.from_data, self.to_data, self.atr_period, self.max_dist_atr_multiplier, self.atr_sl_multiplier, self.trail_atr_multiplier)
+        #initialize data fetcher
+        self.data_fetcher = util.DataFetcher(mt5_connector, symbol, timeframe, from_data, to_data, bars=self.bar_aggregator)
 
         #initialize Messanger
         self.messanger = util.Messenger(self.webhook_url, self.username)
 
-        self.trade_history = util.TradeHistory(mt5_connector, self.symbol)
+        # Broker deals synced into the local database; closing PnL is read from them
+        self.owns_trade_history = trade_history is None
+        self.trade_history = trade_history if trade_history else TradeHistory(mt5_connector, db_name=db_name, logger=logger)
+        # Every market order's requested vs fill price and latency, for fill-quality analysis
+        self.fill_recorder = fill_recorder if fill_recorder else FillRecorder(symbol_specs=self.symbol_specs, logger=logger)
 
         #initialize flags
         self.box_calculated = False
@@ -64,76 +134,210 @@ class Bot:
 
         self.daily_data_reset = False
 
-        self.db_manager = DatabaseManager('trades.db')
+        self.db_manager = DatabaseManager(db_name)
 
         self.positions_loaded = False
 
         # Configure the logger
         self.logger = logger if logger else logging.getLogger()
 
-        # Define the schema for your opened_trades table, now with added fields
-        opened_trade_schema = """
-            date_time_open TEXT NOT NULL,
-            ticket_id INTEGER PRIMARY KEY,
-            symbol TEXT NOT NULL,
-            trade_type TEXT NOT NULL,
-            open_price REAL NOT NULL,
-            magic_number INTEGER NOT NULL,
-            lot REAL NOT NULL,
-            stop_loss REAL,  -- Added field for stop loss
-            take_profit REAL,  -- Added field for take profit
-            deviation REAL,  -- Added field for deviation
-            status BOOLEAN NOT NULL,
-            date_time_close TEXT,
-            close_price REAL,
-            profit_loss REAL
-        """
+        # Scans the ticks between polls so a break is caught even if price has already come back
+        self.tick_scanner = util.TickScanner(mt5_connector, self.symbol, logger=self.logger)
+        self.tick_scanner.listeners.append(self.bar_aggregator.on_ticks)
+        # The strategies on this symbol share the scanner's ticks, the aggregator's bars and the indicator cache
+        self.runtime = StrategyRuntime(self.symbol, self.bar_aggregator, self.tick_scanner, indicators=indicator_cache, logger=self.logger)
+        self.atr = None  # ATR of the bot's timeframe, read through the indicator cache every cycle
 
-        # Create the table in the database
-        self.db_manager.create_table('opened_trade', opened_trade_schema)
-
-        # Define the schema for your closed_trades table, now with added fields
-        closed_trade_schema = """
-            ticket_id INTEGER PRIMARY KEY,
-            symbol TEXT NOT NULL,
-            trade_type TEXT NOT NULL,
-            open_price REAL NOT NULL,
-            open_time TEXT NOT NULL,
-            close_price REAL NOT NULL,
-            close_time TEXT NOT NULL,
-            profit_loss REAL NOT NULL,
-            magic_number INTEGER NOT NULL,
-            lot REAL NOT NULL,
-            stop_loss REAL,  -- Added field for stop loss
-            take_profit REAL,  -- Added field for take profit
-            deviation REAL,  -- Added field for deviation
-            status BOOLEAN NOT NULL
-        """
+        #initialize position manager (its ATR stops read the same cache entry)
+        self.position_manager = util.OpenPositionManager(mt5_connector, self.symbol, self.timeframe, self.from_data, self.to_data, self.atr_period, self.max_dist_atr_multiplier, self.atr_sl_multiplier, self.trail_atr_multiplier, bars=self.bar_aggregator, indicators=self.runtime.indicators)
+        # Quotes and bars are mirrored into shared memory for other processes
+        if market_snapshot is not None:
+            market_snapshot.attach(self.symbol, self.bar_aggregator, self.tick_scanner)
 
-        # Create the table in the database
-        self.db_manager.create_table('closed_trade', closed_trade_schema)
+        self.last_breakout = None  # Latest breakout found by the tick scanner
+        # Breakout orders prepared with the box, per trade direction: [(template, magic), ...]
+        self.order_templates = {}
+
+        # The engine creates the trade tables once before building its bots
+        if create_tables:
+            self.db_manager.create_tables(TRADE_TABLES)
 
         self.logger.info('initaallalalallalalalalalallalalalalala')
 
+        # Broker-time scheduling: the box is calculated when the box window's last bar
+        # closes and the daily reset fires at fixed broker GMT times
+        self.scheduler = scheduler
+        self.box_close_time = box_close_time
+        self.reset_times = reset_times
+        self.wake_event = threading.Event()  # Interrupts the cycle sleep when a scheduled event fires
+        self.box_window_end = None  # Server time at which the box window closed
+        self.reset_due = False
+        self.reconcile_due = False
+        self.timer_service = timer_service  # Shared timer that wakes the bot for its next cycle
+        self.wake_grace = 5  # Seconds past the cycle before the bot stops waiting for the timer
+        self.scheduled_events = []
+
+        # Supervision: heartbeat stamped every cycle, and the state published at the end
+        # of the last completed cycle so a restarted bot can carry on where this one stopped
+        self.heartbeat = time.time()
+        self.cycle_started = None  # Set while a cycle is running
+        self.next_cycle_due = None  # When the bot expects to wake next
+        self.error_delay = 5  # Pause after a failed cycle instead of retrying in a tight loop
+        self.last_state = None
+        # Read-only view for the status API, replaced (never modified) at the end of every cycle
+        self.status = None
+        self.last_tick = None
+        # Bring-up: when the engine started bringing this bot up, and how long until its first tick
+        self.started_at = started_at if started_at is not None else time.time()
+        self.time_to_first_tick = None
+        if self.scheduler:
+            self.scheduled_events.append(self.scheduler.on_bar_close(self.timeframe, self.on_bar_close))
+            for reset_time in self.reset_times:
+                self.scheduled_events.append(self.scheduler.at_time(reset_time, self.on_daily_reset))
+
+        for name in strategies:
+            self.add_strategy(STRATEGIES[name](self))
+
+    def add_strategy(self, strategy):
+        """Host another strategy on this symbol (a strategies.Strategy built with this bot)."""
+        return self.runtime.add(strategy)
+
+    def on_bar_close(self, timeframe, close_time):
+        """Scheduler callback: wake the bot when the box window's last bar closes."""
+        if close_time.strftime('%H:%M') == self.box_close_time and not self.levels_calculated:
+            self.box_window_end = close_time.timestamp() + self.scheduler.clock.server_utc_offset
+            self.logger.info(f"{self.symbol}: box window closed at {close_time}, waking bot.")
+            self.wake_event.set()
+
+    def on_daily_reset(self, event_time):
+        """Scheduler callback: request the daily data reset."""
+        self.reset_due = True
+        self.wake_event.set()
+
+    def request_reconcile(self):
+        """Timer callback: reconcile positions on the next cycle."""
+        self.reconcile_due = True
+        self.wake_event.set()
+
+    def snapshot_state(self):
+        """Trading state that must survive a restart of the bot."""
+        return {
+            'box': dict(self.box) if self.box else None,
+            'box_window_end': self.box_window_end,
+            'daily_trade_info': dict(self.daily_trade_info) if self.daily_trade_info else None,
+            'positions': dict(self.positions),
+            'box_calculated': self.box_calculated,
+            'levels_calculated': self.levels_calculated,
+            'trade_executed': self.trade_executed,
+            'retracement_trade_executed': self.retracement_trade_executed,
+            'level_broken': self.level_broken,
+            'daily_data_reset': self.daily_data_reset,
+            'trade_signal_notification': self.trade_signal_notification,
+            'reset_due': self.reset_due,
+            'tick_cursor': self.tick_scanner.cursor,
+        }
+
+    def publish_status(self, open_positions, started, wake_lag):
+        """Publish this cycle's status for the status API as a new object; readers just take the reference."""
+        columns = ['ticket', 'magic', 'type', 'volume', 'price_open', 'sl', 'tp', 'price_current', 'profit']
+        positions = open_positions[columns].to_dict('records') if not open_positions.empty else []
+        box = self.box or {}
+        self.status = {
+            'symbol': self.symbol,
+            'published': time.time(),
+            'box': {key: box.get(key) for key in ('buy_level', 'sell_level', 'buy_stoploss', 'sell_stoploss', 'box_height')},
+            'levels_calculated': self.levels_calculated,
+            'trade_executed': self.trade_executed,
+            'retracement_trade_executed': self.retracement_trade_executed,
+            'level_broken': self.level_broken,
+            'atr': self.atr,
+            'strategies': [strategy.name for strategy in self.runtime.strategies],
+            'sessions': self.session_levels(),
+            'positions': positions,
+            'last_tick': self.last_tick,
+            'wake_lag': wake_lag,  # Seconds between the planned and the actual start of the cycle
+            'cycle_time': time.time() - started,
+        }
+
+    def session_levels(self, day=None):
+        """Boxes of every configured session closing on `day` (default today, GMT) from the local bars."""
+        series = self.bar_aggregator.closed_series(self.timeframe)
+        if series is None:
+            return {}
+        if day is None:
+            day = (self.scheduler.clock.utc_now() if self.scheduler else datetime.utcnow()).date()
+        return self.session_boxes.boxes(self.symbol, day, series)
+
+    def restore_state(self, state):
+        for key, value in state.items():
+            if key == 'tick_cursor':
+                self.tick_scanner.cursor = value  # Carry on scanning where the previous bot stopped
+            else:
+                setattr(self, key, value)
+        self.logger.info(f"{self.symbol}: state restored (levels_calculated={self.levels_calculated}, trade_executed={self.trade_executed}).")
+
+    def wait_for_next_cycle(self, delay):
+        """Wait until the next cycle, a scheduled event or stop(), whichever comes first."""
+        self.next_cycle_due = time.time() + delay
+        if self.timer_service:
+            wake_job = self.timer_service.call_later(delay, self.wake_event.set, name=f"{self.symbol} cycle")
+            # The timer normally wakes us; the timeout only guards against a busy or stopped timer
+            self.wake_event.wait(delay + self.wake_grace)
+            self.timer_service.cancel(wake_job)
+        else:
+            self.wake_event.wait(delay)
+        self.wake_event.clear()
+
+    def seed_bars(self):
+        """Seed the local bars from history and start the tick scan there; False if the terminal had no data yet."""
+        if self.bars_seeded:
+            return True
+        if self.shared_bars is None:
+            resume_from = self._seed()
+        else:
+            # One account per server pulls a symbol's history; the others start from its bars
+            # and fetch only the minutes since
+            with self.shared_bars.seeding(self.symbol):
+                resume_from = self._seed(self.shared_bars.bars(self.symbol, self.bar_aggregator.series))
+                if resume_from is not None:
+                    self.shared_bars.publish(self.symbol, self.bar_aggregator.state())
+        if resume_from is None:
+            return False
+        self.bars_seeded = True
+        if self.tick_scanner.cursor is None:
+            self.tick_scanner.start(resume_from)
+        return True
+
+    def _seed(self, shared=None):
+        saved = self.warm_start.bars(self.symbol) if self.warm_start is not None else None
+        resume_from = self.bar_aggregator.warm_start(saved, self.mt5_connector) if saved else None
+        if resume_from is None and shared:
+            resume_from = self.bar_aggregator.warm_start(shared, self.mt5_connector)
+        if resume_from is None:
+            resume_from = self.bar_aggregator.load_history(self.mt5_connector)
+        return resume_from
+
+    def update_bars(self):
+        """Seed the local bars on first use (the engine seeds them at bring-up), then take in the ticks since the last cycle."""
+        if not self.seed_bars():
+            return None
+        # The scanner hands every batch to the aggregator
+        return self.tick_scanner.fetch()
+
     def calculate_box(self):
-        # Attempt to fetch historical data
+        # Highest and lowest close of the box bars; when scheduled, exactly the bars of the window that just closed
         try:
-            data = self.data_fetcher.fetch()  # Ensure this method returns the data directly
+            extremes = self.data_fetcher.close_extremes(self.box_window_end)
         except Exception as e:
             self.logger.error(f"Failed to fetch data: {self.symbol}: {e}")
             return
 
         # Validate the fetched data
-        if data is None or data.empty:
+        if extremes is None:
             self.logger.info(f"No data fetched or data is empty: {self.symbol}")
             return
-        if not {'high', 'low', 'open', 'close'}.issubset(data.columns):
-            self.logger.error(f"Data does not contain required 'high', 'low', 'open', and 'close' columns for {self.symbol}")
-            return
 
-        # Calculate the effective high and low by considering the max/min of open/close
-        effective_high = data['close'].max()
-        effective_low = data['close'].min()
+        effective_high, effective_low = extremes
         box_height = effective_high - effective_low
 
         # Handle scenarios where box height is zero or data is not valid
@@ -166,25 +370,69 @@ class Bot:
             # After attempting to calculate the box, check if it was successfully calculated
             if self.box:  # Assuming self.box is populated by calculate_box on success
                 self.box_calculated = True
+                # Look for the break from the end of the box window (or from now without a scheduler)
+                self.tick_scanner.start(self.box_window_end * 1000 if self.box_window_end is not None else None)
+                self.cycle_ticks = None  # Rescan from the new cursor
                 self.logger.info(f"Box levels calculated successfully: {self.symbol}.")
+                self.prepare_orders()
+                # The trailing leg keeps its stop half a box behind price once it is a full box away
+                self.stop_manager.set_trail(self.symbol, self.magic2, self.box['box_height'], 0.5 * self.box['box_height'])
             else:
                 self.logger.warning(f"Box level calculation failed or returned empty: {self.symbol}. Box calculation may not proceed without valid data.")
         else:
             self.logger.info(f"Box levels already calculated: {self.symbol}, no need to recalculate.")
 
     
+    def prepare_orders(self):
+        """
+        Build and pre-check the breakout orders for both directions once the box is known,
+        so a break only has to stamp in the price. Directions whose check fails fall back to
+        the regular order path.
+        """
+        self.order_templates = {}
+        tick = self.mt5_connector.call('symbol_info_tick', self.symbol)
+        if tick is None:
+            self.logger.warning(f"{self.symbol}: no tick to pre-check breakout orders against.")
+            return
+        spec = self.symbol_specs.get(self.symbol)
+        for trade_type in (0, 1):
+            stop_loss = self.box['buy_stoploss'] if trade_type == 0 else self.box['sell_stoploss']
+            legs = [
+                util.OrderTemplate(self.symbol, trade_type, self.lot, self.deviation, self.magic1, stop_loss,
+                                   take_profit_distance=self.box['box_height'], symbol_spec=spec, logger=self.logger),
+                util.OrderTemplate(self.symbol, trade_type, self.lot, self.deviation, self.magic2, stop_loss,
+                                   symbol_spec=spec, logger=self.logger),
+            ]
+            if all(leg.check(self.mt5_connector, tick) for leg in legs):
+                self.order_templates[trade_type] = legs
+        self.logger.info(f"{self.symbol}: breakout orders prepared for {len(self.order_templates)} direction(s).")
+
     def check_for_break(self):
         # Ensure the box has been calculated before checking for a breakout
         if not self.box or 'buy_level' not in self.box or 'sell_level' not in self.box:
             self.logger.error(f"Box levels not calculated or are incomplete: {self.symbol}. Cannot check for breakout.")
             return None, None
 
-        # Fetch the current price using DataFetcher
+        # Scan every tick since the last check, so a spike through a level between polls is not missed
+        breakout, current_price = self.tick_scanner.scan(self.box['buy_level'], self.box['sell_level'], ticks=self.cycle_ticks)
+        self.cycle_ticks = None
+        self.last_breakout = breakout
+        if breakout:
+            side = 'buy' if breakout['trade_type'] == 0 else 'sell'
+            break_time = datetime.utcfromtimestamp(breakout['time_msc'] / 1000.0)
+            self.logger.info("----------------------------------------------")
+            self.logger.info(f"Breakout detected: {self.symbol} - price crossed the {side} level ({breakout['level']}) at {break_time} server time, "
+                             f"overshoot {breakout['overshoot']:.5f}, current price {current_price}.")
+            return breakout['trade_type'], current_price
+        if current_price is not None:
+            return None, current_price
+
+        # Tick history unavailable: fall back to the current candle's close
         current_price = self.data_fetcher.get_current_price()
 
         # Check if the current price could be fetched
         if current_price is None:
-            self.logger.error("Failed to fetch current price: {self.symbol}.")
+            self.logger.error(f"Failed to fetch current price: {self.symbol}.")
             return None, None
 
         # Check if the price has broken out of the box
@@ -207,17 +455,25 @@ class Bot:
             self.logger.error(f"Box levels not calculated or are incomplete: {self.symbol}. Cannot determine if should trade.")
             return False
 
+        spec = self.symbol_specs.get(self.symbol)
+        if spec is None:
+            self.logger.error(f"No symbol specification for {self.symbol}. Cannot determine if should trade.")
+            return False
+
         try:
+            # pip_range is in pips; a pip is a different price distance on 5-digit and JPY pairs
+            pip_distance = spec.pips_to_price(self.pip_range)
+
             # Determine the relevant breakout level based on the trade type
             if trade_type == 0:  # For buy trades
                 breakout_level = self.box['buy_level']
                 # Check if the current price is within pip_range above the breakout level
-                return breakout_level <= current_price <= breakout_level + cfg.pip_range
+                return breakout_level <= current_price <= breakout_level + pip_distance
 
             elif trade_type == 1:  # For sell trades
                 breakout_level = self.box['sell_level']
                 # Check if the current price is within pip_range below the breakout level
-                return breakout_level - self.pip_range <= current_price <= breakout_level
+                return breakout_level - pip_distance <= current_price <= breakout_level
 
         except Exception as e:
             self.logger.error(f"Error evaluating should_trade: {self.symbol}: {e}")
@@ -290,10 +546,11 @@ class Bot:
             # Initialize and execute the trade using the Position class
             trade = pos.Position(symbol=self.symbol, trade_type=trade_type, lot=self.lot, magic_number=self.magic3,
                                 stop_loss=stop_loss, take_profit=take_profit, deviation=self.deviation, logger=self.logger,
-                                database_manager=self.database_manager)
+                                database_manager=self.db_manager, symbol_spec=self.symbol_specs.get(self.symbol),
+                                fill_recorder=self.fill_recorder, terminal=self.mt5_connector.mt5)
             trade_result, position_instance = trade.execute_open()
 
-            self.positions[trade_result] = position_instance
+            self.track_position(trade_result, position_instance)
 
 
             if trade_result:
@@ -345,10 +602,22 @@ class Bot:
                         
                 yes_trade = self.should_trade(trade_signal, current_price)
 
-                if yes_trade:
+                if yes_trade and trade_signal in self.order_templates:
+                    self.submit_prepared_orders(trade_signal)
+                    self.trade_executed = True
+                    self.logger.info("-------------------------------------")
+                    self.logger.info(f'Trade executed: {self.symbol}: {self.trade_executed}')
+
+                    self.daily_trade_info = {
+                        'symbol': self.symbol,
+                        'trade_type': trade_signal, # 0 for Buy, 1 for Sell
+                        'stop_loss': self.box['buy_stoploss'] if trade_signal == 0 else self.box['sell_stoploss'],
+                        'box_size': self.box['box_height'],
+                    }
+                elif yes_trade:
                     # Calculate the take profit based on the box height and trade signal
                     # Fetch the current market price based on trade direction
-                    market_price = mt5.symbol_info_tick(self.symbol).ask if trade_signal == 0 else mt5.symbol_info_tick(self.symbol).bid
+                    market_price = self.mt5_connector.mt5.symbol_info_tick(self.symbol).ask if trade_signal == 0 else self.mt5_connector.mt5.symbol_info_tick(self.symbol).bid
                     box_take_profit = market_price + self.box['box_height'] if trade_signal == 0 else market_price - self.box['box_height']
 
                     # Setup trade parameters
@@ -364,13 +633,16 @@ class Bot:
                         take_profit=box_take_profit,
                         deviation=self.deviation,
                         logger=self.logger,
-                        database_manager=self.db_manager  # Assuming this is correctly initialized elsewhere
+                        database_manager=self.db_manager,  # Assuming this is correctly initialized elsewhere
+                        symbol_spec=self.symbol_specs.get(self.symbol),
+                        fill_recorder=self.fill_recorder,
+                        terminal=self.mt5_connector.mt5
                     )
                     
                     # Execute the trade
                     trade1_result, position_instance1 = trade_1.execute_open()
 
-                    self.positions[trade1_result] = position_instance1
+                    self.track_position(trade1_result, position_instance1)
 
                     trade_2 = pos.Position(
                         symbol=self.symbol,
@@ -381,13 +653,16 @@ class Bot:
                         take_profit=0.0,
                         deviation=self.deviation,
                         logger=self.logger,
-                        database_manager=self.db_manager  # Assuming this is correctly initialized elsewhere
+                        database_manager=self.db_manager,  # Assuming this is correctly initialized elsewhere
+                        symbol_spec=self.symbol_specs.get(self.symbol),
+                        fill_recorder=self.fill_recorder,
+                        terminal=self.mt5_connector.mt5
                     )
                     
                     # Execute the trade
                     trade2_result, position_instance2 = trade_2.execute_open()
 
-                    self.positions[trade2_result] = position_instance2
+                    self.track_position(trade2_result, position_instance2)
 
                     self.trade_executed = True
                     self.logger.info("-------------------------------------")
@@ -405,40 +680,82 @@ class Bot:
                     self.messanger.send('Trade condition not met, No trade executed')   
 
                     
-    def manage_positions(self):
-
-        self.reconcile_positions()
-        # Loop over all Position instances managed by the bot
-        for ticket_id, position in self.positions.items():
+    def submit_prepared_orders(self, trade_signal):
+        """
+        Send both breakout legs back-to-back, priced from a single tick snapshot.
+        Bookkeeping (logging, messages, database) only starts once both are sent.
+        """
+        tick = self.mt5_connector.call('symbol_info_tick', self.symbol)
+        if tick is None:
+            self.logger.error(f"{self.symbol}: no tick to price the breakout orders.")
+            return
+        legs = self.order_templates[trade_signal]
+        requests = [template.stamp(tick) for template in legs]
+        sent = []
+        for request in requests:
+            sent_at = time.time()
+            started = time.perf_counter()
+            result = self.mt5_connector.mt5.order_send(request)
+            sent.append((result, sent_at, time.perf_counter() - started))
+
+        spec = self.symbol_specs.get(self.symbol)
+        for template, request, (result, sent_at, elapsed) in zip(legs, requests, sent):
+            self.fill_recorder.record(request, result, tick, sent_at, elapsed, kind='open', signal=self.last_breakout)
+            filled = result is not None and result.retcode == mt5.TRADE_RETCODE_DONE
+            slippage = spec.price_to_pips(abs(result.price - request['price'])) if filled and spec else None
+            self.logger.info(f"{self.symbol}: leg {template.magic} {'filled at ' + str(result.price) if filled else 'not filled'} "
+                             f"in {elapsed * 1000:.1f} ms (requested {request['price']}, slippage {slippage} pips)")
+
+            position = pos.Position(
+                symbol=self.symbol,
+                trade_type=trade_signal,
+                lot=request['volume'],
+                magic_number=template.magic,
+                stop_loss=request['sl'],
+                take_profit=request['tp'],
+                deviation=self.deviation,
+                logger=self.logger,
+                database_manager=self.db_manager,
+                symbol_spec=spec,
+                fill_recorder=self.fill_recorder,
+                terminal=self.mt5_connector.mt5
+            )
             try:
-                # Assuming Position objects have attributes like magic_number, take_profit, and methods like calculate_manual_stop, box_trail_stop
-                # Check if the magic number is not set
-                # if not position.magic_number:
-                #     # Directly call method on the Position instance to update the stop loss if needed
-                #     update_stop = position.calculate_manual_stop()
-                #     if update_stop:
-                #         self.logger.info("-------------------------------------------------")
-                #         self.logger.info(f"{position.symbol}: stop_loss set.")
-
-                # # Check if take_profit is not zero
-                # if position.take_profit != 0.0:
-                #     # Directly call method on the Position instance to update the trailing stop
-                #     update_result = position.calculate_atr_trailing_stop()
-                #     if update_result:
-                #         self.logger.info("-------------------------------------------------")
-                #         self.logger.info(f"{position.symbol}: ATR-based Position Trailed.")
-
-                # Check if the magic number matches self.magic2 for special trailing stop logic
-                if position.magic_number == self.magic2:
-                    # Use a specific method for trailing stop if matching a certain magic number
-                    update_result = position.box_trail_stop()  # Ensure this method exists within your Position class
-                    if update_result:
-                        self.logger.info("-------------------------------------------------")
-                        self.logger.info(f"{position.symbol}: Position Trailed with box method.")
-            
+                ticket, _ = position.handle_open_result(result)
             except Exception as e:
-                # Log the exception for debugging
-                self.logger.error(f"An error occurred while managing position for {position.symbol}: {e}", exc_info=True)
+                ticket = position.ticket_id
+                self.logger.error(f"{self.symbol}: error recording opened position {ticket}: {e}", exc_info=True)
+            self.track_position(ticket, position)
+
+    def track_position(self, ticket, position):
+        """Keep a newly opened position, record its initial risk for R multiples and tell its strategy."""
+        if ticket is None:
+            return
+        self.positions[ticket] = position
+        self.trade_history.record_risk(ticket, position.initial_risk())
+        self.runtime.on_fill({
+            'ticket': ticket,
+            'symbol': self.symbol,
+            'magic': position.magic_number,
+            'trade_type': position.trade_type,
+            'price': position.open_price,
+            'volume': position.lot,
+            'time': position.open_time,
+        })
+
+    def manage_positions(self):
+        # The trailing leg (magic2) is trailed by the stop manager with the rule set when the box was
+        # calculated; a shared manager is run by the engine for all symbols at once
+        if not self.owns_stop_manager:
+            return
+        try:
+            updated = self.stop_manager.run([self.symbol])
+            if updated:
+                self.logger.info("-------------------------------------------------")
+                self.logger.info(f"{self.symbol}: {updated} position(s) trailed with box method.")
+        except Exception as e:
+            # Log the exception for debugging
+            self.logger.error(f"An error occurred while managing positions for {self.symbol}: {e}", exc_info=True)
 
 
     def reconcile_positions(self):
@@ -466,15 +783,17 @@ class Bot:
         """
         Reconcile positions based on current MT5 positions.
         """
-        for ticket in list(self.positions.keys()):
-            if ticket not in mt5_positions:
-                # Position closed in MT5 but still in self.positions
-                self.logger.info(f"Position {ticket} closed or missing in MT5, reconciling...")
-                if ticket in self.positions:
-                    # Ensure this position is a Position instance with a reconcile_position method
-                    self.positions[ticket].reconcile_position()
-                    # After reconciling, remove it from self.positions
-                    del self.positions[ticket]
+        closed = [ticket for ticket in self.positions if ticket not in mt5_positions]
+        if closed:
+            # Closing prices and PnL come from the broker's deals
+            self.trade_history.sync()
+        for ticket in closed:
+            # Position closed in MT5 but still in self.positions
+            self.logger.info(f"Position {ticket} closed or missing in MT5, reconciling...")
+            # Ensure this position is a Position instance with a reconcile_position method
+            self.positions[ticket].reconcile_position(self.trade_history.position_result(ticket))
+            # After reconciling, remove it from self.positions
+            del self.positions[ticket]
 
 
     def _update_positions_from_db(self, db_positions):
@@ -490,7 +809,10 @@ class Bot:
                     db_pos,
                     logger=self.logger,
                     messanger=None,  # Assuming you have a way to pass a messenger instance if necessary
-                    database_manager=self.db_manager
+                    database_manager=self.db_manager,
+                    symbol_spec=self.symbol_specs.get(self.symbol),
+                    fill_recorder=self.fill_recorder,
+                    terminal=self.mt5_connector.mt5
                 )
                 self.positions[ticket] = position_instance
                 self.logger.info(f"Added missing position {ticket} from DB to bot memory.")
@@ -501,7 +823,10 @@ class Bot:
             if not self.daily_data_reset:
                 # Reset the trading data
                 self.box = None
+                self.box_window_end = None
                 self.daily_trade_info = None
+                self.tick_scanner.reset()
+                self.order_templates = {}
 
                 # Reset flags
                 self.data_fetched = False
@@ -531,80 +856,112 @@ class Bot:
 
     def stop(self):
         self.should_stop = True
+        if self.scheduler:
+            for job in self.scheduled_events:
+                self.scheduler.cancel(job)
+            self.scheduled_events = []
+        self.wake_event.set()
         self.logger.info(f"{self.symbol}: Stopping the bot.")
 
         
-    def run(self):
-        while not self.should_stop:
-            try:
-                #-----------------------------------------------
-                start_time = time.time()  # Save the start time
-                #-----------------------------------------------
-
-                open_positions = self.position_manager.get_positions()
-                num_pos_symb = len(open_positions)
-
-                # Update current time each iteration to stay current
-                current_time = datetime.utcnow()
-                current_hour = current_time.hour
-
-                # Check for daily reset at a specific hour (e.g., 1:00 GMT)
-                if current_hour == 1 and not self.daily_data_reset:
-                    self.logger.info(f"Initiating daily data reset: {current_time}")
-                    self.reset_data()
-                    self.daily_data_reset = True  # Ensure this is set to True to prevent multiple resets in a day
-
-                # Check if it's the right time to calculate levels (e.g., between 2:00 GMT and 2:59 GMT)
-                if 2 <= current_hour < 3 and not self.levels_calculated:
-                    self.logger.info("------------------------------------------------------------------")
-                    self.logger.info(f"Time(GMT): {current_time}")
-                    self.calculate_levels()
-                    self.levels_calculated = True
-                    self.logger.info(f"Levels Calculated: {self.symbol}: {self.levels_calculated}")
-
-                if num_pos_symb > 0:
-                    
-                    if not self.position_manager_nofitication:
-                        self.logger.info("----------------------------")
-                        self.logger.info('Managing Opened Positions')
-                        self.position_manager_nofitication = True
-                    #Manage open position
-                    self.manage_positions()
-    
-
-                # Only check for breakout if levels have been calculated and a trade hasn't been executed yet
-                if self.levels_calculated and not self.trade_executed:
-                    self.attempt_to_execute_trades()
-                         
-
-                # Check if the initial breakout trade has been executed
-                # and if the retracement trade has not been executed
-                if self.trade_executed and not self.retracement_trade_executed:
-                    self.check_for_retracement()
-                        
-                        
+    def run_cycle(self):
+        """Run one trading cycle and return the delay in seconds until the next one."""
+        #-----------------------------------------------
+        start_time = time.time()  # Save the start time
+        wake_lag = start_time - self.next_cycle_due if self.next_cycle_due is not None else None
+        self.heartbeat = start_time
+        self.cycle_started = start_time
+        #-----------------------------------------------
+
+        open_positions = self.position_manager.get_positions()
+        num_pos_symb = len(open_positions)
+
+        # One tick fetch per cycle keeps the local bars current and feeds the breakout scan
+        self.cycle_ticks = self.update_bars()
+        if self.cycle_ticks is not None and len(self.cycle_ticks):
+            last = self.cycle_ticks[-1]
+            self.last_tick = {'time_msc': int(last['time_msc']), 'bid': float(last['bid']), 'ask': float(last['ask'])}
+            if self.time_to_first_tick is None:
+                self.time_to_first_tick = time.time() - self.started_at
+                self.logger.info(f"{self.symbol}: first tick {self.time_to_first_tick:.3f}s after bring-up started.")
+
+        # Update current time each iteration to stay current (broker GMT when scheduled)
+        current_time = self.scheduler.clock.utc_now() if self.scheduler else datetime.utcnow()
+        current_hour = current_time.hour
+
+        if self.scheduler:
+            # Daily reset requested by the scheduler at broker GMT
+            if self.reset_due:
+                self.reset_due = False
+                self.daily_data_reset = False
+                self.logger.info(f"Initiating daily data reset: {current_time}")
+                self.reset_data()
+        # Check for daily reset at a specific hour (e.g., 1:00 GMT)
+        elif current_hour == 1 and not self.daily_data_reset:
+            self.logger.info(f"Initiating daily data reset: {current_time}")
+            self.reset_data()
+            self.daily_data_reset = True  # Ensure this is set to True to prevent multiple resets in a day
+
+        # Reconciliation is requested by the shared timer (every cycle without one); idle bots skip it
+        if self.reconcile_due or not self.timer_service:
+            self.reconcile_due = False
+            if self.positions or num_pos_symb > 0:
+                self.reconcile_positions()
+
+        if num_pos_symb > 0:
+            
+            if not self.position_manager_nofitication:
+                self.logger.info("----------------------------")
+                self.logger.info('Managing Opened Positions')
+                self.position_manager_nofitication = True
+                if self.portfolio is not None:
+                    self.logger.info(f"{self.symbol}: unrealized PnL {self.portfolio.symbol_pnl(self.symbol):.2f} {self.portfolio.account_currency}")
+            #Manage open position
+            self.manage_positions()
 
-                if current_time.hour == 22 and not self.daily_data_reset:
-                    self.reset_data()
 
+        # Each strategy takes its turn (the London break: box, breakout and retracement)
+        self.runtime.on_timer(current_time)
                 
                 
-                elapsed_time = time.time() - start_time  # Calculate elapsed time
-                if elapsed_time < 55:  # Check if elapsed_time is less than 55 seconds
-                    sleep_time = 60 - elapsed_time  # Sleep for the remaining time
-                else:  # If execution took longer than 55 seconds
-                    sleep_time = 5  # Sleep for at least 5 seconds
 
+        if not self.scheduler and current_time.hour == 22 and not self.daily_data_reset:
+            self.reset_data()
 
-                if num_pos_symb > 0:
-                    time.sleep(10)  # Sleep for the determined time if theres an open position
-                else:
-                    time.sleep(sleep_time)
+        
+        
+        elapsed_time = time.time() - start_time  # Calculate elapsed time
+        if elapsed_time < 55:  # Check if elapsed_time is less than 55 seconds
+            sleep_time = 60 - elapsed_time  # Sleep for the remaining time
+        else:  # If execution took longer than 55 seconds
+            sleep_time = 5  # Sleep for at least 5 seconds
+
+
+        # Publish the cycle's state and heartbeat for the supervisor
+        self.last_state = self.snapshot_state()
+        if self.bar_state_due and self.warm_start is not None:
+            self.bar_state_due = False
+            self.bar_state = self.bar_aggregator.state(self.warm_start.keep_bars)
+        self.publish_status(open_positions, start_time, wake_lag)
+        self.heartbeat = time.time()
+        self.cycle_started = None
+
+        if num_pos_symb > 0:
+            return 10  # Sleep for the determined time if theres an open position
+        return sleep_time
 
+
+    def run(self):
+        while not self.should_stop:
+            try:
+                # Scheduled events and stop() interrupt the wait
+                self.wait_for_next_cycle(self.run_cycle())
             except Exception as e:
                 self.logger.error('An error occurred: %s', e)
                 tb = traceback.format_exc()  # Get the traceback
                 self.logger.error('An error occurred: %s\n%s', e, tb)  # Log the error and traceback
+                self.cycle_started = None
+                self.wait_for_next_cycle(self.error_delay)
             # 
                 # Optionally, you could re-raise the exception if you want the bot to stop
                 # raise e
\ No newline at end of file
@@ -1,4 +1,4 @@
-import MetaTrader5 as mt5
+from mt5api import mt5
 
 # MetaTrader 5 credentials
 details = dict(
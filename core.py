@@ -1,15 +1,30 @@
+import os
 import threading
 import time
-import keyboard
 import config as cfg
 import mt5utilities as util
-from bot import Bot
+from bot import Bot, TRADE_TABLES
+from db_manager import DatabaseManager
 import logging
-from datetime import datetime
 import json
 import random
-import schedule
-import MetaTrader5 as mt5
+import importlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from mt5api import mt5
+from sessions import SessionCalendar
+from scheduler import BrokerClock, BarScheduler, timeframe_seconds
+from timers import TimerService, daily_at
+from symbols import SymbolSpecCache
+from stops import StopManager
+from portfolio import Portfolio
+from trade_history import TradeHistory
+from fills import FillRecorder
+from market_snapshot import MarketSnapshotWriter
+from strategies import IndicatorCache
+from status import StatusServer
+from session_boxes import SessionBoxes
+from trade_archive import TradeArchive
+from warm_start import WarmStart
 
 
 class AppLogger:
@@ -91,13 +106,16 @@ class ConfigManager:
 class KeyCapture:
     def __init__(self):
         self.esc_pressed = False
+        self.esc_event = threading.Event()  # Lets callers block until ESC instead of polling
         self.listen_thread = threading.Thread(target=self.listen_for_esc, daemon=True)
         self.listen_thread.start()
 
     def listen_for_esc(self):
         """Thread function to listen for ESC key press."""
+        import keyboard  # Hooks the keyboard when imported, so only once it is needed
         keyboard.wait('esc')
         self.esc_pressed = True
+        self.esc_event.set()
 
     def esc_pressed_check(self):
         """Check if ESC has been pressed."""
@@ -159,36 +177,160 @@ class ThreadManager:
         self.threads = active_threads
 
 
+class SupervisedBot:
+    def __init__(self, symbol, bot, thread):
+        self.symbol = symbol
+        self.bot = bot
+        self.thread = thread
+        self.started_at = time.time()
+        self.restarts = 0  # Consecutive restarts, drives the backoff
+        self.restart_at = None  # When a dead bot is due to be restarted
+        self.stalled = False
+
+
+class BotSupervisor:
+    """
+    Watches bot threads through their heartbeats.
+
+    Each bot stamps a heartbeat at the start and end of every cycle and records
+    when it expects to wake next. The watchdog (a timer job) flags bots whose
+    cycle has run longer than cycle_timeout - typically a hung MT5 call - and
+    bots that did not wake within stall_grace of their expected time. Bots whose
+    thread has died are rebuilt through bot_factory, given the state the old bot
+    published at the end of its last cycle, and restarted with exponential backoff.
+    """
+
+    def __init__(self, thread_manager, bot_factory, logger, messenger=None, cycle_timeout=30, stall_grace=30,
+                 backoff_base=1, backoff_max=300, healthy_after=600):
+        self.thread_manager = thread_manager
+        self.bot_factory = bot_factory
+        self.logger = logger
+        self.messenger = messenger
+        self.cycle_timeout = cycle_timeout
+        self.stall_grace = stall_grace
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.healthy_after = healthy_after  # Seconds of uptime after which the backoff resets
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def add(self, symbol, bot):
+        """Start the bot's thread and supervise it."""
+        thread = self.thread_manager.create_thread(target=bot.run, name=f"BotThread-{symbol}")
+        with self._lock:
+            self.entries[symbol] = SupervisedBot(symbol, bot, thread)
+        return thread
+
+    def bots(self):
+        with self._lock:
+            return [entry.bot for entry in self.entries.values()]
+
+    def check(self):
+        """Watchdog pass: flag stalled bots and restart dead ones."""
+        now = time.time()
+        with self._lock:
+            entries = list(self.entries.values())
+        for entry in entries:
+            try:
+                if entry.thread is None or not entry.thread.is_alive():
+                    self._handle_dead(entry, now)
+                else:
+                    self._check_heartbeat(entry, now)
+            except Exception as e:
+                self.logger.error(f"Watchdog failed for {entry.symbol}: {e}", exc_info=True)
+        self.thread_manager.monitor_threads()
+
+    def _check_heartbeat(self, entry, now):
+        bot = entry.bot
+        if bot.cycle_started is not None:
+            overdue = now - bot.cycle_started - self.cycle_timeout
+            reason = f"cycle running for {now - bot.cycle_started:.0f}s"
+        elif bot.next_cycle_due is not None:
+            overdue = now - bot.next_cycle_due - self.stall_grace
+            reason = f"missed its wake-up by {now - bot.next_cycle_due:.0f}s"
+        else:
+            overdue, reason = -1, None
+
+        if overdue > 0 and not entry.stalled:
+            entry.stalled = True
+            self.logger.info("-------------------------------------------------")
+            self.logger.error(f"{entry.symbol}: bot stalled ({reason}), last heartbeat {now - bot.heartbeat:.0f}s ago.")
+            if self.messenger:
+                self.messenger.send(f"⚠️ {entry.symbol}: bot stalled ({reason}).")
+        elif overdue <= 0 and entry.stalled:
+            entry.stalled = False
+            self.logger.info(f"{entry.symbol}: bot recovered from stall.")
+            if self.messenger:
+                self.messenger.send(f"✅ {entry.symbol}: bot recovered.")
+
+        if now - entry.started_at > self.healthy_after:
+            entry.restarts = 0
+
+    def _handle_dead(self, entry, now):
+        if entry.bot.should_stop:
+            return  # Stopped on purpose
+        if entry.restart_at is None:
+            delay = min(self.backoff_base * 2 ** entry.restarts, self.backoff_max)
+            entry.restart_at = now + delay
+            self.logger.info("-------------------------------------------------")
+            self.logger.error(f"{entry.symbol}: bot thread died, restarting in {delay}s (restart #{entry.restarts + 1}).")
+            if self.messenger:
+                self.messenger.send(f"⚠️ {entry.symbol}: bot thread died, restarting in {delay}s.")
+            return
+        if now < entry.restart_at:
+            return
+
+        state = entry.bot.last_state
+        entry.bot.stop()  # Release its scheduled events
+        bot = self.bot_factory(entry.symbol)
+        if state:
+            bot.restore_state(state)
+        thread = self.thread_manager.create_thread(target=bot.run, name=f"BotThread-{entry.symbol}")
+        with self._lock:
+            restarted = SupervisedBot(entry.symbol, bot, thread)
+            restarted.restarts = entry.restarts + 1
+            self.entries[entry.symbol] = restarted
+        self.logger.info(f"{entry.symbol}: bot restarted with restored state.")
+
+    def stop_all(self, timeout=None):
+        """Stop every bot, interrupting its sleep, and wait for the threads to finish."""
+        with self._lock:
+            entries = list(self.entries.values())
+            self.entries = {}
+        for entry in entries:
+            entry.bot.stop()
+        timeout = self.cycle_timeout if timeout is None else timeout
+        for entry in entries:
+            if entry.thread is not None:
+                entry.thread.join(timeout)
+                if entry.thread.is_alive():
+                    self.logger.error(f"{entry.symbol}: bot thread did not stop within {timeout}s.")
+
+
 class MarketStatus:
-    def __init__(self):
+    def __init__(self, calendar=None, symbol=None):
+        # The session calendar is the single source of truth for trading hours
+        self.calendar = calendar if calendar else SessionCalendar()
+        self.symbol = symbol
         self.is_market_open = False  # Initially set to False
         self.update_market_status()  # Update the market status immediately
 
     def check_market_open(self):
         # Check if the market is open
-        current_time = datetime.utcnow()
-        current_day_of_week = current_time.weekday()
-        current_hour = current_time.hour
-
-        # if friday and time is past 10pm
-        if current_day_of_week == 4 and current_hour > 22:
-            return False
-        
-        # If it's Saturday (5) or Sunday (6), the market is closed
-        if current_day_of_week == 5 or (current_day_of_week == 6 and current_hour < 23):
-            return False
-
-        # Otherwise, the market is open
-        return True
+        return self.calendar.is_open(symbol=self.symbol)
 
     def update_market_status(self):
         # Update the market status
         self.is_market_open = self.check_market_open()
-       
+
+    def seconds_until_change(self, when=None):
+        """Seconds until the market next opens or closes."""
+        return self.calendar.seconds_until_transition(when, symbol=self.symbol)
+
 
 
 class TradeEngine:
-    def __init__(self, mt5_connector, market_status, config, messenger, inspirer, logger, thread_manager):
+    def __init__(self, mt5_connector, market_status, config, messenger, inspirer, logger, thread_manager, timer_service=None, market_data=None):
         self.connector = mt5_connector
         self.market_status = market_status
         self.config = config  
@@ -198,40 +340,253 @@ class TradeEngine:
         self.thread_manager = thread_manager
         self.market_open_message_printed = False
         self.market_closed_message_printed = False
-        self.bots = []
 
         self.key_capture = KeyCapture()
+
+        # One shared timer runs every scheduled job: market status, bar closes,
+        # daily resets, reconciliation and bot cycle wake-ups
+        engine_config = self.config.get('engine', {})
+        self.timer_service = timer_service if timer_service else TimerService(
+            engine_config.get('timer_workers', 4), logger=self.logger,
+            blocking_workers=engine_config.get('timer_blocking_workers', 4))
+        self.reconcile_interval = engine_config.get('reconcile_interval', 10)
+        self.watchdog_interval = engine_config.get('watchdog_interval', 5)
+        self.health_interval = engine_config.get('health_interval', 15)
+        self.health_job = None
+        self.market_status_job = None
+        self.reconcile_job = None
+        self.watchdog_job = None
+        self.market_status_checked = False
+
+        # Databases, archive and warm start file of this engine live under data_dir (one per account)
+        self.data_dir = engine_config.get('data_dir', '')
+        if self.data_dir:
+            os.makedirs(self.data_dir, exist_ok=True)
+        self.trades_db = self.data_path('trades.db')
+
+        # Clock, session boxes, bars and the shared memory feed of a trade server are shared by every
+        # account on it when an AccountManager runs several engines (accounts.ServerMarketData)
+        self.market_data = market_data
+
+        # Broker-time scheduler shared by all bots (bar closes, daily reset)
+        if market_data:
+            self.broker_clock = market_data.broker_clock
+        else:
+            self.broker_clock = BrokerClock(self.config['trading_config']['symbols'][:3], logger=self.logger, terminal=self.connector.mt5)
+        self.bar_scheduler = BarScheduler(self.broker_clock, self.timer_service, logger=self.logger)
+        self.connector.reconnect_listeners.append(self.broker_clock.refresh)
+
+        # Symbol specifications are fetched once per connection and shared by all bots
+        self.symbol_specs = SymbolSpecCache(self.connector, self.config['trading_config']['symbols'], logger=self.logger)
+        self.connector.reconnect_listeners.append(self.symbol_specs.refresh)
+
+        # Trailing stops of every bot go through one manager so the account's modify rate is capped
+        self.stop_interval = engine_config.get('stop_interval', 5)
+        self.stop_manager = StopManager(self.connector, self.symbol_specs,
+                                        min_step_pips=engine_config.get('stop_min_step_pips', 1.0),
+                                        rate_limit=engine_config.get('modify_rate_limit', 5.0),
+                                        burst=engine_config.get('modify_burst', 10), logger=self.logger)
+        self.stop_job = None
+
+        # Mark-to-market and exposure of all open positions, queried by bots and metrics
+        self.portfolio_interval = engine_config.get('portfolio_interval', 5)
+        self.portfolio = Portfolio(self.symbol_specs, logger=self.logger)
+        self.portfolio_job = None
+
+        # Deal history synced incrementally for every bot, with running performance aggregates
+        self.history_interval = engine_config.get('history_interval', 60)
+        self.trade_history = TradeHistory(self.connector, db_name=self.trades_db, logger=self.logger)
+        self.history_job = None
+
+        # Trade tables are created here once instead of by every bot; bots are built and seeded in parallel
+        DatabaseManager(self.trades_db, logger=self.logger).create_tables(TRADE_TABLES)
+        self.startup_workers = engine_config.get('startup_workers', 8)
+
+        # Symbol specs, recent bars and indicator values saved at shutdown and every warm_start_interval
+        # seconds, so the next start only fetches what changed (an empty file name disables it)
+        warm_start_file = engine_config.get('warm_start_file', 'warm_start.npz')
+        self.warm_start = WarmStart(self.data_path(warm_start_file), keep_bars=engine_config.get('warm_start_bars', 2000),
+                                    max_age=engine_config.get('warm_start_max_age', 4 * 86400), logger=self.logger) if warm_start_file else None
+        self.warm_start_interval = engine_config.get('warm_start_interval', 300)
+        self.warm_start_job = None
+
+        # Closed trades older than archive_days move to the columnar archive at every market close
+        self.archive_days = engine_config.get('archive_days', 90)
+        self.trade_archive = TradeArchive(self.trades_db, directory=self.data_path(engine_config.get('archive_dir', 'archive')),
+                                          logger=self.logger)
+
+        # Requested vs fill price and latency of every market order, one table per day
+        self.fill_recorder = FillRecorder(self.data_path('fills.db'), symbol_specs=self.symbol_specs, logger=self.logger)
+
+        # Box levels of every session window, computed once per (symbol, day, session) for all bots
+        self.session_boxes = market_data.session_boxes(self.box_sessions()) if market_data else \
+            SessionBoxes(self.box_sessions(), clock=self.broker_clock, logger=self.logger)
+
+        # Indicators memoized per (symbol, timeframe, indicator, params) for every strategy of every bot
+        self.indicator_cache = IndicatorCache(logger=self.logger)
+
+        # Latest quotes and bars of every symbol in shared memory, for research/dashboard processes
+        self.market_snapshot = None
+        snapshot_name = engine_config.get('snapshot_name', 'tracy_feed')
+        if market_data:
+            # One feed per server, written by the first engine trading each symbol
+            self.market_snapshot = market_data.market_snapshot
+        elif snapshot_name:
+            timeframe = self.config['trading_config']['timeframe']
+            timeframes = sorted({mt5.TIMEFRAME_M1, timeframe, mt5.TIMEFRAME_H1}, key=timeframe_seconds)
+            try:
+                self.market_snapshot = MarketSnapshotWriter(snapshot_name, self.config['trading_config']['symbols'], timeframes,
+                                                            capacity=engine_config.get('snapshot_bars', 500), logger=self.logger)
+            except OSError as e:
+                self.logger.error(f"Shared market snapshot disabled: {e}")
+
+        # Bot threads are started, watched and restarted by the supervisor
+        self.supervisor = BotSupervisor(self.thread_manager, self.create_bot, self.logger, messenger=self.messenger,
+                                        cycle_timeout=engine_config.get('cycle_timeout', 30),
+                                        stall_grace=engine_config.get('stall_grace', 30),
+                                        backoff_max=engine_config.get('restart_backoff_max', 300))
         self.kill_threads = False  # Flag to control the main loop
 
+        # Localhost JSON status of the engine and its bots (an empty port disables it)
+        status_port = engine_config.get('status_port', 8765)
+        self.status_server = StatusServer(self.status, host=engine_config.get('status_host', '127.0.0.1'), port=status_port,
+                                          logger=self.logger) if status_port else None
+
         # Retry parameters
         self.max_retries = 3  # Maximum number of retries
         self.retry_delay = 10  # Delay between retries in seconds
+
+        # Upper bound on a single market status wait, so a wall clock adjustment
+        # cannot leave the monitor asleep past a transition
+        self.max_status_wait = 3600
         self.logger.info("-------------------------------------------------")
         self.logger.info(f"TradeEngine initialized")
 
+    def data_path(self, name):
+        return os.path.join(self.data_dir, name)
+
 
     
     def start(self):
-        # Start the market monitoring in a separate thread
-        self.thread_manager.create_thread(target=self.monitor_and_update_market_status)
+        # Market monitoring and reconciliation run as jobs on the shared timer
+        self.timer_service.start()
+        self.market_status_job = self.timer_service.schedule(self.next_market_check, self.monitor_and_update_market_status,
+                                                             name="market status", blocking=True)
+        self.reconcile_job = self.timer_service.call_every(self.reconcile_interval, self.request_reconciliation,
+                                                           name="position reconciliation")
+        self.watchdog_job = self.timer_service.call_every(self.watchdog_interval, self.supervisor.check,
+                                                          name="bot watchdog", blocking=True)
+        self.health_job = self.timer_service.call_every(self.health_interval, self.check_connection,
+                                                        name="connection health", blocking=True)
+        self.stop_job = self.timer_service.call_every(self.stop_interval, self.manage_stops,
+                                                      name="stop management", blocking=True)
+        self.portfolio_job = self.timer_service.call_every(self.portfolio_interval, self.mark_portfolio,
+                                                           name="portfolio mark", blocking=True)
+        self.history_job = self.timer_service.call_every(self.history_interval, self.sync_history,
+                                                         name="deal history sync", blocking=True)
+        if self.warm_start is not None:
+            self.warm_start_job = self.timer_service.call_every(self.warm_start_interval, self.save_warm_start,
+                                                                name="warm start save", blocking=True)
+        if self.status_server is not None:
+            self.status_server.start()
+        # pandas and requests are imported on first use; load them while the engine waits for the market
+        threading.Thread(target=self.preload_modules, name="Preload", daemon=True).start()
         self.logger.info("-------------------------------------------------")
         self.logger.info(f"TradeEngine Started")
 
+    def preload_modules(self):
+        for name in ('pandas', 'requests'):
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                self.logger.error(f"Could not preload {name}: {e}")
+
+    def next_market_check(self, after):
+        """Deadline function for the market status job: immediately, then at every open/close transition."""
+        if not self.market_status_checked:
+            self.market_status_checked = True
+            return after, ()
+        # Wake exactly at the next transition instead of polling
+        wait = self.market_status.seconds_until_change(after)
+        wait = self.max_status_wait if wait is None else min(wait, self.max_status_wait)
+        self.logger.info(f"Next market status check in {wait:.0f} seconds.")
+        return after + wait, ()
 
     def monitor_and_update_market_status(self):
         try:
-            while not self.kill_threads:
-                self.market_status.update_market_status()
-                if self.market_status.is_market_open:
-                    self.handle_market_open()
-                else:
-                    self.handle_market_close()
-                time.sleep(10)  # Check market status every 10 seconds
+            if self.kill_threads:
+                return
+            self.market_status.update_market_status()
+            if self.market_status.is_market_open:
+                self.handle_market_open()
+            else:
+                self.handle_market_close()
         except Exception as e:
             self.logger.info("-------------------------------------------------")
             self.logger.error(f"Error in monitor_and_update_market_status: {e}")
             # Handle the error or decide to retry, log, etc.
 
+    def check_connection(self):
+        """Timer job: probe the terminal while the market is open and reconnect without touching the bots."""
+        if self.kill_threads or not self.market_status.is_market_open or not self.market_open_message_printed:
+            return
+        if self.connector.is_connected and self.connector.probe():
+            return
+        if self.connector.reconnect():
+            stats = self.connector.reconnect_stats()
+            self.messenger.send(f"🔌 Reconnected to MT5 in {stats['last']:.1f}s.")
+            # Bring up any bots that could not be created while the terminal was unreachable
+            self.create_bots()
+        else:
+            self.logger.error("MT5 reconnect failed, will retry on the next health check.")
+
+    def manage_stops(self):
+        """Timer job: trail the stops of all open positions in one pass."""
+        if self.kill_threads or not self.market_status.is_market_open or not self.connector.is_connected:
+            return
+        self.stop_manager.run()
+        counters = self.stop_manager.counters
+        self.logger.debug(f"Stop modifications sent: {counters['sent']}, suppressed: {self.stop_manager.suppressed} "
+                          f"(min step {counters['min_step']}, in flight {counters['in_flight']}, "
+                          f"rate limited {counters['rate_limited']}), no change: {counters['no_change']}, "
+                          f"failed: {counters['failed']}")
+
+    def mark_portfolio(self):
+        """Timer job: revalue the open positions."""
+        if self.kill_threads or not self.market_status.is_market_open or not self.connector.is_connected:
+            return
+        self.portfolio.refresh(self.connector)
+
+    def sync_history(self):
+        """Timer job: pull new deals into the trade history."""
+        if self.kill_threads or not self.market_status.is_market_open or not self.connector.is_connected:
+            return
+        self.trade_history.sync()
+
+    def account_identity(self):
+        return [self.connector.server, self.connector.account]
+
+    def save_warm_start(self, bots=None):
+        """
+        Timer job: save the bars each bot captured at the end of its last requested cycle, and ask
+        for fresh ones. At shutdown `bots` are given (their threads have stopped) and read directly.
+        """
+        if self.warm_start is None or (bots is None and not self.market_status.is_market_open):
+            return
+        bar_states = {}
+        for bot in (self.bots if bots is None else bots):
+            state = bot.bar_aggregator.state(self.warm_start.keep_bars) if bots is not None and bot.bars_seeded else bot.bar_state
+            bot.bar_state_due = True
+            if state is not None:
+                bar_states[bot.symbol] = state
+        if bar_states:
+            self.warm_start.save(self.account_identity(), self.symbol_specs.state(), bar_states, self.indicator_cache.state())
+
+    def request_reconciliation(self):
+        """Timer job: ask every bot to reconcile its positions on its next cycle."""
+        for bot in self.bots:
+            bot.request_reconcile()
+
     def handle_market_open(self):
         if not self.market_open_message_printed:
             self.messenger.send('Market is open.. 🎉')
@@ -251,7 +606,21 @@ class TradeEngine:
                 if self.connector.is_connected:
                     self.logger.info("-------------------------------------------------")
                     self.logger.info("Successfully initialized to MT5.")
+                    self.broker_clock.refresh()
+                    warm = self.warm_start is not None and self.warm_start.load(self.account_identity())
+                    if warm:
+                        # The last run's specs stand in until they are refreshed once the bots are up
+                        self.symbol_specs.restore(self.warm_start.specs)
+                        self.indicator_cache.restore(self.warm_start.indicators)
+                    else:
+                        self.symbol_specs.load()
+                    account = self.connector.call('account_info')
+                    if account is not None:
+                        self.portfolio.account_currency = account.currency
+                    self.bar_scheduler.start()
                     self.create_bots()
+                    if warm:
+                        self.timer_service.call_later(0, self.symbol_specs.refresh, name="symbol spec refresh")
                     return True
             except Exception as e:
                 self.logger.info("-------------------------------------------------")
@@ -276,85 +645,165 @@ class TradeEngine:
             self.market_closed_message_printed = True
             self.market_open_message_printed = False
             self.stop_bots()
+            self.bar_scheduler.stop()
             self.disconnect_from_market()
+            if self.archive_days:
+                self.trade_archive.archive(self.archive_days)
+
+    def box_sessions(self):
+        """Session windows from strategy_params.box_sessions; by default the box window the bots trade."""
+        params = self.config['strategy_params']
+        if params.get('box_sessions'):
+            return params['box_sessions']
+        close_time = params.get('box_close_time', '02:00')
+        hour, minute = (int(part) for part in close_time.split(':'))
+        length = self.config['date_range']['to_data'] * timeframe_seconds(self.config['trading_config']['timeframe']) // 60
+        start = (hour * 60 + minute - length) % 1440
+        return {'london': {'timezone': 'UTC', 'start': f"{start // 60:02d}:{start % 60:02d}", 'end': close_time}}
+
+    def create_bot(self, symbol, started_at=None):
+        """Build (but do not start) the bot for one symbol."""
+        return Bot(
+            mt5_connector=self.connector,
+            market_status=self.market_status,
+            symbol=symbol, 
+            timeframe=self.config['trading_config']['timeframe'], 
+            from_data=self.config['date_range']['from_data'], 
+            to_data=self.config['date_range']['to_data'], 
+            lot=self.config['trading_config']['lot'], 
+            deviation=self.config['trading_config']['deviation'], 
+            magic1=self.config['strategy_params']['magic_numbers']['magic1'], 
+            magic2=self.config['strategy_params']['magic_numbers']['magic2'], 
+            magic3=self.config['strategy_params']['magic_numbers']['magic3'], 
+            tp_pips=self.config['strategy_params']['tp_pips'], 
+            atr_sl_multiplier=self.config['strategy_params']['atr_sl_multiplier'], 
+            atr_period=self.config['strategy_params']['atr_period'], 
+            max_dist_atr_multiplier=self.config['strategy_params']['max_dist_atr_multiplier'], 
+            trail_atr_multiplier=self.config['strategy_params']['trail_atr_multiplier'], 
+            pip_range=self.config['trading_config']['pip_range'],
+            webhook_url=self.config['details']['webhook_url'],
+            scheduler=self.bar_scheduler,
+            box_close_time=self.config['strategy_params'].get('box_close_time', '02:00'),
+            reset_times=self.config['strategy_params'].get('daily_reset_times', ['01:00', '22:00']),
+            timer_service=self.timer_service,
+            symbol_specs=self.symbol_specs,
+            stop_manager=self.stop_manager,
+            portfolio=self.portfolio,
+            trade_history=self.trade_history,
+            fill_recorder=self.fill_recorder,
+            market_snapshot=self.market_snapshot if self.market_data is None or self.market_data.claim_feed(symbol, self) else None,
+            indicator_cache=self.indicator_cache,
+            strategies=self.config['strategy_params'].get('strategies', ['london_break']),
+            session_boxes=self.session_boxes,
+            create_tables=False,
+            started_at=started_at,
+            warm_start=self.warm_start,
+            db_name=self.trades_db,
+            shared_bars=self.market_data
+        )
+
+    def bring_up_bot(self, symbol, started_at):
+        """Build a bot and seed its bars, so its first cycle only fetches ticks."""
+        bot = self.create_bot(symbol, started_at=started_at)
+        if not bot.seed_bars():
+            self.logger.warning(f"{symbol}: bars not seeded at bring-up, the first cycle will retry.")
+        return bot
 
     def create_bots(self):
-        """Create and start bot instances for each trading symbol specified in the configuration, using the ThreadManager for thread handling and tracking."""
+        """Create and start bot instances for each trading symbol specified in the configuration, using the BotSupervisor for thread handling and tracking."""
         if not self.connector.is_connected:
             self.logger.info("-------------------------------------------------")
             self.logger.error("MT5 connector is not connected. Cannot create bots.")
             return
         
+        # Avoid duplicates if method is called again
+        symbols = [symbol for symbol in self.config['trading_config']['symbols'] if symbol not in self.supervisor.entries]
+        if not symbols:
+            return
         self.logger.info("-------------------------------------------------")
         self.logger.info("Creating trading bots for each symbol...")
-
-        # Clear existing bots list to avoid duplicates if method is called again
-        self.bots = []
-        self.threads = []  # Initialize or clear the threads list
-
-        for symbol in self.config['trading_config']['symbols']:
-            try:
-                bot = Bot(
-                    mt5_connector=self.connector,
-                    market_status=self.market_status,
-                    symbol=symbol, 
-                    timeframe=self.config['trading_config']['timeframe'], 
-                    from_data=self.config['date_range']['from_data'], 
-                    to_data=self.config['date_range']['to_data'], 
-                    lot=self.config['trading_config']['lot'], 
-                    deviation=self.config['trading_config']['deviation'], 
-                    magic1=self.config['strategy_params']['magic_numbers']['magic1'], 
-                    magic2=self.config['strategy_params']['magic_numbers']['magic2'], 
-                    magic3=self.config['strategy_params']['magic_numbers']['magic3'], 
-                    tp_pips=self.config['strategy_params']['tp_pips'], 
-                    atr_sl_multiplier=self.config['strategy_params']['atr_sl_multiplier'], 
-                    atr_period=self.config['strategy_params']['atr_period'], 
-                    max_dist_atr_multiplier=self.config['strategy_params']['max_dist_atr_multiplier'], 
-                    trail_atr_multiplier=self.config['strategy_params']['trail_atr_multiplier'], 
-                    pip_range=self.config['trading_config']['pip_range'],
-                    webhook_url=self.config['details']['webhook_url']
-                )
-                self.bots.append(bot)
-                self.logger.info("-------------------------------------------------")
-                self.logger.info(f"Created bot for {symbol}.")
-
-                # Use ThreadManager to manage the bot's thread and append the thread reference to the list
-                thread = self.thread_manager.create_thread(target=bot.run, name=f"BotThread-{symbol}")
-                if thread is not None:
+        started_at = time.time()
+
+        # Bots are built and seeded concurrently; each one starts trading as soon as it is ready
+        with ThreadPoolExecutor(max_workers=max(1, min(self.startup_workers, len(symbols))), thread_name_prefix="BotStartup") as pool:
+            futures = {pool.submit(self.bring_up_bot, symbol, started_at): symbol for symbol in symbols}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    bot = future.result()
                     self.logger.info("-------------------------------------------------")
-                    self.logger.info(f"{thread.name}: Trading.....")
-                else:
+                    self.logger.info(f"Created bot for {symbol} in {time.time() - started_at:.3f}s.")
+
+                    # The supervisor starts the bot's thread through the ThreadManager and watches it
+                    thread = self.supervisor.add(symbol, bot)
+                    if thread is not None:
+                        self.logger.info("-------------------------------------------------")
+                        self.logger.info(f"{thread.name}: Trading.....")
+                    else:
+                        self.logger.info("-------------------------------------------------")
+                        self.logger.error(f"Failed to start thread for bot {symbol}.")
+                except Exception as e:
                     self.logger.info("-------------------------------------------------")
-                    self.logger.error(f"Failed to start thread for bot {symbol}.")
-            except Exception as e:
-                self.logger.info("-------------------------------------------------")
-                self.logger.error(f"Failed to create bot for {symbol}: {str(e)}")
+                    self.logger.error(f"Failed to create bot for {symbol}: {str(e)}")
+        self.logger.info(f"{len(symbols)} bot(s) brought up in {time.time() - started_at:.3f}s.")
+
+    @property
+    def bots(self):
+        return self.supervisor.bots()
 
+    def status(self):
+        """
+        Engine and bot status for the status API. Built from the status each bot published at the
+        end of its last cycle and the latest portfolio mark: no locks are taken and MT5 is not called.
+        """
+        now = time.time()
+        bots = {}
+        for entry in list(self.supervisor.entries.values()):
+            bot = entry.bot
+            started = bot.cycle_started
+            bots[entry.symbol] = {
+                **(bot.status or {'symbol': entry.symbol, 'published': None}),
+                'alive': entry.thread is not None and entry.thread.is_alive(),
+                'stalled': entry.stalled,
+                'restarts': entry.restarts,
+                'cycle_running_for': now - started if started is not None else None,
+                'next_cycle_in': bot.next_cycle_due - now if bot.next_cycle_due is not None else None,
+                'time_to_first_tick': bot.time_to_first_tick,
+            }
+        mark = self.portfolio.latest
+        return {
+            'time': now,
+            'account': self.connector.account,
+            'server': self.connector.server,
+            'market_open': self.market_status.is_market_open,
+            'connected': self.connector.is_connected,
+            'portfolio': {key: mark[key] for key in ('time', 'positions', 'unrealized', 'risk_to_sl', 'unprotected', 'by_symbol', 'exposure')}
+                         if mark else None,
+            'stops': dict(self.stop_manager.counters),
+            'bots': bots,
+        }
+
+    def stop_status_server(self):
+        if self.status_server is not None:
+            self.status_server.stop()
 
+    def close_snapshot(self):
+        """Release the shared market snapshot (readers keep their mapping until they close it)."""
+        if self.market_snapshot is not None and self.market_data is None:
+            self.market_snapshot.close()
+            self.market_snapshot = None
 
     def stop_bots(self):
         """Signals all bots to stop and waits for their threads to finish."""
         self.logger.info("-------------------------------------------------")
         self.logger.info("Stopping all bots...")
 
-        # Check if bots and threads lists are initialized and not empty
-        if not hasattr(self, 'bots') or not self.bots:
+        if not self.supervisor.entries:
             self.logger.info("No bots was initialized.")
         else:
-            # Signal each bot to stop, safely checking for initialization
-            for bot in self.bots:
-                if bot:  # Assuming 'None' or similar checks are adequate to determine initialization
-                    bot.stop()
-
-        if not hasattr(self, 'threads') or not self.threads:
-            self.logger.info("No bot threads have been initialized.")
-        else:
-            # Wait for all threads to finish, safely checking for initialization
-            for thread in self.threads:
-                if thread:  # Similarly, ensure the thread is properly initialized
-                    thread.join()  # Assuming these are threading.Thread objects or have a similar join method
-                else:
-                    self.logger.info("A thread was not initialized. Skipping join.")
+            bots = self.bots
+            self.supervisor.stop_all()
+            self.save_warm_start(bots)
             
         self.logger.info("-------------------------------------------------")
         self.logger.info("System deinitialized.")
@@ -364,12 +813,13 @@ class TradeEngine:
     
     
 class InspireTraders:
-    def __init__(self, messenger, json_file, schedules=None):
+    def __init__(self, messenger, json_file, schedules=None, logger=None):
   
         self.messenger = messenger
-        self.kill_threads = False
         self.json_file = json_file
         self.schedules = schedules
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.jobs = []
 
     def get_random_message(self, key):
         with open(self.json_file, 'r', encoding='utf-8') as file:  # add encoding parameter here
@@ -381,13 +831,17 @@ class InspireTraders:
         self.messenger.send(message)
         print(f"{message} (Inspiring message sent!)")
 
-    def run(self):
+    def schedule_messages(self, timer_service):
+        """Register the daily inspirational messages on the shared timer."""
+        for schedule_time, key in self.schedules or []:
+            self.jobs.append(timer_service.schedule(daily_at(schedule_time), self.send_message, key,
+                                                    name=f"inspire {key} at {schedule_time}"))
         self.logger.info("-------------------------------------------------")
-        self.logger.info("InspireTraders thread started...")
-        for schedule_time, key in self.schedules:
-            schedule.every().day.at(schedule_time).do(self.send_message, key)
-        while not self.kill_threads[0]:
-            schedule.run_pending()
-            time.sleep(1)
+        self.logger.info(f"InspireTraders scheduled {len(self.jobs)} message(s).")
+
+    def cancel_messages(self, timer_service):
+        for job in self.jobs:
+            timer_service.cancel(job)
+        self.jobs = []
         self.logger.info("-------------------------------------------------")
-        self.logger.info("InspireTraders thread stopped.")
\ No newline at end of file
+        self.logger.info("InspireTraders messages cancelled.")
@@ -33,6 +33,19 @@ class DatabaseManager:
         finally:
             self.close()
 
+    def create_tables(self, tables):
+        """Create every {table_name: schema} that does not exist yet, on one connection."""
+        try:
+            self.open()
+            for table_name, schema in tables.items():
+                self.execute_sql(f'CREATE TABLE IF NOT EXISTS {table_name}({schema})')
+            self.commit()
+            self.logger.info(f"Tables {', '.join(tables)} created or already exist.")
+        except Error as e:
+            self.logger.error(f"Error creating tables {', '.join(tables)}: {e}")
+        finally:
+            self.close()
+
     def insert_item(self, table_name, columns, values):
         try:
             self.open()
@@ -0,0 +1,155 @@
+from mt5api import mt5
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+
+FILL_COLUMNS = ('sent_at', 'acked_at', 'tick_msc', 'symbol', 'magic', 'side', 'kind', 'volume',
+                'requested', 'price', 'pip', 'retcode', 'ticket', 'signal_msc', 'signal_price')
+
+
+def day_table(day):
+    """Name of the fills table of a date (UTC)."""
+    return f"fills_{day:%Y%m%d}"
+
+
+class FillRecorder:
+    """
+    Records every market order's outcome: requested price, fill price, the time of
+    the tick the decision was made on (server time), local send and ack times and
+    the retcode. Rows go to one small table per UTC day (fills_YYYYMMDD) so a day
+    can be analysed or dropped on its own.
+
+    Slippage is signed in pips with positive meaning worse than requested; the
+    analysis helpers group it and the send-to-ack latency per symbol, hour of day
+    or magic number. Orders sent on a breakout also carry the breaking tick (time
+    and bid), which shows what the time between the break and the order cost.
+    Tick and signal times are both server time, so their difference needs no
+    clock offset.
+    """
+
+    def __init__(self, db_name='fills.db', symbol_specs=None, logger=None):
+        self.db_name = db_name
+        self.symbol_specs = symbol_specs
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._tables = set()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_name, timeout=30)
+
+    def _ensure_table(self, conn, table):
+        if table not in self._tables:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {table}(sent_at REAL, acked_at REAL, tick_msc INTEGER, symbol TEXT, '
+                         'magic INTEGER, side INTEGER, kind TEXT, volume REAL, requested REAL, price REAL, pip REAL, '
+                         'retcode INTEGER, ticket INTEGER, signal_msc INTEGER, signal_price REAL)')
+            self._tables.add(table)
+
+    def record(self, request, result, tick, sent_at, latency, kind='open', signal=None):
+        """
+        Record one order_send. `tick` is the snapshot the request was priced from,
+        `sent_at` the local epoch just before sending and `latency` the seconds until it returned.
+        `signal` is the breakout that triggered the order (TickScanner.scan), if any.
+        """
+        spec = self.symbol_specs.get(request['symbol']) if self.symbol_specs else None
+        filled = result is not None and result.retcode in (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_DONE_PARTIAL)
+        row = (
+            sent_at,
+            sent_at + latency,
+            int(tick.time_msc) if tick is not None else None,
+            request['symbol'],
+            int(request.get('magic', 0)),
+            int(request['type']),
+            kind,
+            float(request['volume']),
+            float(request['price']) if request.get('price') else None,
+            float(result.price) if filled and result.price else None,
+            spec.pip if spec else None,
+            result.retcode if result is not None else None,
+            int(result.order) if filled else None,
+            int(signal['time_msc']) if signal else None,
+            float(signal['price']) if signal else None,
+        )
+        table = day_table(datetime.fromtimestamp(sent_at, tz=timezone.utc))
+        try:
+            with self._lock, self._connect() as conn:
+                self._ensure_table(conn, table)
+                conn.execute(f'INSERT INTO {table} VALUES (' + ', '.join('?' * len(FILL_COLUMNS)) + ')', row)
+        except sqlite3.Error as e:
+            self.logger.error(f"Failed to record fill for {request['symbol']}: {e}")
+
+    def send(self, request, tick=None, kind='open', terminal=None):
+        """order_send (on `terminal`, the MT5 module by default) with the request recorded; returns the result."""
+        sent_at = time.time()
+        started = time.perf_counter()
+        try:
+            result = (terminal if terminal else mt5).order_send(request)
+        finally:
+            latency = time.perf_counter() - started
+        self.record(request, result, tick, sent_at, latency, kind)
+        return result
+
+    # ------------------------------------------------------------------
+    # Analysis
+    # ------------------------------------------------------------------
+
+    def load(self, days=1, end=None):
+        """Fills of the last `days` UTC days up to `end` (default today) as a DataFrame with derived columns."""
+        import pandas as pd
+        end = end or datetime.now(timezone.utc)
+        wanted = [day_table(end - timedelta(days=i)) for i in range(days)]
+        with self._connect() as conn:
+            existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'fills_%'")}
+            tables = [table for table in wanted if table in existing]
+            if not tables:
+                return pd.DataFrame(columns=FILL_COLUMNS)
+            data = pd.read_sql_query(' UNION ALL '.join(f'SELECT * FROM {table}' for table in tables), conn)
+        return self.enrich(data)
+
+    @staticmethod
+    def enrich(data):
+        """Add slippage (pips, positive = adverse), latency (ms) and hour of day to raw fills."""
+        import pandas as pd
+        side = np.where(data['side'].to_numpy() == 0, 1.0, -1.0)
+        difference = (data['price'].to_numpy(dtype=float) - data['requested'].to_numpy(dtype=float)) * side
+        data['slippage_pips'] = difference / data['pip'].to_numpy(dtype=float)
+        data['latency_ms'] = (data['acked_at'] - data['sent_at']) * 1000.0
+        data['hour'] = pd.to_datetime(data['sent_at'], unit='s', utc=True).dt.hour
+        data['filled'] = data['price'].notna()
+        data['adverse'] = data['slippage_pips'] > 0
+        # Break to pricing tick (server times), and fill against the bid at the break (includes the spread on buys)
+        data['signal_delay_ms'] = data['tick_msc'] - data['signal_msc']
+        signal_price = data['signal_price'].to_numpy(dtype=float)
+        data['signal_cost_pips'] = (data['price'].to_numpy(dtype=float) - signal_price) * side / data['pip'].to_numpy(dtype=float)
+        return data
+
+    def analyze(self, by='symbol', data=None, days=1):
+        """
+        Slippage and latency distributions grouped by 'symbol', 'hour' or 'magic' (or a list of them):
+        counts, fill rate, mean/median/p95 slippage in pips, share of adverse fills and latency percentiles.
+        """
+        import pandas as pd
+        data = self.load(days) if data is None else data
+        if data.empty:
+            return pd.DataFrame()
+        grouped = data.groupby(by)
+        filled = data[data['filled']].groupby(by)
+        report = pd.DataFrame({
+            'orders': grouped.size(),
+            'fill_rate': grouped['filled'].mean(),
+            'slippage_mean': filled['slippage_pips'].mean(),
+            'slippage_median': filled['slippage_pips'].median(),
+            'slippage_p95': filled['slippage_pips'].quantile(0.95),
+            'adverse_share': filled['adverse'].mean(),
+            'slippage_cost_pips': filled['slippage_pips'].sum(),
+            'signal_delay_median_ms': filled['signal_delay_ms'].median(),
+            'signal_cost_mean': filled['signal_cost_pips'].mean(),
+            'latency_median_ms': grouped['latency_ms'].median(),
+            'latency_p95_ms': grouped['latency_ms'].quantile(0.95),
+            'latency_max_ms': grouped['latency_ms'].max(),
+        })
+        return report
@@ -1,7 +1,8 @@
 import core
 import mt5utilities as util
-import MetaTrader5 as mt5
-import time
+from sessions import SessionCalendar
+from timers import TimerService
+from mt5api import mt5
 import json
 
 
@@ -15,6 +16,10 @@ def main():
     # Load configuration
     config = config_manager.get_config()
 
+    if config.get("accounts"):
+        run_accounts(config, logger)
+        return
+
     # Extract MT5 connection details
     details = config.get("details", {})
     mt5_connector = util.MT5Connector(account=details["account"],
@@ -24,13 +29,16 @@ def main():
     messenger = util.Messenger(details['webhook_url'])
 
     # Initialize Market Status, Thread Manager, and KeyCapture from the core module
-    market_status = core.MarketStatus()
+    calendar = SessionCalendar.from_config(config.get("market_calendar"), logger=logger)
+    market_status = core.MarketStatus(calendar)
     thread_manager = core.ThreadManager(logger)
     key_capture = core.KeyCapture()
+    timer_service = TimerService(config.get("engine", {}).get("timer_workers", 4), logger=logger,
+                                 blocking_workers=config.get("engine", {}).get("timer_blocking_workers", 4))
 
     # Assuming  Inspirer are to be properly initialized with webhook_url
     # For now, placeholders are used and should be replaced with actual initializations
-    inspirer1 = core.InspireTraders(messenger, 'tracy\inspirer1.json', None) # No schedule needed
+    inspirer1 = core.InspireTraders(messenger, 'tracy\inspirer1.json', None, logger=logger) # No schedule needed
 
 
     # Initialize Trade Engine with the connected MT5 connector and loaded configuration
@@ -40,25 +48,57 @@ def main():
                                     messenger=messenger,
                                     inspirer=inspirer1,
                                     logger=logger,
-                                    thread_manager=thread_manager)
+                                    thread_manager=thread_manager,
+                                    timer_service=timer_service)
 
     # Start the trade engine
     trade_engine.start()
+    inspirer1.schedule_messages(timer_service)
 
     # Main loop to keep the application running until ESC is pressed or a shutdown signal is received
     try:
-        while not key_capture.esc_pressed_check():
-            time.sleep(1)  # Sleep to reduce CPU usage
+        # Wait in short slices so Ctrl+C is still delivered on Windows
+        while not key_capture.esc_event.wait(1):
+            pass
     except KeyboardInterrupt:
         logger.info("-------------------------------------------------")
         logger.info("Shutdown requested...exiting")
     finally:
         # Perform any cleanup here
         trade_engine.stop_bots()
+        timer_service.stop()
+        trade_engine.stop_status_server()
+        trade_engine.close_snapshot()
         if mt5_connector.is_connected:
             mt5_connector.disconnect()
         logger.info("-------------------------------------------------")
         logger.info("Application shutdown successfully.")
 
+def run_accounts(config, logger):
+    """Trade every account listed under "accounts" from this process, one engine and terminal worker each."""
+    from accounts import AccountManager
+
+    calendar = SessionCalendar.from_config(config.get("market_calendar"), logger=logger)
+    market_status = core.MarketStatus(calendar)
+    thread_manager = core.ThreadManager(logger)
+    key_capture = core.KeyCapture()
+    timer_service = TimerService(config.get("engine", {}).get("timer_workers", 4), logger=logger,
+                                 blocking_workers=config.get("engine", {}).get("timer_blocking_workers", 4))
+
+    manager = AccountManager(config, market_status, thread_manager, timer_service, logger, inspirer_file='tracy\inspirer1.json')
+    manager.start()
+
+    try:
+        while not key_capture.esc_event.wait(1):
+            pass
+    except KeyboardInterrupt:
+        logger.info("-------------------------------------------------")
+        logger.info("Shutdown requested...exiting")
+    finally:
+        manager.stop()
+        timer_service.stop()
+        logger.info("-------------------------------------------------")
+        logger.info("Application shutdown successfully.")
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,284 @@
+import logging
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+MAGIC = 0x5452414359  # "TRACY"
+LAYOUT_VERSION = 1
+HEADER_FIELDS = 8  # magic, layout version, symbols, timeframes, capacity, created, writer pid, writer's resource tracker pid
+NAME_WIDTH = 32
+BAR_FIELDS = ('time', 'open', 'high', 'low', 'close', 'tick_volume')
+
+
+def _layout(n_symbols, n_timeframes, capacity):
+    """Offsets of every array in the segment: [(name, dtype, shape, offset)], total size."""
+    arrays = [
+        ('header', np.int64, (HEADER_FIELDS,)),
+        ('timeframes', np.int64, (n_timeframes,)),
+        ('names', f'S{NAME_WIDTH}', (n_symbols,)),
+        ('seq', np.uint64, (n_symbols,)),  # Per-symbol seqlock: odd while the symbol is being written
+        ('quote', np.float64, (n_symbols, 2)),  # bid, ask
+        ('quote_time', np.int64, (n_symbols,)),  # time_msc of the latest tick (server time)
+        ('bar_count', np.int64, (n_symbols, n_timeframes)),
+        ('bar_next', np.int64, (n_symbols, n_timeframes)),
+        ('forming', np.float64, (n_symbols, n_timeframes, len(BAR_FIELDS))),  # time is NaN when none
+        ('bars', np.float64, (n_symbols, n_timeframes, capacity, len(BAR_FIELDS))),
+    ]
+    layout, offset = [], 0
+    for name, dtype, shape in arrays:
+        dtype = np.dtype(dtype)
+        offset = (offset + 63) // 64 * 64  # Cache line aligned
+        layout.append((name, dtype, shape, offset))
+        offset += dtype.itemsize * int(np.prod(shape))
+    return layout, offset
+
+
+def _map(buffer, layout):
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset) for name, dtype, shape, offset in layout}
+
+
+class MarketSnapshotWriter:
+    """
+    Publishes the latest bid/ask/time and the rolling bars of every symbol into a
+    named shared memory segment with a fixed, array-only layout.
+
+    Each symbol has its own seqlock counter: the writer makes it odd, updates the
+    symbol's quote and bars, then makes it even again, so readers in any process
+    detect a torn read and retry instead of taking a lock. Each symbol must have a
+    single writing thread (its bot), which is how attach() wires it.
+    """
+
+    def __init__(self, name, symbols, timeframes, capacity=500, logger=None):
+        self.name = name
+        self.symbols = list(symbols)
+        self.timeframes = list(timeframes)
+        self.capacity = capacity
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.timeframe_index = {timeframe: i for i, timeframe in enumerate(self.timeframes)}
+
+        layout, size = _layout(len(self.symbols), len(self.timeframes), capacity)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a process that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.arrays = _map(self.shm.buf, layout)
+        a = self.arrays
+        a['timeframes'][:] = self.timeframes
+        a['names'][:] = [symbol.encode()[:NAME_WIDTH] for symbol in self.symbols]
+        a['seq'][:] = 0
+        a['quote'][:] = np.nan
+        a['quote_time'][:] = 0
+        a['bar_count'][:] = 0
+        a['bar_next'][:] = 0
+        a['forming'][:] = np.nan
+        # The header goes last: readers only accept a segment whose magic is set
+        a['header'][:] = (0, LAYOUT_VERSION, len(self.symbols), len(self.timeframes), capacity,
+                          int(time.time()), os.getpid(), _tracker_pid())
+        a['header'][0] = MAGIC
+        self.logger.info(f"Publishing market snapshot '{name}' for {len(self.symbols)} symbol(s), {size / 1e6:.1f} MB.")
+
+    # ------------------------------------------------------------------
+    # Writing (one thread per symbol)
+    # ------------------------------------------------------------------
+
+    def _begin(self, i):
+        self.arrays['seq'][i] += 1
+
+    def _end(self, i):
+        self.arrays['seq'][i] += 1
+
+    def publish_quote(self, symbol, bid, ask, time_msc):
+        i = self.symbol_index[symbol]
+        self._begin(i)
+        try:
+            self.arrays['quote'][i] = (bid, ask)
+            self.arrays['quote_time'][i] = time_msc
+        finally:
+            self._end(i)
+
+    def publish_bar(self, symbol, timeframe, bar):
+        """Append a closed bar (dict or sequence in BAR_FIELDS order)."""
+        i = self.symbol_index[symbol]
+        j = self.timeframe_index.get(timeframe)
+        if j is None:
+            return
+        values = [bar[field] for field in BAR_FIELDS] if isinstance(bar, dict) else bar
+        self._begin(i)
+        try:
+            self._append(i, j, values)
+        finally:
+            self._end(i)
+
+    def _append(self, i, j, values):
+        a = self.arrays
+        slot = a['bar_next'][i, j]
+        a['bars'][i, j, slot] = values
+        a['bar_next'][i, j] = (slot + 1) % self.capacity
+        a['bar_count'][i, j] = min(a['bar_count'][i, j] + 1, self.capacity)
+
+    def publish_series(self, symbol, aggregator):
+        """Copy everything the aggregator holds for `symbol` (closed bars and forming bars)."""
+        i = self.symbol_index[symbol]
+        self._begin(i)
+        try:
+            for timeframe, j in self.timeframe_index.items():
+                series = aggregator.series.get(timeframe)
+                if series is None:
+                    continue
+                count = min(series.count, self.capacity)
+                self.arrays['bar_count'][i, j] = 0
+                self.arrays['bar_next'][i, j] = 0
+                if count:
+                    self.arrays['bars'][i, j, :count] = np.column_stack([series.values(field, count) for field in BAR_FIELDS])
+                    self.arrays['bar_next'][i, j] = count % self.capacity
+                    self.arrays['bar_count'][i, j] = count
+                self._write_forming(i, j, series.forming)
+        finally:
+            self._end(i)
+
+    def _write_forming(self, i, j, forming):
+        self.arrays['forming'][i, j] = forming if forming is not None else np.nan
+
+    def attach(self, symbol, aggregator, tick_scanner):
+        """
+        Feed `symbol` from a bot's bar aggregator and tick scanner. Must be called before the
+        aggregator is seeded or followed by publish_series(); the first tick batch copies the
+        seeded history.
+        """
+        if symbol not in self.symbol_index:
+            return False
+        seeded = [False]
+
+        def on_bar(bar_symbol, timeframe, bar):
+            if bar_symbol == symbol and seeded[0]:
+                self.publish_bar(symbol, timeframe, bar)
+
+        def on_ticks(ticks):
+            if not seeded[0]:
+                self.publish_series(symbol, aggregator)
+                seeded[0] = True
+            i = self.symbol_index[symbol]
+            self._begin(i)
+            try:
+                if len(ticks):
+                    self.arrays['quote'][i] = (ticks['bid'][-1], ticks['ask'][-1])
+                    self.arrays['quote_time'][i] = ticks['time_msc'][-1]
+                for timeframe, j in self.timeframe_index.items():
+                    series = aggregator.series.get(timeframe)
+                    if series is not None:
+                        self._write_forming(i, j, series.forming)
+            finally:
+                self._end(i)
+
+        aggregator.listeners.append(on_bar)
+        tick_scanner.listeners.append(on_ticks)  # After the aggregator's own listener
+        return True
+
+    def close(self, unlink=True):
+        self.arrays = None
+        self.shm.close()
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class MarketSnapshotReader:
+    """
+    Reads a MarketSnapshotWriter segment from any process, without locks or pickling.
+    Every read copies one symbol's data and retries while the writer was busy with it.
+    """
+
+    def __init__(self, name, max_retries=1000):
+        self.name = name
+        self.max_retries = max_retries
+        self.shm = shared_memory.SharedMemory(name=name)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        if header[0] != MAGIC or header[1] != LAYOUT_VERSION:
+            self.shm.close()
+            raise ValueError(f"Shared memory '{name}' is not a market snapshot (layout {header[1]})")
+        if _tracker_pid() != header[7]:
+            # Attaching registered the segment with this process's resource tracker, which would
+            # unlink it when this process exits; a tracker shared with the writer (fork) keeps it
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        n_symbols, n_timeframes, capacity = (int(v) for v in header[2:5])
+        layout, _ = _layout(n_symbols, n_timeframes, capacity)
+        self.arrays = _map(self.shm.buf, layout)
+        self.capacity = capacity
+        self.symbols = [name.decode() for name in self.arrays['names']]
+        self.timeframes = [int(tf) for tf in self.arrays['timeframes']]
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.timeframe_index = {timeframe: j for j, timeframe in enumerate(self.timeframes)}
+
+    def _consistent(self, i, read):
+        seq = self.arrays['seq']
+        for _ in range(self.max_retries):
+            before = int(seq[i])
+            if before % 2 == 0:
+                value = read()
+                if int(seq[i]) == before:
+                    return value
+            time.sleep(0)
+        raise TimeoutError(f"Could not get a consistent snapshot of {self.symbols[i]}")
+
+    def quote(self, symbol):
+        """(bid, ask, time_msc) of the latest tick; NaN prices before the first tick."""
+        i = self.symbol_index[symbol]
+        a = self.arrays
+        return self._consistent(i, lambda: (float(a['quote'][i, 0]), float(a['quote'][i, 1]), int(a['quote_time'][i])))
+
+    def quotes(self):
+        """Latest quotes of every symbol as a DataFrame indexed by symbol."""
+        import pandas as pd
+        rows = [self.quote(symbol) for symbol in self.symbols]
+        return pd.DataFrame(rows, index=self.symbols, columns=['bid', 'ask', 'time_msc'])
+
+    def bars(self, symbol, timeframe, count=None, include_forming=False):
+        """Closed bars oldest first (the last `count` of them), optionally with the forming bar appended."""
+        i = self.symbol_index[symbol]
+        j = self.timeframe_index[timeframe]
+        a = self.arrays
+
+        def read():
+            held = int(a['bar_count'][i, j])
+            nxt = int(a['bar_next'][i, j])
+            n = held if count is None else min(count, held)
+            idx = (nxt - n + np.arange(n)) % self.capacity
+            block = a['bars'][i, j, idx].copy()
+            forming = a['forming'][i, j].copy()
+            return block, forming
+
+        import pandas as pd
+        block, forming = self._consistent(i, read)
+        if include_forming and not np.isnan(forming[0]):
+            block = np.vstack([block, forming])
+        data = pd.DataFrame(block, columns=BAR_FIELDS)
+        data['time'] = data['time'].astype(np.int64)
+        data['tick_volume'] = data['tick_volume'].astype(np.int64)
+        return data
+
+    def close(self):
+        self.arrays = None
+        self.shm.close()
+
+
+def _tracker_pid():
+    """Pid of this process's multiprocessing resource tracker (0 if none, e.g. on Windows)."""
+    return getattr(getattr(resource_tracker, '_resource_tracker', None), '_pid', None) or 0
+
+
+if __name__ == '__main__':
+    # Quick look at a running engine's feed: python market_snapshot.py [name]
+    import sys
+    reader = MarketSnapshotReader(sys.argv[1] if len(sys.argv) > 1 else 'tracy_feed')
+    print(reader.quotes().to_string())
+    reader.close()
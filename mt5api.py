@@ -0,0 +1,15 @@
+"""
+MetaTrader5 backend used by the rest of the project.
+
+The real MetaTrader5 package only exists on Windows. Set TRACY_MT5=sim to run
+everything against the in-process simulated broker in sim_mt5.py instead, e.g.
+for load tests and benchmarks on Linux.
+"""
+import os
+
+BACKEND = os.environ.get('TRACY_MT5', 'terminal').lower()
+
+if BACKEND == 'sim':
+    import sim_mt5 as mt5
+else:
+    import MetaTrader5 as mt5
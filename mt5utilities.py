@@ -1,35 +1,56 @@
-import MetaTrader5 as mt5
-from datetime import datetime
+from mt5api import mt5
+from datetime import datetime, timezone
 import numpy as np
-import pandas as pd
-import requests
 import json
 
 import random
-import schedule
 import time
 import logging
+import threading
+from collections import deque
+from scheduler import timeframe_seconds
+from bars import ticks_after
 
 
 class MT5Connector:
-    def __init__(self, account, password, server, logger=None):
+    # last_error() codes meaning the terminal connection itself failed
+    CONNECTION_ERRORS = {-10001, -10002, -10003, -10004, -10005}
+
+    def __init__(self, account, password, server, logger=None, terminal=None, backoff_base=1, backoff_max=60):
         self.account = account
         self.password = password
         self.server = server
         self.is_connected = False
         self.logger = logger if logger else logging.getLogger()
+        # The terminal module can be swapped for a local (e.g. fault-injecting) stand-in
+        self.mt5 = terminal if terminal else mt5
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._reconnect_lock = threading.Lock()
+        self._stop = threading.Event()  # Interrupts backoff waits on shutdown
+        self.reconnect_listeners = []  # Called after every successful reconnect
+        self.reconnect_times = deque(maxlen=100)  # Seconds from detected loss to restored connection
+        self.lost_at = None  # When probe() or call() first saw the connection down
+        self.last_probe = None
 
     def connect(self, max_retries=3):
+        self._stop.clear()
         for i in range(max_retries):
+            if i > 0:
+                # Back off between attempts instead of hammering the terminal
+                delay = min(self.backoff_base * 2 ** (i - 1), self.backoff_max)
+                if self._stop.wait(delay):
+                    break
             try:
-                is_initialized = mt5.initialize()
+                is_initialized = self.mt5.initialize()
                 if not is_initialized:
                     self.logger.error(f"Attempt {i+1}/{max_retries}: MT5 initialization failed.")
                     continue
 
-                authorized = mt5.login(self.account, self.password, self.server)
+                authorized = self.mt5.login(self.account, self.password, self.server)
                 if not authorized:
-                    error_code, error_message = mt5.last_error()
+                    error_code, error_message = self.mt5.last_error()
                     self.logger.error(f"Attempt {i+1}/{max_retries}: MT5 login failed. Error code: {error_code}, message: '{error_message}'")
                     continue
 
@@ -44,41 +65,191 @@ class MT5Connector:
         return False
 
     def disconnect(self):
+        self._stop.set()
         if self.is_connected:
-            mt5.shutdown()
+            self.mt5.shutdown()
             self.is_connected = False
             self.logger.info("Disconnected from MT5")
 
+    def probe(self):
+        """Cheap health check: the terminal answers and is connected to the trade server."""
+        self.last_probe = time.time()
+        try:
+            info = self.mt5.terminal_info()
+            healthy = info is not None and getattr(info, 'connected', True)
+        except Exception as e:
+            self.logger.error(f"MT5 health probe failed: {e}")
+            healthy = False
+        if not healthy and self.is_connected:
+            error_code, error_message = self.mt5.last_error()
+            self.logger.warning(f"MT5 connection lost. Error code: {error_code}, message: '{error_message}'")
+            self._lost()
+        return healthy
+
+    def _lost(self):
+        self.is_connected = False
+        if self.lost_at is None:
+            self.lost_at = time.time()
+
+    def reconnect(self, max_retries=10, wait=True):
+        """
+        Re-establish the terminal connection with backoff, leaving bots running.
+        Concurrent callers share one attempt: whoever holds the lock reconnects,
+        the others wait for it and return its outcome (or, with wait=False, return
+        straight away).
+        """
+        if not self._reconnect_lock.acquire(blocking=False):
+            if not wait:
+                return self.is_connected
+            with self._reconnect_lock:
+                return self.is_connected
+        try:
+            if self.is_connected and self.probe():
+                return True
+            if self.lost_at is None:
+                self.lost_at = time.time()
+            self.logger.info("-------------------------------------------------")
+            self.logger.info("Reconnecting to MT5...")
+            try:
+                self.mt5.shutdown()
+            except Exception as e:
+                self.logger.error(f"Error shutting down MT5 before reconnect: {e}")
+            if not self.connect(max_retries=max_retries):
+                return False
+
+            elapsed = time.time() - self.lost_at
+            self.lost_at = None
+            self.reconnect_times.append(elapsed)
+            self.logger.info(f"Reconnected to MT5 in {elapsed:.2f}s.")
+            for listener in self.reconnect_listeners:
+                try:
+                    listener()
+                except Exception as e:
+                    self.logger.error(f"Reconnect listener failed: {e}", exc_info=True)
+            return True
+        finally:
+            self._reconnect_lock.release()
+
+    def call(self, function_name, *args, idempotent=True, **kwargs):
+        """
+        Call a terminal function, reconnecting if the connection dropped.
+        The caller gets a single quick reconnect attempt and does not wait for one
+        already running; longer retries are left to the engine's health job.
+        Idempotent reads are replayed once after a successful reconnect; anything
+        else (e.g. order_send) is never replayed and returns the failure.
+        """
+        result = getattr(self.mt5, function_name)(*args, **kwargs)
+        if result is not None:
+            return result
+        error_code, error_message = self.mt5.last_error()
+        if error_code not in self.CONNECTION_ERRORS:
+            return result
+
+        self.logger.warning(f"{function_name} failed on connection error {error_code} ('{error_message}').")
+        self._lost()
+        if self.reconnect(max_retries=1, wait=False) and idempotent:
+            self.logger.info(f"Replaying {function_name} after reconnect.")
+            return getattr(self.mt5, function_name)(*args, **kwargs)
+        return None
+
+    def reconnect_stats(self):
+        """Time-to-reconnect summary in seconds."""
+        times = list(self.reconnect_times)
+        if not times:
+            return {'count': 0}
+        return {'count': len(times), 'last': times[-1], 'max': max(times), 'mean': sum(times) / len(times)}
+
 
 class DataFetcher:
-    def __init__(self, mt5_connector, symbol, timeframe, from_data, to_data, logger=None):
+    def __init__(self, mt5_connector, symbol, timeframe, from_data, to_data, logger=None, bars=None):
         self.mt5_connector = mt5_connector
         self.symbol = symbol
         self.timeframe = timeframe
         self.from_data = from_data
         self.to_data = to_data
         self.logger = logger if logger else logging.getLogger()
+        self.bars = bars  # Optional BarAggregator; reads are served locally while it is live
 
     def fetch(self):
+        if self.bars is not None:
+            data = self.bars.latest(self.timeframe, self.to_data, offset=self.from_data)
+            if data is not None:
+                return data
+        import pandas as pd  # Only the terminal fallback builds frames
         try:
-            data = pd.DataFrame(mt5.copy_rates_from_pos(self.symbol, self.timeframe, self.from_data, self.to_data))
+            data = pd.DataFrame(self.mt5_connector.call('copy_rates_from_pos', self.symbol, self.timeframe, self.from_data, self.to_data))
             if data.empty:
-                # Using mt5.last_error() to log the reason for not returning data
-                error_code, error_message = mt5.last_error()
+                # Using last_error() to log the reason for not returning data
+                error_code, error_message = self.mt5_connector.mt5.last_error()
                 self.logger.warning(f"[{datetime.now()}] No data returned for {self.symbol}. Error code: {error_code}, message: '{error_message}'")
                 return None  # Indicating no data was returned
             self.logger.info(f"[{datetime.now()}] Data fetched successfully for {self.symbol}.")
             return data  # Directly return the data
         except Exception as e:
-            error_code, error_message = mt5.last_error()
+            error_code, error_message = self.mt5_connector.mt5.last_error()
             self.logger.error(f"[{datetime.now()}] Failed to fetch data for {self.symbol}: {e}, MT5 Error code: {error_code}, message: '{error_message}'")
             return None  # Indicating an exception occurred
 
+    def fetch_window(self, window_end):
+        """
+        Fetch the to_data bars that closed at or before `window_end` (server time, epoch seconds).
+        Unlike fetch() this does not depend on the current bar already having a tick,
+        so it is safe to call the instant the window's last bar closes.
+        """
+        period = timeframe_seconds(self.timeframe)
+        if self.bars is not None:
+            data = self.bars.window(self.timeframe, window_end - self.to_data * period, window_end)
+            if data is not None and len(data) == self.to_data:
+                return data
+        try:
+            date_from = datetime.fromtimestamp(window_end - self.to_data * period, tz=timezone.utc)
+            date_to = datetime.fromtimestamp(window_end - period, tz=timezone.utc)
+            import pandas as pd
+            data = pd.DataFrame(self.mt5_connector.call('copy_rates_range', self.symbol, self.timeframe, date_from, date_to))
+            if data.empty:
+                error_code, error_message = self.mt5_connector.mt5.last_error()
+                self.logger.warning(f"[{datetime.now()}] No data returned for {self.symbol} window ending {date_to}. Error code: {error_code}, message: '{error_message}'")
+                return None
+            self.logger.info(f"[{datetime.now()}] Window data fetched successfully for {self.symbol}: {len(data)} bars up to {date_to}.")
+            return data
+        except Exception as e:
+            error_code, error_message = self.mt5_connector.mt5.last_error()
+            self.logger.error(f"[{datetime.now()}] Failed to fetch window data for {self.symbol}: {e}, MT5 Error code: {error_code}, message: '{error_message}'")
+            return None
+
+    def close_extremes(self, window_end=None):
+        """
+        Highest and lowest close of the to_data bars closed by `window_end` (server time), or of
+        the bars fetch() returns without one. Read from the local bars' range index while they
+        are live, otherwise computed from the fetched bars. None when no data is available.
+        """
+        series = self.bars.closed_series(self.timeframe) if self.bars is not None else None
+        if series is not None:
+            if window_end is not None:
+                period = timeframe_seconds(self.timeframe)
+                extremes = series.window_extrema(window_end - self.to_data * period, window_end)
+            elif self.from_data >= 1:
+                end = series.total - (self.from_data - 1)
+                extremes = series.extrema(end - self.to_data, end)
+            else:
+                extremes = None  # Includes the forming bar
+            if extremes is not None and extremes['bars'] == self.to_data:
+                return extremes['close_high'], extremes['close_low']
+        data = self.fetch_window(window_end) if window_end is not None else self.fetch()
+        if data is None or data.empty or 'close' not in data.columns:
+            return None
+        return data['close'].max(), data['close'].min()
+
     def get_current_price(self):
+        if self.bars is not None:
+            current_price = self.bars.current_price()
+            if current_price is not None:
+                return current_price
+        import pandas as pd
         try:
             # Fetch the last candle data
             # Adjust '0' to '1' if you want just the last candle
-            data = pd.DataFrame(mt5.copy_rates_from_pos(self.symbol, self.timeframe, 0, 1))
+            data = pd.DataFrame(self.mt5_connector.call('copy_rates_from_pos', self.symbol, self.timeframe, 0, 1))
             if not data.empty:
                 # Extract the close price of the last candle
                 current_price = data.iloc[-1]['close']
@@ -90,7 +261,7 @@ class DataFetcher:
                 return None
         except Exception as e:
             # If an exception occurs, log the error and return None
-            error_code, error_message = mt5.last_error()
+            error_code, error_message = self.mt5_connector.mt5.last_error()
             self.logger.error(f"Failed to fetch the last candle for {self.symbol}: {e}, MT5 Error code: {error_code}, message: '{error_message}'")
             return None
 
@@ -99,7 +270,7 @@ class DataFetcher:
             Fetches the latest tick for the symbol and returns the ask price.
             """
             try:
-                tick = mt5.symbol_info_tick(self.symbol)
+                tick = self.mt5_connector.call('symbol_info_tick', self.symbol)
                 if tick is not None:
                     self.logger.info(f"Latest tick for {self.symbol} fetched successfully.")
                     return tick.ask  # Return the ask price from the latest tick
@@ -111,8 +282,110 @@ class DataFetcher:
                 return None
 
 
+class TickScanner:
+    """
+    Scans every tick since the previous scan for a break of the box levels.
+
+    Ticks are pulled in pages with copy_ticks_from starting at a cursor (the
+    last scanned tick's time_msc plus how many ticks at that millisecond were
+    already seen), so no tick is scanned twice and nothing between polls is
+    missed. Times are broker server time in milliseconds.
+    """
+
+    def __init__(self, mt5_connector, symbol, page_size=50000, logger=None):
+        self.mt5_connector = mt5_connector
+        self.symbol = symbol
+        self.page_size = page_size
+        self.logger = logger if logger else logging.getLogger()
+        self.cursor = None  # (time_msc, ticks already scanned at that millisecond)
+        self.listeners = []  # Called with every batch of new ticks (e.g. the bar aggregator)
+
+    def start(self, from_msc=None):
+        """Scan from `from_msc` (server time, ms), or from the latest tick when not given."""
+        if from_msc is None:
+            tick = self.mt5_connector.call('symbol_info_tick', self.symbol)
+            if tick is None:
+                self.logger.warning(f"Cannot start tick scan for {self.symbol}: no current tick.")
+                return
+            from_msc = tick.time_msc
+        self.cursor = (int(from_msc), 0)
+
+    def reset(self):
+        self.cursor = None
+
+    def fetch(self):
+        """Return the ticks after the cursor (advancing it), or None if the history could not be read."""
+        if self.cursor is None:
+            self.start()
+            if self.cursor is None:
+                return None
+        pages = []
+        while True:
+            date_from = datetime.fromtimestamp(self.cursor[0] / 1000.0, tz=timezone.utc)
+            ticks = self.mt5_connector.call('copy_ticks_from', self.symbol, date_from, self.page_size, mt5.COPY_TICKS_ALL)
+            if ticks is None:
+                error_code, error_message = self.mt5_connector.mt5.last_error()
+                self.logger.error(f"Failed to fetch ticks for {self.symbol}. Error code: {error_code}, message: '{error_message}'")
+                break
+            # Skip ticks before the cursor and those at the cursor millisecond already scanned
+            new, self.cursor = ticks_after(ticks, self.cursor)
+            if len(new):
+                pages.append(new)
+            if len(ticks) < self.page_size or not len(new):
+                break
+        if not pages:
+            if ticks is None:
+                return None
+            result = ticks[:0]
+        else:
+            result = pages[0] if len(pages) == 1 else np.concatenate(pages)
+        for listener in self.listeners:
+            listener(result)
+        return result
+
+    def scan(self, buy_level, sell_level, ticks=None):
+        """
+        Scan the new ticks for the first close above buy_level or below sell_level (bid prices).
+        Returns (breakout, current_price); breakout is None or a dict with trade_type,
+        time_msc, price, level and overshoot (furthest move past the level since the
+        crossing). current_price is the latest bid, or None if no tick history was read.
+        `ticks` is a batch already taken from fetch(); by default new ticks are fetched.
+        """
+        if ticks is None:
+            ticks = self.fetch()
+        if ticks is None:
+            return None, None
+        if not len(ticks):
+            tick = self.mt5_connector.call('symbol_info_tick', self.symbol)
+            return None, (tick.bid if tick is not None else None)
+
+        bids = ticks['bid']
+        above = bids > buy_level
+        below = bids < sell_level
+        first_above = int(np.argmax(above)) if above.any() else len(bids)
+        first_below = int(np.argmax(below)) if below.any() else len(bids)
+        current_price = float(bids[-1])
+        if first_above == first_below == len(bids):
+            return None, current_price
+
+        if first_above < first_below:
+            i, trade_type, level = first_above, 0, buy_level
+            overshoot = float(bids[i:].max() - level)
+        else:
+            i, trade_type, level = first_below, 1, sell_level
+            overshoot = float(level - bids[i:].min())
+        breakout = {
+            'trade_type': trade_type,  # 0 for buy, 1 for sell
+            'time_msc': int(ticks['time_msc'][i]),
+            'price': float(bids[i]),
+            'level': level,
+            'overshoot': overshoot,
+        }
+        return breakout, current_price
+
+
 class MarketOrder:
-    def __init__(self, symbol, lot, deviation, magic, trade_type, stop_loss, take_profit=None, logger=None):
+    def __init__(self, symbol, lot, deviation, magic, trade_type, stop_loss, take_profit=None, logger=None, symbol_spec=None, fill_recorder=None, terminal=None):
         self.symbol = symbol
         self.lot = lot
         self.deviation = deviation
@@ -121,16 +394,23 @@ class MarketOrder:
         self.stop_loss = stop_loss
         self.take_profit = take_profit
         self.logger = logger if logger else logging.getLogger()
+        self.symbol_spec = symbol_spec  # Optional SymbolSpec: SL/TP are made valid for the broker before sending
+        self.fill_recorder = fill_recorder  # Optional FillRecorder: deals are recorded for fill-quality analysis
+        self.mt5 = terminal if terminal else mt5  # The account's terminal (MT5Connector.mt5)
 
     def execute_open(self):
+        tick = self.mt5.symbol_info_tick(self.symbol)
+        stop_loss, take_profit = self.stop_loss, self.take_profit
+        if self.symbol_spec:
+            stop_loss, take_profit = self.symbol_spec.valid_stops(self.trade_type, tick.bid, tick.ask, stop_loss, take_profit)
         trade_request = {
             "action": mt5.TRADE_ACTION_DEAL,
             "symbol": self.symbol,
             "volume": self.lot,
             "type": self.trade_type,
-            "price": mt5.symbol_info_tick(self.symbol).ask if self.trade_type == 0 else mt5.symbol_info_tick(self.symbol).bid,
-            "sl": self.stop_loss,
-            "tp": self.take_profit,
+            "price": tick.ask if self.trade_type == 0 else tick.bid,
+            "sl": stop_loss,
+            "tp": take_profit,
             "deviation": self.deviation,
             "magic": self.magic,
             "comment": "Buy" if self.trade_type == 0 else "Sell",
@@ -138,17 +418,19 @@ class MarketOrder:
             "filling_type": mt5.ORDER_FILLING_IOC,
         }
         
-        return self._send_order(trade_request)
+        return self._send_order(trade_request, tick=tick, kind='open')
 
     def execute_close(self, ticket):
         # For closing, the type should be opposite to the opening type
         close_type = mt5.ORDER_TYPE_SELL if self.trade_type == 0 else mt5.ORDER_TYPE_BUY
+        tick = self.mt5.symbol_info_tick(self.symbol)
         trade_request = {
             "action": mt5.TRADE_ACTION_DEAL,
             "symbol": self.symbol,
             "volume": self.lot,
             "type": close_type,
             "position": ticket,
+            "price": (tick.bid if self.trade_type == 0 else tick.ask) if tick else 0.0,
             "deviation": self.deviation,
             "magic": self.magic,
             "comment": "Close",
@@ -156,15 +438,18 @@ class MarketOrder:
             "filling_type": mt5.ORDER_FILLING_IOC,
         }
 
-        return self._send_order(trade_request)
+        return self._send_order(trade_request, tick=tick, kind='close')
     
     def update_position(self, ticket, new_stop_loss=None, new_take_profit=None):
         """
         Updates the stop loss and/or take profit levels for an existing position.
         """
+        if self.symbol_spec:
+            tick = self.mt5.symbol_info_tick(self.symbol)
+            new_stop_loss, new_take_profit = self.symbol_spec.valid_stops(self.trade_type, tick.bid, tick.ask, new_stop_loss, new_take_profit)
         trade_request = {
             "action": mt5.TRADE_ACTION_SLTP,
-            "ticket": ticket,
+            "position": ticket,
             "symbol": self.symbol,
             "sl": new_stop_loss,
             "tp": new_take_profit,
@@ -175,9 +460,12 @@ class MarketOrder:
         # Use the _send_order utility function to send the update request
         return self._send_order(trade_request)
 
-    def _send_order(self, trade_request):
+    def _send_order(self, trade_request, tick=None, kind=None):
         try:
-            result = mt5.order_send(trade_request)
+            if self.fill_recorder and kind:
+                result = self.fill_recorder.send(trade_request, tick=tick, kind=kind, terminal=self.mt5)
+            else:
+                result = self.mt5.order_send(trade_request)
             if result.retcode != mt5.TRADE_RETCODE_DONE:
                 self.logger.error(f"[{datetime.now()}] Failed to send order for {self.symbol}. Retcode: {result.retcode}, Comment: '{result.comment}', Request: {trade_request}")
                 return None  # Indicate failure
@@ -188,14 +476,68 @@ class MarketOrder:
             return None
 
 
+class OrderTemplate:
+    """
+    Market order request prepared ahead of the signal.
+
+    Everything but the price is filled in (and pre-checked with order_check)
+    when the levels are known, so at the signal only the price, and a take
+    profit at a fixed distance from it, are stamped in from a tick snapshot.
+    """
+
+    def __init__(self, symbol, trade_type, lot, deviation, magic, stop_loss, take_profit_distance=None, comment=None, symbol_spec=None, logger=None):
+        self.symbol = symbol
+        self.trade_type = trade_type
+        self.magic = magic
+        self.take_profit_distance = take_profit_distance  # TP at this distance from the fill price, or no TP
+        self.symbol_spec = symbol_spec
+        self.logger = logger if logger else logging.getLogger()
+        self.checked = False
+        self.request = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": symbol,
+            "volume": lot,
+            "type": trade_type,
+            "sl": stop_loss,
+            "tp": 0.0,
+            "deviation": deviation,
+            "magic": magic,
+            "comment": comment or ("Buy" if trade_type == 0 else "Sell"),
+            "type_time": mt5.ORDER_TIME_GTC,
+            "type_filling": mt5.ORDER_FILLING_IOC,
+        }
+
+    def stamp(self, tick):
+        """Return a ready-to-send request priced from `tick`."""
+        request = dict(self.request)
+        price = tick.ask if self.trade_type == 0 else tick.bid
+        request["price"] = price
+        if self.take_profit_distance:
+            request["tp"] = price + self.take_profit_distance if self.trade_type == 0 else price - self.take_profit_distance
+        if self.symbol_spec:
+            request["sl"], request["tp"] = self.symbol_spec.valid_stops(self.trade_type, tick.bid, tick.ask, request["sl"], request["tp"])
+        return request
+
+    def check(self, mt5_connector, tick):
+        """Pre-check the request against the current price; True if the broker would accept it."""
+        result = mt5_connector.call('order_check', self.stamp(tick))
+        # order_check reports success as retcode 0
+        self.checked = result is not None and result.retcode in (0, mt5.TRADE_RETCODE_DONE)
+        if not self.checked:
+            self.logger.warning(f"Order template for {self.symbol} (magic {self.magic}) failed order_check: "
+                                f"{result.retcode if result else 'no result'}, {result.comment if result else mt5_connector.mt5.last_error()}")
+        return self.checked
+
+
 class IndicatorCalculator:
     def __init__(self, data_fetcher):
         self.data_fetcher = data_fetcher
 
     def calculate_atr(self, period):
         # Fetch the data
-        self.data_fetcher.fetch()
-        data = self.data_fetcher.data
+        data = self.data_fetcher.fetch()
+        if data is None:
+            return None
         # Calculate the true range
         data['high_low'] = data['high'] - data['low']
         data['high_close'] = np.abs(data['high'] - data['close'].shift())
@@ -211,7 +553,7 @@ class IndicatorCalculator:
 
 
 class OpenPositionManager:
-    def __init__(self, connector, symbol, timeframe, from_data, to_data, atr_period, max_dist_atr_multiplier, atr_sl_multiplier, trail_atr_multiplier, logger=None):
+    def __init__(self, connector, symbol, timeframe, from_data, to_data, atr_period, max_dist_atr_multiplier, atr_sl_multiplier, trail_atr_multiplier, logger=None, bars=None, indicators=None):
         self.connector = connector
         self.symbol = symbol
         self.timeframe = timeframe
@@ -221,12 +563,20 @@ class OpenPositionManager:
         self.max_dist_atr_multiplier = max_dist_atr_multiplier
         self.atr_sl_multiplier = atr_sl_multiplier
         self.trail_atr_multiplier = trail_atr_multiplier
-        self.indicator_calculator = IndicatorCalculator(DataFetcher(connector, symbol, timeframe, from_data, to_data))
+        # ATR is read from the symbol's shared IndicatorCache, so it is computed once per closed bar for all readers
+        self.indicators = indicators
         self.logger = logger if logger else logging.getLogger(__name__)
 
+    def atr(self):
+        """ATR of the manager's timeframe over atr_period bars; None until the bars are there."""
+        if self.indicators is None:
+            return None
+        return self.indicators.get(self.symbol, self.timeframe, 'atr', self.atr_period)
+
     def get_positions(self):
+        import pandas as pd
         try:
-            positions_raw = mt5.positions_get(symbol=self.symbol)
+            positions_raw = self.connector.call('positions_get', symbol=self.symbol)
             if positions_raw is None or len(positions_raw) == 0:
                 self.logger.info(f"No open positions found for symbol: {self.symbol}")
                 return pd.DataFrame()  # Return an empty DataFrame if no positions are found
@@ -247,15 +597,19 @@ class OpenPositionManager:
             sl = position[11]
             ticket = position[7]
 
+            atr = self.atr()
+            if atr is None:
+                self.logger.info(f"No ATR for {self.symbol} yet, trailing stop of position {ticket} not updated.")
+                return None
             dist_from_sl = abs(round(price_current - sl, 6))
-            if dist_from_sl > self.max_dist_atr_multiplier:
-                new_sl = sl + self.trail_atr_multiplier if order_type == 0 else sl - self.trail_atr_multiplier
+            if dist_from_sl > self.max_dist_atr_multiplier * atr:
+                new_sl = sl + self.trail_atr_multiplier * atr if order_type == 0 else sl - self.trail_atr_multiplier * atr
                 request = {
                     'action': mt5.TRADE_ACTION_SLTP,
                     'position': ticket,
                     'sl': new_sl,
                 }
-                result = mt5.order_send(request)
+                result = self.connector.mt5.order_send(request)
                 if result.retcode == mt5.TRADE_RETCODE_DONE:
                     self.logger.info(f"Successfully updated trailing stop for position {ticket}.")
                 else:
@@ -277,13 +631,17 @@ class OpenPositionManager:
             ticket = position[7]
 
             if sl == 0.0:  # Check if there's no SL already set
-                new_sl = price_open - self.atr_sl_multiplier if order_type == 0 else price_open + self.atr_sl_multiplier
+                atr = self.atr()
+                if atr is None:
+                    self.logger.info(f"No ATR for {self.symbol} yet, manual stop of position {ticket} not set.")
+                    return None
+                new_sl = price_open - self.atr_sl_multiplier * atr if order_type == 0 else price_open + self.atr_sl_multiplier * atr
                 request = {
                     'action': mt5.TRADE_ACTION_SLTP,
                     'position': ticket,
                     'sl': new_sl,
                 }
-                result = mt5.order_send(request)
+                result = self.connector.mt5.order_send(request)
                 if result.retcode == mt5.TRADE_RETCODE_DONE:
                     self.logger.info(f"Successfully set manual stop for position {ticket}.")
                 else:
@@ -297,31 +655,6 @@ class OpenPositionManager:
             return None
 
 
-class TradeHistory:
-    def __init__(self, mt5_connector, symbol, logger=None):
-        self.mt5_connector = mt5_connector
-        self.symbol = symbol
-        self.logger = logger if logger else logging.getLogger(__name__)
-
-    def get_history(self, ticket):
-        try:
-            # Get the history orders within the specified interval
-            history_orders = mt5.history_orders_get(ticket=ticket, group=self.symbol)
-            
-            if history_orders is None or len(history_orders) == 0:
-                self.logger.info(f"No history orders are found for {self.symbol} within the specified interval")
-                return pd.DataFrame()  # return empty dataframe
-            else:
-                # Convert the obtained data to pandas dataframe
-                df = pd.DataFrame(list(history_orders), columns=history_orders[0]._asdict().keys())
-                df.sort_values(by=['time_done'], inplace=True, ascending=True)
-                self.logger.info(f"Successfully retrieved history orders for {self.symbol}.")
-                return df
-        except Exception as e:
-            self.logger.error(f"Exception when retrieving history orders for {self.symbol}: {e}")
-            return pd.DataFrame()  # return empty dataframe in case of exception
-
-
 class Messenger:
     def __init__(self, webhook_url, username='Tracy', logger=None):
         self.webhook_url = webhook_url
@@ -329,6 +662,7 @@ class Messenger:
         self.logger = logger if logger else logging.getLogger(__name__)
 
     def send(self, content):
+        import requests  # Deferred like pandas: only needed once there is something to send
         data = {
             "content": content,
             "username": self.username
@@ -0,0 +1,190 @@
+from mt5api import mt5
+import logging
+import threading
+import time
+
+import numpy as np
+
+
+class Portfolio:
+    """
+    Mark-to-market view of every open position of the account.
+
+    Positions are held in arrays (symbol index, side, lot, open price, SL, TP).
+    load() rebuilds them only when the set of tickets changes and otherwise just
+    updates the fields a position can change in place; mark() values them
+    against a price snapshot in one numpy pass: unrealized PnL, net exposure per
+    currency and the loss still possible down to the stops, all in the account
+    currency. Conversion rates are taken from the same snapshot (any pair of a
+    currency against the account currency) and otherwise from the symbol's tick
+    value. The result of the latest mark is kept in `latest` for bots and metrics.
+    """
+
+    def __init__(self, symbol_specs, account_currency='USD', logger=None):
+        self.symbol_specs = symbol_specs
+        self.account_currency = account_currency
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.latest = None
+        self._lock = threading.Lock()
+
+        # Symbol table, grown as positions in new symbols appear
+        self.symbols = []
+        self.symbol_index = {}
+        self.contract = np.zeros(0)
+        self.base = np.zeros(0, dtype=np.int64)  # currency index of the base currency
+        self.quote = np.zeros(0, dtype=np.int64)  # currency index of the profit currency
+        self.tick_rate = np.zeros(0)  # quote -> account rate implied by the tick value (fallback)
+        self.bid = np.zeros(0)
+        self.ask = np.zeros(0)
+        self.currencies = []
+        self.currency_index = {}
+
+        # Position arrays
+        self.ticket = np.zeros(0, dtype=np.int64)
+        self.magic = np.zeros(0, dtype=np.int64)
+        self.symbol = np.zeros(0, dtype=np.int64)
+        self.side = np.zeros(0)  # +1 buy, -1 sell
+        self.lot = np.zeros(0)
+        self.open_price = np.zeros(0)
+        self.stop_loss = np.zeros(0)
+        self.take_profit = np.zeros(0)
+
+    # ------------------------------------------------------------------
+    # Positions and prices
+    # ------------------------------------------------------------------
+
+    def _currency(self, name):
+        index = self.currency_index.get(name)
+        if index is None:
+            index = self.currency_index[name] = len(self.currencies)
+            self.currencies.append(name)
+        return index
+
+    def _add_symbol(self, name):
+        spec = self.symbol_specs.get(name)
+        if spec is None:
+            raise KeyError(f"No symbol specification for {name}")
+        self.symbol_index[name] = len(self.symbols)
+        self.symbols.append(name)
+        self.contract = np.append(self.contract, spec.contract_size)
+        self.base = np.append(self.base, self._currency(spec.currency_base or name[:3]))
+        self.quote = np.append(self.quote, self._currency(spec.currency_profit or name[3:6]))
+        self.tick_rate = np.append(self.tick_rate, spec.tick_value / spec.tick_size / spec.contract_size
+                                   if spec.tick_size and spec.contract_size else np.nan)
+        self.bid = np.append(self.bid, np.nan)
+        self.ask = np.append(self.ask, np.nan)
+        return self.symbol_index[name]
+
+    def load(self, positions):
+        """Replace the held positions with a positions_get() result."""
+        positions = positions or ()
+        with self._lock:
+            tickets = np.array([p.ticket for p in positions], dtype=np.int64)
+            if np.array_equal(tickets, self.ticket):
+                # Same positions: symbols and magics stand, stops, volume and (on netting accounts) side may not
+                self._update(positions)
+                return
+            for p in positions:
+                if p.symbol not in self.symbol_index:
+                    self._add_symbol(p.symbol)
+            self.ticket = tickets
+            self.magic = np.array([p.magic for p in positions], dtype=np.int64)
+            self.symbol = np.array([self.symbol_index[p.symbol] for p in positions], dtype=np.int64)
+            self._update(positions)
+
+    def _update(self, positions):
+        self.side = np.where(np.array([p.type for p in positions]) == 0, 1.0, -1.0) if positions else np.zeros(0)
+        self.lot = np.array([p.volume for p in positions], dtype=float)
+        self.open_price = np.array([p.price_open for p in positions], dtype=float)
+        self.stop_loss = np.array([p.sl for p in positions], dtype=float)
+        self.take_profit = np.array([p.tp for p in positions], dtype=float)
+
+    def set_prices(self, ticks):
+        """Update bid/ask from {symbol: tick}; symbols not held are ignored."""
+        with self._lock:
+            for name, tick in ticks.items():
+                index = self.symbol_index.get(name)
+                if index is not None and tick is not None:
+                    self.bid[index] = tick.bid
+                    self.ask[index] = tick.ask
+
+    def _rates(self):
+        """Rate from each currency to the account currency, from the current snapshot."""
+        mid = (self.bid + self.ask) / 2
+        rates = np.full(len(self.currencies), np.nan)
+        account = self.currency_index.get(self.account_currency)
+        if account is not None:
+            rates[account] = 1.0
+            # Direct pairs against the account currency
+            rates[self.base[self.quote == account]] = mid[self.quote == account]
+            inverse = self.base == account
+            rates[self.quote[inverse]] = 1.0 / mid[inverse]
+        # Otherwise the broker's tick value converts profit currency to account currency
+        missing = np.isnan(rates[self.quote])
+        rates[self.quote[missing]] = self.tick_rate[missing]
+        # Base currencies without a direct pair go through their quote currency
+        missing = np.isnan(rates[self.base])
+        rates[self.base[missing]] = mid[missing] * rates[self.quote[missing]]
+        return rates
+
+    # ------------------------------------------------------------------
+    # Valuation
+    # ------------------------------------------------------------------
+
+    def mark(self, ticks=None):
+        """Value all positions at the current prices (optionally updated from {symbol: tick} first)."""
+        if ticks:
+            self.set_prices(ticks)
+        with self._lock:
+            rates = self._rates()
+            s = self.symbol
+            close = np.where(self.side > 0, self.bid[s], self.ask[s])  # Price the position would close at
+            units = self.lot * self.contract[s]
+            to_account = rates[self.quote[s]]
+
+            pnl = (close - self.open_price) * self.side * units * to_account
+            protected = self.stop_loss > 0
+            # Further loss if every stop were hit from here (negative where a stop locks in profit)
+            to_stop = np.where(protected, (close - self.stop_loss) * self.side * units * to_account, 0.0)
+
+            # Long base / short quote for buys, the reverse for sells, in account currency
+            count = len(self.currencies)
+            exposure = (np.bincount(self.base[s], self.side * units * rates[self.base[s]], minlength=count)
+                        - np.bincount(self.quote[s], self.side * units * close * to_account, minlength=count))
+            by_symbol = np.bincount(s, pnl, minlength=len(self.symbols))
+
+            self.latest = {
+                'time': time.time(),
+                'positions': len(pnl),
+                'unrealized': float(np.nansum(pnl)),
+                'risk_to_sl': float(np.nansum(to_stop)),
+                'unprotected': int((~protected).sum()),
+                'unprotected_lots': float(self.lot[~protected].sum()),
+                'by_symbol': dict(zip(self.symbols, by_symbol.tolist())),
+                'exposure': dict(zip(self.currencies, exposure.tolist())),
+                'ticket': self.ticket,
+                'pnl': pnl,
+            }
+            return self.latest
+
+    def refresh(self, mt5_connector):
+        """Reload positions and prices from the terminal and mark them."""
+        positions = mt5_connector.call('positions_get')
+        if positions is None:
+            self.logger.error(f"Portfolio refresh failed: {mt5_connector.mt5.last_error()}")
+            return self.latest
+        self.load(positions)
+        ticks = {name: mt5_connector.call('symbol_info_tick', name) for name in {p.symbol for p in positions}}
+        return self.mark(ticks)
+
+    # ------------------------------------------------------------------
+    # Queries on the latest mark
+    # ------------------------------------------------------------------
+
+    def symbol_pnl(self, symbol):
+        return self.latest['by_symbol'].get(symbol, 0.0) if self.latest else 0.0
+
+    def exposure(self, currency=None):
+        if not self.latest:
+            return 0.0 if currency else {}
+        return self.latest['exposure'].get(currency, 0.0) if currency else dict(self.latest['exposure'])
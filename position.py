@@ -1,10 +1,10 @@
 import logging
 import mt5utilities as util
 from datetime import datetime
-import MetaTrader5 as mt5
+from mt5api import mt5
 
 class Position:
-    def __init__(self, symbol, trade_type, lot, magic_number, stop_loss, take_profit, deviation, logger=None, messanger=None, database_manager=None):
+    def __init__(self, symbol, trade_type, lot, magic_number, stop_loss, take_profit, deviation, logger=None, messanger=None, database_manager=None, symbol_spec=None, fill_recorder=None, terminal=None):
         self.symbol = symbol
         self.trade_type = trade_type
         self.lot = lot
@@ -15,20 +15,27 @@ class Position:
         self.logger = logger if logger else logging.getLogger()
         self.messanger = messanger
         self.database_manager = database_manager  # Handles DB operations
+        self.symbol_spec = symbol_spec  # Broker specification used to round SL/TP
 
         # Additional attributes
         self.ticket_id = None
         self.open_price = None
         self.open_time = None
+        self.close_price = None
+        self.close_time = None
+        self.profit_loss = None
         # Initialize other necessary attributes
 
-        self.market_order = util.MarketOrder(self.symbol, self.lot, self.deviation, self.magic_number, self.trade_type, self.stop_loss, logger=self.logger)
+        self.market_order = util.MarketOrder(self.symbol, self.lot, self.deviation, self.magic_number, self.trade_type, self.stop_loss, self.take_profit, logger=self.logger, symbol_spec=self.symbol_spec, fill_recorder=fill_recorder, terminal=terminal)
 
 
     def execute_open(self):
         # Initializing MarketOrder with necessary parameters
         result = self.market_order.execute_open()
-        
+        return self.handle_open_result(result)
+
+    def handle_open_result(self, result):
+        """Record the outcome of the order that opened this position (also used for prepared orders)."""
         # Check if result is successful
         if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
             # Update position attributes based on the result
@@ -47,7 +54,7 @@ class Position:
 
             # Insert position details into the database if applicable
             if self.database_manager:
-                self.database_manager.insert_position_details(self)
+                self.insert_position_db()
 
             return self.ticket_id, self  # Returning self and ticket_id
         
@@ -83,9 +90,8 @@ class Position:
 
             # Update position details in the database if applicable
             if self.database_manager:
-                # Assuming there's a method update_position_db similar to insert_position_details
-                # that updates the position's closing details in the database
-                self.database_manager.update_position_db(self)
+                # Move the closed position from opened_trade to closed_trade
+                self.move_to_closed_positions()
 
             return self.ticket_id, True  # Return ticket_id and True for success
         else:
@@ -112,10 +118,12 @@ class Position:
             self.logger.error("Missing data for return calculation.")
             return None
 
+        # Lots are contracts of contract_size units; the result is in the symbol's profit currency
+        units = self.lot * (self.symbol_spec.contract_size if self.symbol_spec else 1)
         if self.trade_type == 0:  # Buy position
-            self.profit_loss = (self.close_price - self.open_price) * self.lot
+            self.profit_loss = (self.close_price - self.open_price) * units
         elif self.trade_type == 1:  # Sell position
-            self.profit_loss = (self.open_price - self.close_price) * self.lot
+            self.profit_loss = (self.open_price - self.close_price) * units
         else:
             self.logger.info("-------------------------------------------------")
             self.logger.error("Invalid trade type for return calculation.")
@@ -126,7 +134,7 @@ class Position:
 
     def insert_position_db(self):
         # Method to insert a new open position into the opened_positions table
-        columns = ['ticket_id', 'symbol', 'trade_type', 'open_price', 'open_time', 
+        columns = ['ticket_id', 'symbol', 'trade_type', 'open_price', 'date_time_open', 
                'stop_loss', 'take_profit', 'deviation', 'magic_number', 'lot', 'status']
         values = [self.ticket_id, self.symbol, self.trade_type, self.open_price, self.open_time, 
                 self.stop_loss, self.take_profit, self.deviation, self.magic_number, self.lot, self.status]
@@ -143,9 +151,17 @@ class Position:
         condition = f"ticket_id = {self.ticket_id}"
         self.database_manager.update_item("opened_trade", column_values, condition)
 
+    def initial_risk(self):
+        """Loss at the stop loss in account currency (via the symbol's tick value); None without a stop or spec."""
+        if not self.stop_loss or not self.open_price or not self.symbol_spec:
+            return None
+        spec = self.symbol_spec
+        return abs(self.open_price - self.stop_loss) / spec.tick_size * spec.tick_value * self.lot
+
     def move_to_closed_positions(self):
-        # Calculate profit or loss
-        self.profit_loss = self.calculate_return()
+        # Calculate profit or loss, unless it was already taken from the broker's deals
+        if self.profit_loss is None:
+            self.profit_loss = self.calculate_return()
 
         # Remove the position from opened_positions table
         self.database_manager.remove_item("opened_trade", f"ticket_id = {self.ticket_id}")
@@ -161,12 +177,19 @@ class Position:
 
         self.logger.info(f"Position {self.ticket_id} moved to 'closed_positions' table with profit/loss: {self.profit_loss}.")
 
-    def reconcile_position(self):
+    def reconcile_position(self, result=None):
         """
         Handles the transition of this position from open to closed,
         updates the database accordingly, and then signals to remove
         this position from the bot's memory.
+        `result` is the close as recorded in the broker's deals (TradeHistory.position_result).
         """
+        if result:
+            self.close_price = result['close_price']
+            self.close_time = result['close_time']
+            self.profit_loss = result['profit_loss']
+            self.status = "closed"
+
         if self.database_manager and self.ticket_id:
             # Move the position from 'opened_positions' to 'closed_positions'
             self.move_to_closed_positions()  # Assuming this method correctly moves the position in the database
@@ -178,7 +201,7 @@ class Position:
 
 
     @classmethod
-    def from_db_record(cls, record, logger=None, messanger=None, database_manager=None):
+    def from_db_record(cls, record, logger=None, messanger=None, database_manager=None, symbol_spec=None, fill_recorder=None, terminal=None):
         """
         Creates a Position instance from a database record tuple, now including stop_loss, take_profit, and deviation.
         """
@@ -196,7 +219,7 @@ class Position:
         deviation = record[9]  # Extract deviation from the record
         # Assuming status and other fields follow after deviation in the schema if needed
 
-        return cls(
+        position = cls(
             symbol=symbol,
             trade_type=trade_type,
             lot=lot,
@@ -206,8 +229,16 @@ class Position:
             deviation=deviation,
             logger=logger,
             messanger=messanger,
-            database_manager=database_manager
+            database_manager=database_manager,
+            symbol_spec=symbol_spec,
+            fill_recorder=fill_recorder,
+            terminal=terminal
         )
+        position.ticket_id = ticket_id
+        position.open_price = open_price
+        position.open_time = date_time_open
+        position.status = "open"
+        return position
 
 
 
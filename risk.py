@@ -0,0 +1,136 @@
+"""
+Monte Carlo risk of the closed trades in the database.
+
+Trade results are taken per lot from the closed_trade table (optionally for one
+symbol and/or magic number) and resampled into many simulated trade sequences:
+plain bootstrap, or circular blocks of consecutive trades to keep streaks. Each
+batch of paths is drawn, accumulated and measured with whole-array operations,
+so 100k paths of thousands of trades run in seconds.
+
+    python risk.py --balance 10000 --lots 0.01 0.02 0.05
+    python risk.py --symbol EURUSD --magic 361 --paths 100000 --trades 2000 --block 5
+"""
+import argparse
+import logging
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+
+def load_results(db_name='trades.db', symbol=None, magic=None):
+    """Profit/loss per lot of the closed trades, oldest first."""
+    sql = 'SELECT profit_loss, lot FROM closed_trade WHERE lot > 0'
+    params = []
+    if symbol is not None:
+        sql += ' AND symbol = ?'
+        params.append(symbol)
+    if magic is not None:
+        sql += ' AND magic_number = ?'
+        params.append(magic)
+    with sqlite3.connect(db_name) as conn:
+        rows = conn.execute(sql + ' ORDER BY close_time', params).fetchall()
+    data = np.array(rows, dtype=float).reshape(-1, 2)
+    return data[:, 0] / data[:, 1]
+
+
+def resample(count, paths, trades, block=1, rng=None):
+    """Indices (paths x trades) into `count` results: iid draws, or circular blocks of `block` consecutive trades."""
+    rng = rng if rng is not None else np.random.default_rng()
+    if block <= 1:
+        return rng.integers(0, count, size=(paths, trades))
+    blocks = -(-trades // block)
+    starts = rng.integers(0, count, size=(paths, blocks, 1))
+    return ((starts + np.arange(block)) % count).reshape(paths, blocks * block)[:, :trades]
+
+
+class RiskSimulator:
+    """
+    Drawdown, risk of ruin and return distributions of a lot size, from resampled
+    per-lot trade results. A path is ruined once its equity falls to `ruin_level`
+    of the starting balance or below.
+    """
+
+    def __init__(self, results, balance, ruin_level=0.5, batch_size=250_000, logger=None):
+        self.results = np.asarray(results, dtype=float)
+        self.balance = float(balance)
+        self.ruin_level = ruin_level
+        self.batch_size = batch_size  # Path x trade cells per batch, bounds memory
+        self.logger = logger if logger else logging.getLogger(__name__)
+        if not len(self.results):
+            raise ValueError("No closed trades to simulate")
+
+    @classmethod
+    def from_db(cls, balance, db_name='trades.db', symbol=None, magic=None, **kwargs):
+        return cls(load_results(db_name, symbol, magic), balance, **kwargs)
+
+    def simulate(self, lots, paths=100_000, trades=None, block=1, seed=None):
+        """
+        Simulate every lot size in `lots` on the same resampled paths.
+        Returns {lot: {'max_drawdown', 'max_drawdown_amount', 'final_return', 'ruined'}} of per-path arrays.
+        """
+        lots = np.atleast_1d(np.asarray(lots, dtype=float))
+        trades = trades or len(self.results)
+        rng = np.random.default_rng(seed)
+        out = {lot: {'max_drawdown': np.empty(paths), 'max_drawdown_amount': np.empty(paths),
+                     'final_return': np.empty(paths), 'ruined': np.empty(paths, dtype=bool)} for lot in lots}
+        rows = max(1, self.batch_size // trades)
+        equity = np.empty((rows, trades))
+        peak = np.empty((rows, trades))
+        for first in range(0, paths, rows):
+            n = min(rows, paths - first)
+            # Cumulative PnL of one lot; larger lots scale it linearly
+            cumulative = np.cumsum(self.results[resample(len(self.results), n, trades, block, rng)], axis=1)
+            e, p = equity[:n], peak[:n]
+            for lot in lots:
+                np.multiply(cumulative, lot, out=e)
+                e += self.balance
+                np.maximum.accumulate(e, axis=1, out=p)
+                np.maximum(p, self.balance, out=p)
+                target = out[lot]
+                target['ruined'][first:first + n] = e.min(axis=1) <= self.balance * self.ruin_level
+                target['final_return'][first:first + n] = e[:, -1] / self.balance - 1
+                np.subtract(p, e, out=e)  # Drawdown from here on
+                target['max_drawdown_amount'][first:first + n] = e.max(axis=1)
+                np.divide(e, p, out=e)
+                target['max_drawdown'][first:first + n] = e.max(axis=1)
+        return out
+
+    def report(self, lots, paths=100_000, trades=None, block=1, seed=None):
+        """One row per lot size: risk of ruin, chance of a loss and percentiles of drawdown and return."""
+        simulated = self.simulate(lots, paths, trades, block, seed)
+        rows = []
+        for lot, result in simulated.items():
+            row = {'lot': lot, 'risk_of_ruin': result['ruined'].mean(), 'loss_probability': (result['final_return'] < 0).mean()}
+            row.update({f'drawdown_p{p}': v for p, v in zip(PERCENTILES, np.percentile(result['max_drawdown'], PERCENTILES))})
+            row.update({f'return_p{p}': v for p, v in zip(PERCENTILES, np.percentile(result['final_return'], PERCENTILES))})
+            rows.append(row)
+        return pd.DataFrame(rows).set_index('lot')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo risk of the closed trades.")
+    parser.add_argument('--db', default='trades.db')
+    parser.add_argument('--symbol')
+    parser.add_argument('--magic', type=int)
+    parser.add_argument('--balance', type=float, required=True, help="starting balance in account currency")
+    parser.add_argument('--lots', type=float, nargs='+', default=[0.01])
+    parser.add_argument('--paths', type=int, default=100_000)
+    parser.add_argument('--trades', type=int, help="trades per path (default: as many as were closed)")
+    parser.add_argument('--block', type=int, default=1, help="resample blocks of this many consecutive trades")
+    parser.add_argument('--ruin', type=float, default=0.5, help="equity fraction of the balance counted as ruin")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    simulator = RiskSimulator.from_db(args.balance, args.db, args.symbol, args.magic, ruin_level=args.ruin)
+    print(f"{len(simulator.results)} closed trades, mean {simulator.results.mean():.2f} per lot")
+    report = simulator.report(args.lots, args.paths, args.trades, args.block, args.seed)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(report.T.to_string(float_format=lambda v: f"{v:.4f}"))
+
+
+if __name__ == '__main__':
+    main()
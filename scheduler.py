@@ -0,0 +1,164 @@
+from mt5api import mt5
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+
+def timeframe_seconds(timeframe):
+    """Length of an MT5 timeframe constant in seconds (minute and hour based timeframes only)."""
+    if timeframe in (mt5.TIMEFRAME_W1, mt5.TIMEFRAME_MN1):
+        raise ValueError(f"Weekly and monthly timeframes are not supported: {timeframe}")
+    if timeframe & 0x4000:
+        # Hour based timeframes are encoded as 0x4000 | hours (D1 is 24 hours)
+        return (timeframe & 0x3FFF) * 3600
+    return timeframe * 60
+
+
+class BrokerClock:
+    """
+    Estimates broker server time from tick timestamps.
+
+    MT5 stamps ticks with the server's wall clock expressed as epoch seconds, so
+    `tick time - local receive time` is the server's UTC offset plus any local
+    clock error, minus the tick's age. Ticks are never stamped in the future,
+    so the largest recent sample is the tightest estimate. The offset is split
+    into the server timezone (rounded to 15 minutes) and the residual drift of
+    the local clock, which lets GMT based events follow broker time too.
+    """
+
+    def __init__(self, symbols=(), max_sample_age=600, logger=None, terminal=None):
+        self.symbols = list(symbols)
+        self.mt5 = terminal if terminal else mt5  # Terminal sampled by refresh()
+        self.max_sample_age = max_sample_age
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self._samples = deque()
+        self._lock = threading.Lock()
+        self.offset = 0.0  # server epoch - local epoch
+        self.server_utc_offset = 0  # server timezone in seconds
+        self.drift = 0.0  # broker UTC - local UTC
+        self.last_refresh = None
+
+    def observe(self, tick_time_msc, received_at=None):
+        """Record one tick timestamp (milliseconds, server time) against the local receive time."""
+        received_at = time.time() if received_at is None else received_at
+        with self._lock:
+            self._samples.append((received_at, tick_time_msc / 1000.0 - received_at))
+            while self._samples and received_at - self._samples[0][0] > self.max_sample_age:
+                self._samples.popleft()
+            offset = max(sample for _, sample in self._samples)
+            previous_tz = self.server_utc_offset
+            self.offset = offset
+            self.server_utc_offset = int(round(offset / 900.0)) * 900
+            self.drift = offset - self.server_utc_offset
+        if self.server_utc_offset != previous_tz:
+            self.logger.info(f"Broker server UTC offset is {self.server_utc_offset / 3600:+.2f}h (local drift {self.drift:+.3f}s)")
+
+    def refresh(self):
+        """Sample the latest tick of each reference symbol."""
+        for symbol in self.symbols:
+            try:
+                tick = self.mt5.symbol_info_tick(symbol)
+                if tick is not None:
+                    self.observe(tick.time_msc)
+            except Exception as e:
+                self.logger.error(f"Failed to sample broker time from {symbol}: {e}")
+        self.last_refresh = time.time()
+
+    def server_now(self):
+        """Current broker server time as epoch seconds in the server's timezone."""
+        return time.time() + self.offset
+
+    def utc_now(self):
+        """Current GMT as seen by the broker, as an aware datetime."""
+        return datetime.fromtimestamp(time.time() + self.drift, tz=timezone.utc)
+
+    def server_to_local(self, server_epoch):
+        """Convert a server time (epoch seconds) to the local time.time() domain."""
+        return server_epoch - self.offset
+
+    def utc_to_local(self, utc_epoch):
+        """Convert a broker GMT time (epoch seconds) to the local time.time() domain."""
+        return utc_epoch - self.drift
+
+
+class BarScheduler:
+    """
+    Fires callbacks at bar closes and at fixed times of day, both in broker time.
+
+    Bar boundaries are multiples of the timeframe in server time, so they line up
+    with the bars MT5 builds. Events run as jobs on the shared TimerService and
+    are re-derived whenever the broker clock estimate is refreshed. Callbacks
+    should be short - typically they set a flag and wake the owning bot.
+    """
+
+    def __init__(self, clock, timer_service, refresh_interval=300, logger=None):
+        self.clock = clock
+        self.timer_service = timer_service
+        self.refresh_interval = refresh_interval
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self._jobs = []
+        self._refresh_job = None
+
+    def on_bar_close(self, timeframe, callback):
+        """
+        Call callback(timeframe, close_time) when a bar of `timeframe` closes.
+        close_time is the broker GMT close time as an aware datetime.
+        """
+        period = timeframe_seconds(timeframe)
+
+        def next_deadline(after):
+            # The small epsilon moves past a boundary we have just fired for
+            server_after = after + self.clock.offset + 0.001
+            boundary = (server_after // period + 1) * period
+            close_time = datetime.fromtimestamp(boundary - self.clock.server_utc_offset, tz=timezone.utc)
+            return self.clock.server_to_local(boundary), (timeframe, close_time)
+
+        return self._add(next_deadline, callback, f"bar close every {period}s")
+
+    def at_time(self, hhmm, callback, clock='utc'):
+        """
+        Call callback(event_time) every day at hh:mm broker GMT (clock='utc') or
+        broker server wall time (clock='server').
+        """
+        hour, minute = (int(part) for part in hhmm.split(':'))
+        seconds_of_day = hour * 3600 + minute * 60
+
+        def next_deadline(after):
+            shift = self.clock.drift if clock == 'utc' else self.clock.offset
+            clock_after = after + shift + 0.001
+            event = (clock_after // 86400) * 86400 + seconds_of_day
+            if event <= clock_after:
+                event += 86400
+            utc_event = event if clock == 'utc' else event - self.clock.server_utc_offset
+            return event - shift, (datetime.fromtimestamp(utc_event, tz=timezone.utc),)
+
+        return self._add(next_deadline, callback, f"daily at {hhmm} {clock}")
+
+    def cancel(self, job):
+        self.timer_service.cancel(job)
+        if job in self._jobs:
+            self._jobs.remove(job)
+
+    def _add(self, next_deadline, callback, description):
+        job = self.timer_service.schedule(next_deadline, callback, name=description)
+        self._jobs.append(job)
+        return job
+
+    def start(self):
+        """Start refreshing the broker clock; scheduled events follow each new estimate."""
+        if self._refresh_job is None:
+            self._refresh_job = self.timer_service.call_every(self.refresh_interval, self.refresh_clock,
+                                                              name="broker clock refresh", first=time.time(),
+                                                              blocking=True)
+
+    def stop(self):
+        self.timer_service.cancel(self._refresh_job)
+        self._refresh_job = None
+
+    def refresh_clock(self):
+        self.clock.refresh()
+        # Re-derive deadlines after the clock estimate moved
+        for job in list(self._jobs):
+            self.timer_service.reschedule(job)
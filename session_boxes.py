@@ -0,0 +1,166 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from sessions import _parse_hhmm
+
+
+# The pre-London box: the four hours before 02:00 GMT
+DEFAULT_BOX_SESSIONS = {
+    'london': {'timezone': 'UTC', 'start': '22:00', 'end': '02:00'},
+}
+
+
+class SessionBoxes:
+    """
+    Box levels of several session windows per day, from one pass over the day's bars.
+
+    Sessions use the calendar's format ({'timezone', 'start', 'end', 'weekdays'}),
+    so windows follow DST through the timezone database; a window whose end is not
+    after its start opens the previous day. A session's box belongs to the day its
+    window closes on. For every session the box holds the highest and lowest close
+    (the breakout levels, as Bot.calculate_box), the wick extremes and the height.
+
+    Bars come from a BarSeries: a bot's live series or one built from history with
+    BarSeries.from_rates for backtests. Boxes of completed windows are cached per
+    (symbol, day, session), so a day is never computed twice.
+    """
+
+    def __init__(self, sessions=None, clock=None, max_entries=10000, logger=None):
+        self.sessions = dict(DEFAULT_BOX_SESSIONS if sessions is None else sessions)
+        self.names = list(self.sessions)
+        self.clock = clock  # BrokerClock for the server's UTC offset; bars are in server time
+        self.max_entries = max_entries
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.cache = OrderedDict()  # (symbol, day, session) -> box or None
+        self._lock = threading.Lock()
+
+    def windows(self, day):
+        """Server time [start, end) of every session's window closing on `day`; NaN for sessions not held that day."""
+        offset = self.clock.server_utc_offset if self.clock is not None else 0
+        starts = np.full(len(self.names), np.nan)
+        ends = np.full(len(self.names), np.nan)
+        for i, name in enumerate(self.names):
+            spec = self.sessions[name]
+            if day.weekday() not in spec.get('weekdays', [0, 1, 2, 3, 4]):
+                continue
+            tz = ZoneInfo(spec.get('timezone', 'UTC'))
+            start_hm, end_hm = _parse_hhmm(spec['start']), _parse_hhmm(spec['end'])
+            open_day = day if end_hm > start_hm else day - timedelta(days=1)
+            starts[i] = datetime(open_day.year, open_day.month, open_day.day, *start_hm, tzinfo=tz).timestamp() + offset
+            ends[i] = datetime(day.year, day.month, day.day, *end_hm, tzinfo=tz).timestamp() + offset
+        return starts, ends
+
+    @staticmethod
+    def compute(starts, ends, times, high, low, close):
+        """Boxes of every [start, end) window over one set of bars, as arrays (vectorized over windows and bars)."""
+        inside = (times[None, :] >= starts[:, None]) & (times[None, :] < ends[:, None])
+        bars = inside.sum(axis=1)
+        empty = bars == 0
+        close_high = np.where(empty, np.nan, np.where(inside, close, -np.inf).max(axis=1, initial=-np.inf))
+        close_low = np.where(empty, np.nan, np.where(inside, close, np.inf).min(axis=1, initial=np.inf))
+        wick_high = np.where(empty, np.nan, np.where(inside, high, -np.inf).max(axis=1, initial=-np.inf))
+        wick_low = np.where(empty, np.nan, np.where(inside, low, np.inf).min(axis=1, initial=np.inf))
+        return {'bars': bars, 'close_high': close_high, 'close_low': close_low, 'high': wick_high, 'low': wick_low}
+
+    def boxes(self, symbol, day, series):
+        """
+        {session: box} for the windows closing on `day`; a box is None when its window has no
+        bars or no range. Windows still open are included (with complete=False) but not cached.
+        """
+        results = {}
+        with self._lock:
+            for name in self.names:
+                key = (symbol, day, name)
+                if key in self.cache:
+                    results[name] = self.cache[key]
+        missing = [i for i, name in enumerate(self.names) if name not in results]
+        if not missing:
+            return results
+
+        starts, ends = self.windows(day)
+        held = ~np.isnan(starts)
+        if not held.any():
+            return {name: results.get(name) for name in self.names}
+        # The day's bars: one slice of the series covering every window
+        first = series.position(np.nanmin(starts))
+        last = series.position(np.nanmax(ends))
+        slots = np.arange(first, last) % series.capacity
+        found = self.compute(np.where(held, starts, 0), np.where(held, ends, 0),
+                             series.time[slots], series.high[slots], series.low[slots], series.close[slots])
+        # A window is complete once the last closed bar ends at or after the window's end, and
+        # only usable if the series still holds its first bars
+        closed_until = series.time[(series.next - 1) % series.capacity] + series.period if series.count else 0
+        held_from = series.time[(series.next - series.count) % series.capacity] if series.count else np.inf
+
+        added = {}
+        for i in missing:
+            name = self.names[i]
+            if held[i] and held_from > starts[i]:
+                results[name] = None
+                continue
+            complete = bool(not held[i] or closed_until >= ends[i])
+            box = self._box(found, i, starts[i], ends[i], complete) if held[i] else None
+            results[name] = box
+            if complete:
+                added[(symbol, day, name)] = box
+        if added:
+            with self._lock:
+                self.cache.update(added)
+                while len(self.cache) > self.max_entries:
+                    self.cache.popitem(last=False)
+        return {name: results[name] for name in self.names}
+
+    @staticmethod
+    def _box(found, i, start, end, complete):
+        if not found['bars'][i]:
+            return None
+        high, low = float(found['close_high'][i]), float(found['close_low'][i])
+        if high - low <= 0:
+            return None
+        return {
+            'buy_level': high,
+            'sell_level': low,
+            'buy_stoploss': low,
+            'sell_stoploss': high,
+            'box_height': high - low,
+            'high': float(found['high'][i]),
+            'low': float(found['low'][i]),
+            'bars': int(found['bars'][i]),
+            'start': int(start),
+            'end': int(end),
+            'complete': complete,
+        }
+
+    def history(self, symbol, series, first_day=None, last_day=None):
+        """
+        Boxes of every session for every day the series covers (or first_day..last_day) as a
+        DataFrame with one row per (day, session), for backtests.
+        """
+        import pandas as pd
+        if not series.count:
+            return pd.DataFrame()
+        offset = self.clock.server_utc_offset if self.clock is not None else 0
+        oldest = series.time[(series.next - series.count) % series.capacity] - offset
+        newest = series.time[(series.next - 1) % series.capacity] - offset
+        day = first_day or datetime.fromtimestamp(oldest, tz=timezone.utc).date()
+        last_day = last_day or datetime.fromtimestamp(newest, tz=timezone.utc).date()
+        rows = []
+        while day <= last_day:
+            for name, box in self.boxes(symbol, day, series).items():
+                if box is not None:
+                    rows.append({'day': day, 'session': name, **box})
+            day += timedelta(days=1)
+        return pd.DataFrame(rows)
+
+    def clear(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self.cache.clear()
+            else:
+                for key in [key for key in self.cache if key[0] == symbol]:
+                    del self.cache[key]
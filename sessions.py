@@ -0,0 +1,289 @@
+import bisect
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+
+# Spot FX trades from Sunday 17:00 to Friday 17:00 New York time, which moves
+# with US daylight saving (22:00 GMT in summer, 21:00 GMT in winter).
+DEFAULT_TRADING_HOURS = {
+    'timezone': 'America/New_York',
+    'windows': [[6, '17:00', 4, '17:00']],  # [start weekday, start time, end weekday, end time]
+}
+
+# Session windows are expressed in the local time of their financial centre so
+# that DST shifts (e.g. London open at 07:00 GMT in summer, 08:00 GMT in winter)
+# are handled by the timezone database rather than by hand.
+DEFAULT_SESSIONS = {
+    'asia': {'timezone': 'Asia/Tokyo', 'start': '09:00', 'end': '18:00'},
+    'london': {'timezone': 'Europe/London', 'start': '08:00', 'end': '16:30'},
+    'new_york': {'timezone': 'America/New_York', 'start': '08:00', 'end': '17:00'},
+}
+
+
+def _parse_hhmm(value):
+    hour, minute = value.split(':')
+    return int(hour), int(minute)
+
+
+def _to_epoch(when):
+    """Normalise None / epoch seconds / datetime (naive means UTC) to epoch seconds."""
+    if when is None:
+        return time.time()
+    if isinstance(when, datetime):
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return when.timestamp()
+    return float(when)
+
+
+def _to_datetime(epoch):
+    return datetime.fromtimestamp(epoch, tz=timezone.utc)
+
+
+class SessionTable:
+    """Sorted, non-overlapping [open, close) intervals in epoch seconds."""
+
+    def __init__(self, opens, closes):
+        self.opens = opens
+        self.closes = closes
+
+    def contains(self, t):
+        i = bisect.bisect_right(self.opens, t) - 1
+        return i >= 0 and t < self.closes[i]
+
+    def next_open(self, t):
+        i = bisect.bisect_right(self.opens, t)
+        return self.opens[i] if i < len(self.opens) else None
+
+    def next_close(self, t):
+        i = bisect.bisect_right(self.closes, t)
+        return self.closes[i] if i < len(self.closes) else None
+
+    def window_at(self, t):
+        """Return the interval containing t, or the next one if t is outside every interval."""
+        i = bisect.bisect_right(self.opens, t) - 1
+        if i >= 0 and t < self.closes[i]:
+            return self.opens[i], self.closes[i]
+        if i + 1 < len(self.opens):
+            return self.opens[i + 1], self.closes[i + 1]
+        return None
+
+
+class SessionCalendar:
+    """
+    Trading calendar answering open/close and session questions from precomputed tables.
+
+    Trading hours are weekly windows per symbol (with a default for all symbols),
+    holidays remove whole days in the schedule's timezone and sessions are daily
+    windows on weekdays. All boundaries are resolved through the timezone
+    database, so DST changes are handled automatically. Tables cover a rolling
+    horizon and are rebuilt transparently when a query falls outside it; every
+    lookup is a binary search.
+    """
+
+    def __init__(self, trading_hours=None, holidays=None, sessions=None, horizon_days=21, logger=None):
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.trading_hours = {'default': DEFAULT_TRADING_HOURS}
+        self.trading_hours.update(trading_hours or {})
+        self.holidays = self._normalise_holidays(holidays)
+        self.sessions = dict(DEFAULT_SESSIONS if sessions is None else sessions)
+        self.horizon = horizon_days * 86400
+        self._lock = threading.Lock()
+        self._range = (0.0, 0.0)
+        self._market_tables = {}
+        self._session_tables = {}
+
+    @classmethod
+    def from_config(cls, calendar_config, logger=None):
+        """Build a calendar from the optional 'market_calendar' block of config.json."""
+        calendar_config = calendar_config or {}
+        return cls(trading_hours=calendar_config.get('trading_hours'),
+                   holidays=calendar_config.get('holidays'),
+                   sessions=calendar_config.get('sessions'),
+                   horizon_days=calendar_config.get('horizon_days', 21),
+                   logger=logger)
+
+    def _normalise_holidays(self, holidays):
+        # Holidays may be a plain list (applies to every symbol) or a mapping of symbol -> list
+        if not holidays:
+            return {}
+        if isinstance(holidays, dict):
+            return {key: {date.fromisoformat(d) for d in days} for key, days in holidays.items()}
+        return {'default': {date.fromisoformat(d) for d in holidays}}
+
+    # ------------------------------------------------------------------
+    # Table construction
+    # ------------------------------------------------------------------
+
+    def _tables_for(self, t):
+        start, end = self._range
+        # Keep a week of margin on both sides so next_open/next_close never fall off the table
+        if not (start + 7 * 86400 <= t <= end - 7 * 86400):
+            with self._lock:
+                start, end = self._range
+                if not (start + 7 * 86400 <= t <= end - 7 * 86400):
+                    self._rebuild(t)
+        return self._market_tables, self._session_tables
+
+    def _rebuild(self, t):
+        start = t - 14 * 86400
+        end = t + self.horizon + 7 * 86400
+        self._market_tables = {key: self._build_market_table(key, start, end) for key in self.trading_hours}
+        self._session_tables = {name: self._build_session_table(spec, start, end) for name, spec in self.sessions.items()}
+        self._range = (start, end)
+        self.logger.debug(f"Session calendar tables rebuilt for {_to_datetime(start)} - {_to_datetime(end)}")
+
+    def _build_market_table(self, key, start, end):
+        spec = self.trading_hours[key]
+        tz = ZoneInfo(spec.get('timezone', 'UTC'))
+        first_day = datetime.fromtimestamp(start, tz).date()
+        last_day = datetime.fromtimestamp(end, tz).date()
+        monday = first_day - timedelta(days=first_day.weekday() + 7)
+
+        intervals = []
+        while monday <= last_day:
+            for start_wd, start_hm, end_wd, end_hm in spec['windows']:
+                open_day = monday + timedelta(days=start_wd)
+                close_day = monday + timedelta(days=end_wd)
+                open_dt = datetime(open_day.year, open_day.month, open_day.day, *_parse_hhmm(start_hm), tzinfo=tz)
+                close_dt = datetime(close_day.year, close_day.month, close_day.day, *_parse_hhmm(end_hm), tzinfo=tz)
+                if close_dt <= open_dt:
+                    # Window wraps into the following week (e.g. Sunday open -> Friday close);
+                    # aware arithmetic on a ZoneInfo datetime is wall-clock, so DST is preserved
+                    close_dt += timedelta(days=7)
+                intervals.append((open_dt.timestamp(), close_dt.timestamp()))
+            monday += timedelta(days=7)
+
+        holidays = self.holidays.get(key, self.holidays.get('default', set()))
+        closed = []
+        for day in holidays:
+            day_start = datetime.combine(day, datetime.min.time(), tz)
+            day_end = datetime.combine(day + timedelta(days=1), datetime.min.time(), tz)
+            closed.append((day_start.timestamp(), day_end.timestamp()))
+
+        return self._to_table(self._subtract(self._merge(intervals), self._merge(closed)), start, end)
+
+    def _build_session_table(self, spec, start, end):
+        tz = ZoneInfo(spec.get('timezone', 'UTC'))
+        start_h, start_m = _parse_hhmm(spec['start'])
+        end_h, end_m = _parse_hhmm(spec['end'])
+        weekdays = set(spec.get('weekdays', [0, 1, 2, 3, 4]))
+        day = datetime.fromtimestamp(start, tz).date() - timedelta(days=1)
+        last_day = datetime.fromtimestamp(end, tz).date()
+
+        intervals = []
+        while day <= last_day:
+            if day.weekday() in weekdays:
+                open_dt = datetime(day.year, day.month, day.day, start_h, start_m, tzinfo=tz)
+                close_day = day if (end_h, end_m) > (start_h, start_m) else day + timedelta(days=1)
+                close_dt = datetime(close_day.year, close_day.month, close_day.day, end_h, end_m, tzinfo=tz)
+                intervals.append((open_dt.timestamp(), close_dt.timestamp()))
+            day += timedelta(days=1)
+        return self._to_table(self._merge(intervals), start, end)
+
+    @staticmethod
+    def _merge(intervals):
+        merged = []
+        for lo, hi in sorted(intervals):
+            if merged and lo <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        return merged
+
+    @staticmethod
+    def _subtract(intervals, holes):
+        result = []
+        for lo, hi in intervals:
+            pieces = [(lo, hi)]
+            for h_lo, h_hi in holes:
+                next_pieces = []
+                for p_lo, p_hi in pieces:
+                    if h_hi <= p_lo or h_lo >= p_hi:
+                        next_pieces.append((p_lo, p_hi))
+                        continue
+                    if p_lo < h_lo:
+                        next_pieces.append((p_lo, h_lo))
+                    if h_hi < p_hi:
+                        next_pieces.append((h_hi, p_hi))
+                pieces = next_pieces
+            result.extend(pieces)
+        return result
+
+    @staticmethod
+    def _to_table(intervals, start, end):
+        kept = [(lo, hi) for lo, hi in intervals if hi > start - 7 * 86400 and lo < end + 7 * 86400]
+        return SessionTable([lo for lo, _ in kept], [hi for _, hi in kept])
+
+    def _market_table(self, t, symbol):
+        tables, _ = self._tables_for(t)
+        return tables.get(symbol, tables['default'])
+
+    def _session_table(self, t, name):
+        _, tables = self._tables_for(t)
+        if name not in tables:
+            raise KeyError(f"Unknown session: {name}")
+        return tables[name]
+
+    # ------------------------------------------------------------------
+    # Market hours
+    # ------------------------------------------------------------------
+
+    def is_open(self, when=None, symbol=None):
+        t = _to_epoch(when)
+        return self._market_table(t, symbol).contains(t)
+
+    def next_open(self, when=None, symbol=None):
+        """Return the next market open strictly after `when` as an aware UTC datetime."""
+        t = _to_epoch(when)
+        value = self._market_table(t, symbol).next_open(t)
+        return _to_datetime(value) if value is not None else None
+
+    def next_close(self, when=None, symbol=None):
+        """Return the next market close strictly after `when` as an aware UTC datetime."""
+        t = _to_epoch(when)
+        value = self._market_table(t, symbol).next_close(t)
+        return _to_datetime(value) if value is not None else None
+
+    def next_transition(self, when=None, symbol=None):
+        """Return the next open or close, whichever comes first."""
+        t = _to_epoch(when)
+        table = self._market_table(t, symbol)
+        candidates = [v for v in (table.next_open(t), table.next_close(t)) if v is not None]
+        return _to_datetime(min(candidates)) if candidates else None
+
+    def seconds_until_transition(self, when=None, symbol=None):
+        t = _to_epoch(when)
+        transition = self.next_transition(t, symbol)
+        if transition is None:
+            return None
+        return max(0.0, transition.timestamp() - t)
+
+    # ------------------------------------------------------------------
+    # Sessions (Asia, London, New York, ...)
+    # ------------------------------------------------------------------
+
+    def in_session(self, name, when=None):
+        t = _to_epoch(when)
+        return self._session_table(t, name).contains(t)
+
+    def next_session_open(self, name, when=None):
+        t = _to_epoch(when)
+        value = self._session_table(t, name).next_open(t)
+        return _to_datetime(value) if value is not None else None
+
+    def next_session_close(self, name, when=None):
+        t = _to_epoch(when)
+        value = self._session_table(t, name).next_close(t)
+        return _to_datetime(value) if value is not None else None
+
+    def session_window(self, name, when=None):
+        """Return (open, close) of the session containing `when`, or of the next one."""
+        t = _to_epoch(when)
+        window = self._session_table(t, name).window_at(t)
+        if window is None:
+            return None
+        return _to_datetime(window[0]), _to_datetime(window[1])
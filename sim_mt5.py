@@ -0,0 +1,934 @@
+"""
+In-process simulated MetaTrader5 terminal.
+
+Implements the subset of the MetaTrader5 package API this project uses, backed
+by deterministic synthetic price paths (or recorded ticks), so the engine can be
+run, load-tested and benchmarked on Linux with no terminal or network.
+Select it for the whole project with TRACY_MT5=sim (see mt5api.py), or call the
+module functions directly.
+
+Prices are generated per symbol as a random walk of hourly anchors filled in
+with a Brownian bridge, so any time range can be produced on demand without
+generating everything before it. Latency, requotes, rejections and dropped
+connections can be injected with configure()/disconnect().
+"""
+import bisect
+import itertools
+import random
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+# ----------------------------------------------------------------------
+# Constants (values match the MetaTrader5 package)
+# ----------------------------------------------------------------------
+
+TIMEFRAME_M1 = 1
+TIMEFRAME_M2 = 2
+TIMEFRAME_M3 = 3
+TIMEFRAME_M4 = 4
+TIMEFRAME_M5 = 5
+TIMEFRAME_M6 = 6
+TIMEFRAME_M10 = 10
+TIMEFRAME_M12 = 12
+TIMEFRAME_M15 = 15
+TIMEFRAME_M20 = 20
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H2 = 16386
+TIMEFRAME_H3 = 16387
+TIMEFRAME_H4 = 16388
+TIMEFRAME_H6 = 16390
+TIMEFRAME_H8 = 16392
+TIMEFRAME_H12 = 16396
+TIMEFRAME_D1 = 16408
+TIMEFRAME_W1 = 32769
+TIMEFRAME_MN1 = 49153
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+
+POSITION_TYPE_BUY = 0
+POSITION_TYPE_SELL = 1
+
+TRADE_ACTION_DEAL = 1
+TRADE_ACTION_PENDING = 5
+TRADE_ACTION_SLTP = 6
+TRADE_ACTION_MODIFY = 7
+TRADE_ACTION_REMOVE = 8
+TRADE_ACTION_CLOSE_BY = 10
+
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+
+ORDER_TIME_GTC = 0
+ORDER_TIME_DAY = 1
+
+DEAL_TYPE_BUY = 0
+DEAL_TYPE_SELL = 1
+DEAL_TYPE_BALANCE = 2
+
+DEAL_ENTRY_IN = 0
+DEAL_ENTRY_OUT = 1
+DEAL_ENTRY_INOUT = 2
+DEAL_ENTRY_OUT_BY = 3
+
+DEAL_REASON_CLIENT = 0
+DEAL_REASON_EXPERT = 3
+DEAL_REASON_SL = 4
+DEAL_REASON_TP = 5
+
+COPY_TICKS_ALL = -1
+COPY_TICKS_INFO = 1
+COPY_TICKS_TRADE = 2
+
+TICK_FLAG_BID = 2
+TICK_FLAG_ASK = 4
+
+TRADE_RETCODE_REQUOTE = 10004
+TRADE_RETCODE_REJECT = 10006
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_DONE_PARTIAL = 10010
+TRADE_RETCODE_ERROR = 10011
+TRADE_RETCODE_TIMEOUT = 10012
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_INVALID_VOLUME = 10014
+TRADE_RETCODE_INVALID_PRICE = 10015
+TRADE_RETCODE_INVALID_STOPS = 10016
+TRADE_RETCODE_MARKET_CLOSED = 10018
+TRADE_RETCODE_PRICE_OFF = 10021
+TRADE_RETCODE_TOO_MANY_REQUESTS = 10024
+TRADE_RETCODE_CONNECTION = 10031
+TRADE_RETCODE_POSITION_CLOSED = 10036
+
+RES_S_OK = 1
+RES_E_FAIL = -1
+RES_E_INVALID_PARAMS = -2
+RES_E_NOT_FOUND = -4
+RES_E_INTERNAL_FAIL = -10000
+RES_E_INTERNAL_FAIL_INIT = -10003
+RES_E_INTERNAL_FAIL_CONNECT = -10004
+RES_E_INTERNAL_FAIL_TIMEOUT = -10005
+
+RATES_DTYPE = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+                        ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')])
+TICKS_DTYPE = np.dtype([('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'), ('volume', '<u8'),
+                        ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8')])
+
+
+# ----------------------------------------------------------------------
+# Records (field order matches the MetaTrader5 package)
+# ----------------------------------------------------------------------
+
+Tick = namedtuple('Tick', 'time bid ask last volume time_msc flags volume_real')
+TradePosition = namedtuple('TradePosition', 'ticket time time_msc time_update time_update_msc type magic identifier '
+                                            'reason volume price_open sl tp price_current swap profit symbol comment external_id')
+TradeDeal = namedtuple('TradeDeal', 'ticket order time time_msc type entry magic position_id reason volume price '
+                                    'commission swap profit fee symbol comment external_id')
+TradeOrder = namedtuple('TradeOrder', 'ticket time_setup time_setup_msc time_done time_done_msc type type_filling state '
+                                      'magic position_id volume_initial volume_current price_open sl tp price_current symbol comment')
+OrderSendResult = namedtuple('OrderSendResult', 'retcode deal order volume price bid ask comment request_id retcode_external request')
+OrderCheckResult = namedtuple('OrderCheckResult', 'retcode balance equity profit margin margin_free margin_level comment request')
+SymbolInfo = namedtuple('SymbolInfo', 'name description visible select digits point spread trade_tick_size trade_tick_value '
+                                      'trade_contract_size trade_stops_level trade_freeze_level volume_min volume_max volume_step '
+                                      'currency_base currency_profit currency_margin bid ask time trade_mode')
+TerminalInfo = namedtuple('TerminalInfo', 'connected trade_allowed build name company ping_last')
+AccountInfo = namedtuple('AccountInfo', 'login server currency leverage balance equity profit margin margin_free margin_level')
+
+
+# Typical starting prices so generated paths look like the real thing
+DEFAULT_PRICES = {
+    'EURUSD': 1.08, 'GBPUSD': 1.27, 'AUDUSD': 0.66, 'NZDUSD': 0.61, 'USDCAD': 1.36, 'USDCHF': 0.90,
+    'USDJPY': 150.0, 'EURJPY': 162.0, 'GBPJPY': 190.0, 'CADJPY': 110.0, 'AUDJPY': 98.0, 'CHFJPY': 167.0,
+    'EURGBP': 0.85, 'EURCHF': 0.97, 'XAUUSD': 2000.0,
+}
+
+
+def _to_epoch(value):
+    """MT5 accepts datetimes (naive values are UTC) or epoch seconds."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+def timeframe_seconds(timeframe):
+    if timeframe in (TIMEFRAME_W1, TIMEFRAME_MN1):
+        raise ValueError("Weekly and monthly timeframes are not simulated")
+    if timeframe & 0x4000:
+        return (timeframe & 0x3FFF) * 3600
+    return timeframe * 60
+
+
+class ManualClock:
+    """Clock for load tests and benchmarks: time only moves when advanced."""
+
+    def __init__(self, start=None):
+        self.now = time.time() if start is None else start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        return self.now
+
+
+class SyntheticPath:
+    """
+    Deterministic random-access log-price path.
+
+    Hourly anchors form a random walk; each hour is filled in with a Brownian
+    bridge between its anchors from its own seed, so any hour can be generated
+    independently of the ones before it.
+    """
+
+    CHUNK = 3600
+
+    def __init__(self, seed, price, volatility, step, cache, origin=0):
+        self.seed = seed
+        self.price = price
+        self.sigma = volatility / np.sqrt(365 * 86400)  # Per-second log volatility
+        self.step = step
+        self.cache = cache
+        # The walk starts at `price` in hour `origin`, so nearby hours are cheap to reach
+        origin = int(origin // self.CHUNK)
+        self._anchors = {origin: 0.0}
+        self._anchor_lo = origin
+        self._anchor_hi = origin
+
+    def _increment(self, k):
+        rng = np.random.default_rng([self.seed, k & 0xFFFFFFFF, 0])
+        return rng.normal(0.0, self.sigma * np.sqrt(self.CHUNK))
+
+    def _anchor(self, k):
+        while k > self._anchor_hi:
+            self._anchors[self._anchor_hi + 1] = self._anchors[self._anchor_hi] + self._increment(self._anchor_hi)
+            self._anchor_hi += 1
+        while k < self._anchor_lo:
+            self._anchors[self._anchor_lo - 1] = self._anchors[self._anchor_lo] - self._increment(self._anchor_lo - 1)
+            self._anchor_lo -= 1
+        return self._anchors[k]
+
+    def _chunk(self, k):
+        key = (self.seed, k)
+        chunk = self.cache.get(key)
+        if chunk is not None:
+            self.cache.move_to_end(key)
+            return chunk
+        n = int(round(self.CHUNK / self.step))
+        rng = np.random.default_rng([self.seed, k & 0xFFFFFFFF, 1])
+        walk = np.concatenate(([0.0], np.cumsum(rng.normal(0.0, self.sigma * np.sqrt(self.step), n))))
+        frac = np.arange(n + 1) / n
+        start, end = self._anchor(k), self._anchor(k + 1)
+        log_price = start + frac * (end - start) + walk - frac * walk[-1]
+        chunk = self.price * np.exp(log_price[:-1])
+        self.cache[key] = chunk
+        if len(self.cache) > SimBroker.CHUNK_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return chunk
+
+    def ticks(self, t0_ms, t1_ms):
+        """Tick times (ms) and mid prices for t0 <= time < t1."""
+        step_ms = int(round(self.step * 1000))
+        first = -(-t0_ms // step_ms)
+        last = -(-t1_ms // step_ms)  # Exclusive
+        if last <= first:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        per_chunk = int(round(self.CHUNK / self.step))
+        times, prices = [], []
+        for k in range(first // per_chunk, (last - 1) // per_chunk + 1):
+            chunk = self._chunk(k)
+            lo = max(first - k * per_chunk, 0)
+            hi = min(last - k * per_chunk, per_chunk)
+            times.append((np.arange(lo, hi, dtype=np.int64) + k * per_chunk) * step_ms)
+            prices.append(chunk[lo:hi])
+        return np.concatenate(times), np.concatenate(prices)
+
+
+class RecordedPath:
+    """Replays recorded ticks (time in ms of server time, mid prices)."""
+
+    def __init__(self, time_msc, prices):
+        order = np.argsort(time_msc, kind='stable')
+        self.time_msc = np.asarray(time_msc, dtype=np.int64)[order]
+        self.prices = np.asarray(prices, dtype=np.float64)[order]
+
+    def ticks(self, t0_ms, t1_ms):
+        lo = np.searchsorted(self.time_msc, t0_ms, side='left')
+        hi = np.searchsorted(self.time_msc, t1_ms, side='left')
+        return self.time_msc[lo:hi], self.prices[lo:hi]
+
+
+class SimSymbol:
+    def __init__(self, name, path, digits, spread, contract_size, stops_level, volume_min, volume_step):
+        self.name = name
+        self.path = path
+        self.digits = digits
+        self.point = 10.0 ** -digits
+        self.spread = spread  # Points
+        self.contract_size = contract_size
+        self.stops_level = stops_level  # Points
+        self.volume_min = volume_min
+        self.volume_step = volume_step
+        if len(name) >= 6 and name[:6].isalpha():
+            self.base, self.quote = name[:3], name[3:6]
+        else:
+            self.base, self.quote = name, 'USD'
+        self.positions = {}  # ticket -> position dict
+        self.stops_checked_ms = None
+
+    def info(self, tick):
+        return SymbolInfo(self.name, self.name, True, True, self.digits, self.point, self.spread, self.point,
+                          self.point * self.contract_size, self.contract_size, self.stops_level, 0,
+                          self.volume_min, 100.0, self.volume_step, self.base, self.quote, self.base,
+                          tick.bid, tick.ask, tick.time, 4)
+
+
+class SimBroker:
+    """State of one simulated terminal/account. Thread safe."""
+
+    CHUNK_CACHE_SIZE = 2048
+
+    def __init__(self, seed=42, clock=None, server_offset=0, tick_interval=1.0, volatility=0.10,
+                 balance=10000.0, currency='USD', leverage=100, auto_symbols=True):
+        self.seed = seed
+        self.clock = clock if clock else time.time
+        self.server_offset = server_offset  # Server timezone in seconds (e.g. 10800 for GMT+3)
+        self.tick_interval = tick_interval
+        self.volatility = volatility
+        self.currency = currency
+        self.leverage = leverage
+        self.balance = balance
+        self.auto_symbols = auto_symbols  # Create symbols on first use
+        self.origin = self.now()  # Synthetic paths start at their initial price here
+
+        self.symbols = {}
+        self.deals = []
+        self.deal_times = []
+        self.orders = []
+        self._tickets = itertools.count(100000000)
+        self._chunk_cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+
+        # Connection and fault injection
+        self.initialized = False
+        self.logged_in = False
+        self.login_id = None
+        self.server = 'Sim-Server'
+        self.error = (RES_S_OK, 'Success')
+        self.latency = 0.0
+        self.latency_jitter = 0.0
+        self.order_latency = 0.0
+        self.requote_rate = 0.0
+        self.failure_rate = 0.0
+        self.disconnect_rate = 0.0
+        self.failed_initializations = 0
+        self.calls = 0
+
+    # ------------------------------------------------------------------
+    # Setup and fault injection
+    # ------------------------------------------------------------------
+
+    def configure(self, **settings):
+        """Set latency, latency_jitter, order_latency, requote_rate, failure_rate or disconnect_rate."""
+        for key, value in settings.items():
+            if not hasattr(self, key):
+                raise AttributeError(f"Unknown simulator setting: {key}")
+            setattr(self, key, value)
+
+    def disconnect(self):
+        """Drop the terminal connection; calls fail until initialize() succeeds again."""
+        with self._lock:
+            self.initialized = False
+            self.logged_in = False
+
+    def fail_next_initializations(self, count):
+        self.failed_initializations = count
+
+    def add_symbol(self, name, price=None, digits=None, spread=None, volatility=None, contract_size=100000.0,
+                   stops_level=10, volume_min=0.01, volume_step=0.01, ticks=None):
+        """
+        Register a symbol. `ticks` may be (time_msc, mid prices) of recorded data;
+        otherwise a synthetic path is generated from the broker seed.
+        """
+        with self._lock:
+            if price is None:
+                price = DEFAULT_PRICES.get(name)
+            if price is None:
+                # Deterministic pseudo price for unknown names
+                price = 0.5 + (zlib.crc32(name.encode()) % 1000) / 500.0
+            if digits is None:
+                digits = 3 if 'JPY' in name else (2 if price > 500 else 5)
+            if spread is None:
+                spread = 10 if digits in (3, 5) else 20
+            if ticks is not None:
+                path = RecordedPath(*ticks)
+            else:
+                path = SyntheticPath(zlib.crc32(f"{self.seed}:{name}".encode()), price,
+                                     self.volatility if volatility is None else volatility,
+                                     self.tick_interval, self._chunk_cache, origin=self.origin)
+            symbol = SimSymbol(name, path, digits, spread, contract_size, stops_level, volume_min, volume_step)
+            self.symbols[name] = symbol
+            return symbol
+
+    def _symbol(self, name):
+        symbol = self.symbols.get(name)
+        if symbol is None and self.auto_symbols and name:
+            symbol = self.add_symbol(name)
+        return symbol
+
+    def now(self):
+        """Current server time (epoch seconds in the server's timezone)."""
+        return self.clock() + self.server_offset
+
+    # ------------------------------------------------------------------
+    # Call plumbing
+    # ------------------------------------------------------------------
+
+    def _enter(self):
+        """Apply latency and connection faults; False means the call fails."""
+        self.calls += 1
+        if self.latency or self.latency_jitter:
+            time.sleep(self.latency + self._random.random() * self.latency_jitter)
+        if self.disconnect_rate and self._random.random() < self.disconnect_rate:
+            self.disconnect()
+        if not self.initialized:
+            self.error = (RES_E_INTERNAL_FAIL_CONNECT, 'No IPC connection')
+            return False
+        self.error = (RES_S_OK, 'Success')
+        return True
+
+    def _tick(self, symbol, now_ms=None):
+        now_ms = int(self.now() * 1000) if now_ms is None else now_ms
+        path = symbol.path
+        if isinstance(path, SyntheticPath):
+            step_ms = int(round(path.step * 1000))
+            t = (now_ms // step_ms) * step_ms
+            times, mids = path.ticks(t, t + 1)
+        else:
+            i = np.searchsorted(path.time_msc, now_ms, side='right')
+            times, mids = path.time_msc[max(i - 1, 0):i], path.prices[max(i - 1, 0):i]
+        if len(times) == 0:
+            return None
+        bid = round(float(mids[-1]), symbol.digits)
+        ask = round(bid + symbol.spread * symbol.point, symbol.digits)
+        time_msc = int(times[-1])
+        return Tick(time_msc // 1000, bid, ask, 0.0, 0, time_msc, TICK_FLAG_BID | TICK_FLAG_ASK, 0.0)
+
+    def _quotes(self, symbol, t0_ms, t1_ms):
+        times, mids = symbol.path.ticks(t0_ms, t1_ms)
+        bids = np.round(mids, symbol.digits)
+        asks = np.round(bids + symbol.spread * symbol.point, symbol.digits)
+        return times, bids, asks
+
+    # ------------------------------------------------------------------
+    # Terminal and account
+    # ------------------------------------------------------------------
+
+    def initialize(self, path=None, login=None, password=None, server=None, timeout=None, portable=False):
+        with self._lock:
+            if self.failed_initializations > 0:
+                self.failed_initializations -= 1
+                self.error = (RES_E_INTERNAL_FAIL_INIT, 'IPC initialize failed')
+                return False
+            self.initialized = True
+            self.error = (RES_S_OK, 'Success')
+            if login is not None:
+                return self.login(login, password, server)
+            return True
+
+    def login(self, login, password=None, server=None, timeout=None):
+        with self._lock:
+            if not self.initialized:
+                self.error = (RES_E_INTERNAL_FAIL_CONNECT, 'No IPC connection')
+                return False
+            self.logged_in = True
+            self.login_id = login
+            self.server = server or self.server
+            return True
+
+    def shutdown(self):
+        with self._lock:
+            self.initialized = False
+            self.logged_in = False
+            return True
+
+    def last_error(self):
+        return self.error
+
+    def version(self):
+        return (500, 4000, '01 Jan 2024')
+
+    def terminal_info(self):
+        with self._lock:
+            if not self._enter():
+                return None
+            return TerminalInfo(True, True, 4000, 'Tracy Simulated Terminal', 'Simulation', 1000)
+
+    def account_info(self):
+        with self._lock:
+            if not self._enter():
+                return None
+            profit = sum(self._position_record(s, p, self._tick(s)).profit
+                         for s in self.symbols.values() for p in s.positions.values())
+            equity = self.balance + profit
+            margin = sum(p['volume'] * s.contract_size * p['price_open'] / self.leverage
+                         for s in self.symbols.values() for p in s.positions.values())
+            return AccountInfo(self.login_id, self.server, self.currency, self.leverage, self.balance, equity,
+                               profit, margin, equity - margin, (equity / margin * 100) if margin else 0.0)
+
+    # ------------------------------------------------------------------
+    # Symbols and market data
+    # ------------------------------------------------------------------
+
+    def symbols_get(self, group=None):
+        with self._lock:
+            if not self._enter():
+                return None
+            return tuple(s.info(self._tick(s)) for name, s in self.symbols.items() if group is None or group in name)
+
+    def symbols_total(self):
+        return len(self.symbols)
+
+    def symbol_select(self, symbol, enable=True):
+        with self._lock:
+            return self._symbol(symbol) is not None
+
+    def symbol_info(self, symbol):
+        with self._lock:
+            if not self._enter():
+                return None
+            sim_symbol = self._symbol(symbol)
+            if sim_symbol is None:
+                self.error = (RES_E_NOT_FOUND, 'Symbol not found')
+                return None
+            return sim_symbol.info(self._tick(sim_symbol))
+
+    def symbol_info_tick(self, symbol):
+        with self._lock:
+            if not self._enter():
+                return None
+            sim_symbol = self._symbol(symbol)
+            if sim_symbol is None:
+                self.error = (RES_E_NOT_FOUND, 'Symbol not found')
+                return None
+            return self._tick(sim_symbol)
+
+    def _rates(self, symbol, timeframe, first_bar, last_bar):
+        """Bars with index first_bar..last_bar (inclusive), bar index = server time // period."""
+        period = timeframe_seconds(timeframe)
+        now_ms = int(self.now() * 1000)
+        t0 = first_bar * period * 1000
+        t1 = min((last_bar + 1) * period * 1000, now_ms + 1)
+        times, bids, asks = self._quotes(symbol, t0, t1)
+        if len(times) == 0:
+            return np.empty(0, dtype=RATES_DTYPE)
+        bins = times // 1000 // period
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(bins)) + 1))
+        ends = np.concatenate((starts[1:], [len(bins)]))
+        rates = np.empty(len(starts), dtype=RATES_DTYPE)
+        rates['time'] = bins[starts] * period
+        rates['open'] = bids[starts]
+        rates['high'] = np.maximum.reduceat(bids, starts)
+        rates['low'] = np.minimum.reduceat(bids, starts)
+        rates['close'] = bids[ends - 1]
+        rates['tick_volume'] = ends - starts
+        rates['spread'] = symbol.spread
+        rates['real_volume'] = 0
+        return rates
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        with self._lock:
+            if not self._enter():
+                return None
+            sim_symbol = self._symbol(symbol)
+            if sim_symbol is None or count <= 0:
+                self.error = (RES_E_INVALID_PARAMS, 'Invalid params')
+                return None
+            current = int(self.now()) // timeframe_seconds(timeframe)
+            return self._rates(sim_symbol, timeframe, current - start_pos - count + 1, current - start_pos)
+
+    def copy_rates_from(self, symbol, timeframe, date_from, count):
+        with self._lock:
+            if not self._enter():
+                return None
+            sim_symbol = self._symbol(symbol)
+            if sim_symbol is None or count <= 0:
+                self.error = (RES_E_INVALID_PARAMS, 'Invalid params')
+                return None
+            last = int(min(_to_epoch(date_from), self.now())) // timeframe_seconds(timeframe)
+            return self._rates(sim_symbol, timeframe, last - count + 1, last)
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        with self._lock:
+            if not self._enter():
+                return None
+            sim_symbol = self._symbol(symbol)
+            if sim_symbol is None:
+                self.error = (RES_E_INVALID_PARAMS, 'Invalid params')
+                return None
+            period = timeframe_seconds(timeframe)
+            first = -(-int(_to_epoch(date_from)) // period)
+            last = int(min(_to_epoch(date_to), self.now())) // period
+            if last < first:
+                return np.empty(0, dtype=RATES_DTYPE)
+            return self._rates(sim_symbol, timeframe, first, last)
+
+    def _tick_array(self, symbol, t0_ms, t1_ms, limit=None):
+        times, bids, asks = self._quotes(symbol, t0_ms, t1_ms)
+        if limit is not None:
+            times, bids, asks = times[:limit], bids[:limit], asks[:limit]
+        ticks = np.zeros(len(times), dtype=TICKS_DTYPE)
+        ticks['time'] = times // 1000
+        ticks['bid'] = bids
+        ticks['ask'] = asks
+        ticks['time_msc'] = times
+        ticks['flags'] = TICK_FLAG_BID | TICK_FLAG_ASK
+        return ticks
+
+    def copy_ticks_from(self, symbol, date_from, count, flags=COPY_TICKS_ALL):
+        with self._lock:
+            if not self._enter():
+                return None
+            sim_symbol = self._symbol(symbol)
+            if sim_symbol is None:
+                self.error = (RES_E_INVALID_PARAMS, 'Invalid params')
+                return None
+            t0 = int(_to_epoch(date_from) * 1000)
+            return self._tick_array(sim_symbol, t0, int(self.now() * 1000) + 1, limit=count)
+
+    def copy_ticks_range(self, symbol, date_from, date_to, flags=COPY_TICKS_ALL):
+        with self._lock:
+            if not self._enter():
+                return None
+            sim_symbol = self._symbol(symbol)
+            if sim_symbol is None:
+                self.error = (RES_E_INVALID_PARAMS, 'Invalid params')
+                return None
+            t0 = int(_to_epoch(date_from) * 1000)
+            t1 = min(int(_to_epoch(date_to) * 1000), int(self.now() * 1000)) + 1
+            return self._tick_array(sim_symbol, t0, t1)
+
+    # ------------------------------------------------------------------
+    # Positions, orders and history
+    # ------------------------------------------------------------------
+
+    def _conversion_rate(self, currency):
+        """Rate converting `currency` amounts into the account currency."""
+        if currency == self.currency:
+            return 1.0
+        direct = self.symbols.get(currency + self.currency)
+        if direct is not None:
+            return self._tick(direct).bid
+        inverse = self.symbols.get(self.currency + currency)
+        if inverse is not None:
+            return 1.0 / self._tick(inverse).bid
+        return 1.0
+
+    def _profit(self, symbol, side, volume, price_open, price_close):
+        direction = 1.0 if side == ORDER_TYPE_BUY else -1.0
+        raw = direction * (price_close - price_open) * volume * symbol.contract_size
+        return round(raw * self._conversion_rate(symbol.quote), 2)
+
+    def _position_record(self, symbol, position, tick):
+        price_current = tick.bid if position['type'] == ORDER_TYPE_BUY else tick.ask
+        profit = self._profit(symbol, position['type'], position['volume'], position['price_open'], price_current)
+        return TradePosition(position['ticket'], position['time'], position['time_msc'], position['time_update'],
+                             position['time_update_msc'], position['type'], position['magic'], position['ticket'],
+                             DEAL_REASON_EXPERT, position['volume'], position['price_open'], position['sl'],
+                             position['tp'], price_current, 0.0, profit, symbol.name, position['comment'], '')
+
+    def _check_stops(self, symbol, now_ms):
+        """Close positions whose SL or TP was touched since the last check."""
+        start = symbol.stops_checked_ms
+        symbol.stops_checked_ms = now_ms
+        if start is None or not symbol.positions or now_ms <= start:
+            return
+        times, bids, asks = self._quotes(symbol, start + 1, now_ms + 1)
+        if len(times) == 0:
+            return
+        lo_bid, hi_bid, lo_ask, hi_ask = bids.min(), bids.max(), asks.min(), asks.max()
+        for position in list(symbol.positions.values()):
+            sl, tp = position['sl'], position['tp']
+            if position['type'] == ORDER_TYPE_BUY:
+                sl_hit = sl and lo_bid <= sl
+                tp_hit = tp and hi_bid >= tp
+                prices = bids
+            else:
+                sl_hit = sl and hi_ask >= sl
+                tp_hit = tp and lo_ask <= tp
+                prices = asks
+            if not (sl_hit or tp_hit):
+                continue
+            # Find the first touch of either level to decide which one closed the position
+            buy = position['type'] == ORDER_TYPE_BUY
+            sl_mask = (prices <= sl if buy else prices >= sl) if sl else np.zeros(len(prices), dtype=bool)
+            tp_mask = (prices >= tp if buy else prices <= tp) if tp else np.zeros(len(prices), dtype=bool)
+            first_sl = np.argmax(sl_mask) if sl_mask.any() else len(prices)
+            first_tp = np.argmax(tp_mask) if tp_mask.any() else len(prices)
+            if first_sl <= first_tp:
+                self._close(symbol, position, position['volume'], sl, int(times[first_sl]), DEAL_REASON_SL)
+            else:
+                self._close(symbol, position, position['volume'], tp, int(times[first_tp]), DEAL_REASON_TP)
+
+    def _sync(self, symbols=None):
+        now_ms = int(self.now() * 1000)
+        for symbol in (symbols if symbols is not None else self.symbols.values()):
+            self._check_stops(symbol, now_ms)
+
+    def _record_deal(self, symbol, deal_type, entry, position, volume, price, time_msc, reason, profit, comment):
+        ticket = next(self._tickets)
+        deal = TradeDeal(ticket, ticket, time_msc // 1000, time_msc, deal_type, entry, position['magic'],
+                         position['ticket'], reason, volume, price, 0.0, 0.0, profit, 0.0, symbol.name, comment, '')
+        # Stop-outs are found after the fact, so keep history sorted by time
+        i = bisect.bisect_right(self.deal_times, time_msc)
+        self.deals.insert(i, deal)
+        self.deal_times.insert(i, time_msc)
+        return deal
+
+    def _close(self, symbol, position, volume, price, time_msc, reason):
+        profit = self._profit(symbol, position['type'], volume, position['price_open'], price)
+        deal_type = DEAL_TYPE_SELL if position['type'] == ORDER_TYPE_BUY else DEAL_TYPE_BUY
+        deal = self._record_deal(symbol, deal_type, DEAL_ENTRY_OUT, position, volume, price, time_msc, reason, profit,
+                                 {DEAL_REASON_SL: 'sl', DEAL_REASON_TP: 'tp'}.get(reason, 'Close'))
+        self.balance += profit
+        position['volume'] = round(position['volume'] - volume, 8)
+        if position['volume'] <= 0:
+            del symbol.positions[position['ticket']]
+        return deal
+
+    def positions_total(self):
+        with self._lock:
+            return sum(len(s.positions) for s in self.symbols.values())
+
+    def positions_get(self, symbol=None, group=None, ticket=None):
+        with self._lock:
+            if not self._enter():
+                return None
+            if symbol is not None:
+                selected = [self.symbols[symbol]] if symbol in self.symbols else []
+            else:
+                selected = [s for name, s in self.symbols.items() if group is None or group.strip('*') in name]
+            self._sync(selected)
+            records = []
+            for sim_symbol in selected:
+                if not sim_symbol.positions:
+                    continue
+                tick = self._tick(sim_symbol)
+                for position in sim_symbol.positions.values():
+                    if ticket is None or position['ticket'] == ticket:
+                        records.append(self._position_record(sim_symbol, position, tick))
+            return tuple(records)
+
+    def orders_get(self, symbol=None, group=None, ticket=None):
+        with self._lock:
+            if not self._enter():
+                return None
+            return ()
+
+    def orders_total(self):
+        return 0
+
+    def _validate_stops(self, symbol, side, tick, sl, tp):
+        min_distance = symbol.stops_level * symbol.point
+        reference = tick.bid if side == ORDER_TYPE_BUY else tick.ask
+        if side == ORDER_TYPE_BUY:
+            if sl and sl > reference - min_distance:
+                return False
+            if tp and tp < reference + min_distance:
+                return False
+        else:
+            if sl and sl < reference + min_distance:
+                return False
+            if tp and tp > reference - min_distance:
+                return False
+        return True
+
+    def _check_request(self, request, tick, symbol):
+        """Validation shared by order_check and order_send; returns (retcode, comment)."""
+        action = request.get('action')
+        if action == TRADE_ACTION_DEAL and 'position' not in request:
+            volume = request.get('volume') or 0
+            steps = round(volume / symbol.volume_step, 6)
+            if volume < symbol.volume_min or abs(steps - round(steps)) > 1e-6:
+                return TRADE_RETCODE_INVALID_VOLUME, 'Invalid volume'
+            if request.get('type') not in (ORDER_TYPE_BUY, ORDER_TYPE_SELL):
+                return TRADE_RETCODE_INVALID, 'Invalid order type'
+            if not self._validate_stops(symbol, request['type'], tick, request.get('sl') or 0.0, request.get('tp') or 0.0):
+                return TRADE_RETCODE_INVALID_STOPS, 'Invalid stops'
+        elif action == TRADE_ACTION_SLTP:
+            position = symbol.positions.get(request.get('position'))
+            if position is None:
+                return TRADE_RETCODE_POSITION_CLOSED, 'Position doesn\'t exist'
+            if not self._validate_stops(symbol, position['type'], tick, request.get('sl') or 0.0, request.get('tp') or 0.0):
+                return TRADE_RETCODE_INVALID_STOPS, 'Invalid stops'
+        elif action != TRADE_ACTION_DEAL:
+            return TRADE_RETCODE_INVALID, 'Unsupported action'
+        return TRADE_RETCODE_DONE, 'Request executed'
+
+    def order_check(self, request):
+        with self._lock:
+            if not self._enter():
+                return None
+            symbol = self._symbol(request.get('symbol'))
+            if symbol is None:
+                return OrderCheckResult(TRADE_RETCODE_INVALID, self.balance, self.balance, 0.0, 0.0, self.balance, 0.0,
+                                        'Invalid symbol', request)
+            tick = self._tick(symbol)
+            retcode, comment = self._check_request(request, tick, symbol)
+            margin = (request.get('volume') or 0) * symbol.contract_size * tick.ask / self.leverage
+            # order_check reports success as retcode 0
+            return OrderCheckResult(0 if retcode == TRADE_RETCODE_DONE else retcode, self.balance, self.balance, 0.0,
+                                    margin, self.balance - margin, 0.0, 'Done' if retcode == TRADE_RETCODE_DONE else comment,
+                                    request)
+
+    def order_send(self, request):
+        if self.order_latency:
+            time.sleep(self.order_latency)
+        with self._lock:
+            if not self._enter():
+                return None
+            symbol = self._symbol(request.get('symbol'))
+            if symbol is None and request.get('position') is not None:
+                symbol = next((s for s in self.symbols.values() if request['position'] in s.positions), None)
+            if symbol is None:
+                return self._result(TRADE_RETCODE_INVALID, request, comment='Invalid symbol')
+            self._sync([symbol])
+            tick = self._tick(symbol)
+
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                return self._result(TRADE_RETCODE_REJECT, request, tick, comment='Request rejected')
+            if self.requote_rate and request.get('action') == TRADE_ACTION_DEAL and self._random.random() < self.requote_rate:
+                return self._result(TRADE_RETCODE_REQUOTE, request, tick, comment='Requote')
+
+            retcode, comment = self._check_request(request, tick, symbol)
+            if retcode != TRADE_RETCODE_DONE:
+                return self._result(retcode, request, tick, comment=comment)
+
+            if request['action'] == TRADE_ACTION_SLTP:
+                position = symbol.positions[request['position']]
+                position['sl'] = request.get('sl') or 0.0
+                position['tp'] = request.get('tp') or 0.0
+                position['time_update_msc'] = tick.time_msc
+                position['time_update'] = tick.time
+                return self._result(TRADE_RETCODE_DONE, request, tick, order=position['ticket'])
+
+            if request.get('position') is not None:
+                position = symbol.positions.get(request['position'])
+                if position is None:
+                    return self._result(TRADE_RETCODE_POSITION_CLOSED, request, tick, comment='Position doesn\'t exist')
+                price = tick.bid if position['type'] == ORDER_TYPE_BUY else tick.ask
+                volume = min(request.get('volume') or position['volume'], position['volume'])
+                deal = self._close(symbol, position, volume, price, tick.time_msc, DEAL_REASON_EXPERT)
+                return self._result(TRADE_RETCODE_DONE, request, tick, deal=deal.ticket, order=deal.order,
+                                    volume=volume, price=price)
+
+            side = request['type']
+            price = tick.ask if side == ORDER_TYPE_BUY else tick.bid
+            requested = request.get('price')
+            deviation = request.get('deviation') or 0
+            if requested and abs(price - requested) > deviation * symbol.point + 1e-12:
+                return self._result(TRADE_RETCODE_REQUOTE, request, tick, comment='Requote')
+
+            ticket = next(self._tickets)
+            position = {
+                'ticket': ticket, 'time': tick.time, 'time_msc': tick.time_msc, 'time_update': tick.time,
+                'time_update_msc': tick.time_msc, 'type': side, 'magic': request.get('magic', 0),
+                'volume': request['volume'], 'price_open': price, 'sl': request.get('sl') or 0.0,
+                'tp': request.get('tp') or 0.0, 'comment': request.get('comment', ''),
+            }
+            symbol.positions[ticket] = position
+            deal = self._record_deal(symbol, DEAL_TYPE_BUY if side == ORDER_TYPE_BUY else DEAL_TYPE_SELL, DEAL_ENTRY_IN,
+                                     position, request['volume'], price, tick.time_msc, DEAL_REASON_EXPERT, 0.0,
+                                     request.get('comment', ''))
+            self.orders.append(TradeOrder(ticket, tick.time, tick.time_msc, tick.time, tick.time_msc, side,
+                                          request.get('type_filling', ORDER_FILLING_IOC), 4, position['magic'], ticket,
+                                          request['volume'], 0.0, price, position['sl'], position['tp'], price,
+                                          symbol.name, position['comment']))
+            return self._result(TRADE_RETCODE_DONE, request, tick, deal=deal.ticket, order=ticket,
+                                volume=request['volume'], price=price)
+
+    def _result(self, retcode, request, tick=None, deal=0, order=0, volume=0.0, price=0.0, comment='Request executed'):
+        return OrderSendResult(retcode, deal, order, volume, price, tick.bid if tick else 0.0, tick.ask if tick else 0.0,
+                               comment, 0, 0, request)
+
+    def history_deals_get(self, date_from=None, date_to=None, group=None, ticket=None, position=None):
+        with self._lock:
+            if not self._enter():
+                return None
+            self._sync()
+            if ticket is not None:
+                return tuple(d for d in self.deals if d.order == ticket)
+            if position is not None:
+                return tuple(d for d in self.deals if d.position_id == position)
+            lo = bisect.bisect_left(self.deal_times, int(_to_epoch(date_from) * 1000)) if date_from is not None else 0
+            hi = bisect.bisect_right(self.deal_times, int(_to_epoch(date_to) * 1000)) if date_to is not None else len(self.deals)
+            deals = self.deals[lo:hi]
+            if group:
+                deals = [d for d in deals if group.strip('*') in d.symbol]
+            return tuple(deals)
+
+    def history_deals_total(self, date_from, date_to):
+        deals = self.history_deals_get(date_from, date_to)
+        return len(deals) if deals is not None else None
+
+    def history_orders_get(self, date_from=None, date_to=None, group=None, ticket=None, position=None):
+        with self._lock:
+            if not self._enter():
+                return None
+            orders = self.orders
+            if ticket is not None:
+                orders = [o for o in orders if o.ticket == ticket]
+            if position is not None:
+                orders = [o for o in orders if o.position_id == position]
+            if group:
+                orders = [o for o in orders if group.strip('*') in o.symbol]
+            if date_from is not None:
+                orders = [o for o in orders if o.time_setup >= _to_epoch(date_from)]
+            if date_to is not None:
+                orders = [o for o in orders if o.time_setup <= _to_epoch(date_to)]
+            return tuple(orders)
+
+
+# ----------------------------------------------------------------------
+# Module level API mirroring the MetaTrader5 package
+# ----------------------------------------------------------------------
+
+_broker = SimBroker()
+
+
+def broker():
+    """The simulated broker behind the module functions."""
+    return _broker
+
+
+def reset(**settings):
+    """Replace the simulated broker (e.g. reset(seed=1, clock=ManualClock()))."""
+    global _broker
+    _broker = SimBroker(**settings)
+    return _broker
+
+
+def _delegate(name):
+    def call(*args, **kwargs):
+        return getattr(_broker, name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+for _name in ('initialize', 'login', 'shutdown', 'last_error', 'version', 'terminal_info', 'account_info',
+              'symbols_get', 'symbols_total', 'symbol_select', 'symbol_info', 'symbol_info_tick',
+              'copy_rates_from_pos', 'copy_rates_from', 'copy_rates_range', 'copy_ticks_from', 'copy_ticks_range',
+              'positions_total', 'positions_get', 'orders_get', 'orders_total', 'order_check', 'order_send',
+              'history_deals_get', 'history_deals_total', 'history_orders_get'):
+    globals()[_name] = _delegate(_name)
+del _name
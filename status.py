@@ -0,0 +1,79 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StatusServer:
+    """
+    Read-only JSON status of the engine over HTTP on localhost:
+
+        GET /status            engine summary and every bot
+        GET /status/<SYMBOL>   one bot
+
+    Responses are built by `provider` (TradeEngine.status) from the snapshots the
+    bots publish at the end of each cycle, so a request never waits on a bot or
+    calls the terminal. Requests are served on their own threads.
+    """
+
+    def __init__(self, provider, host='127.0.0.1', port=8765, logger=None):
+        self.provider = provider
+        self.host = host
+        self.port = port
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            self.logger.error(f"Status API not started on {self.host}:{self.port}: {e}")
+            self.server = None
+            return False
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="StatusServer", daemon=True)
+        self.thread.start()
+        self.logger.info(f"Status API listening on http://{self.host}:{self.port}/status")
+        return True
+
+    def handle(self, request):
+        parts = [part for part in request.path.split('?')[0].split('/') if part]
+        try:
+            status = self.provider()
+            if parts == ['status']:
+                body = status
+            elif len(parts) == 2 and parts[0] == 'status' and parts[1] in status['bots']:
+                body = status['bots'][parts[1]]
+            else:
+                self._reply(request, 404, {'error': f"Not found: {request.path}"})
+                return
+            self._reply(request, 200, body)
+        except Exception as e:
+            self.logger.error(f"Status request {request.path} failed: {e}", exc_info=True)
+            self._reply(request, 500, {'error': str(e)})
+
+    @staticmethod
+    def _reply(request, code, body):
+        data = json.dumps(body, default=str).encode()
+        request.send_response(code)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
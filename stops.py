@@ -0,0 +1,199 @@
+from mt5api import mt5
+import logging
+import threading
+import time
+
+import numpy as np
+
+# The broker already has these stops; 10025 is the terminal's value when the module lacks the name
+NO_CHANGES = getattr(mt5, 'TRADE_RETCODE_NO_CHANGES', 10025)
+
+
+def desired_stops(trade_type, price, stop_loss, max_distance, trail):
+    """
+    Trailing stop rule over arrays of positions: once the stop is `max_distance` or more
+    behind the current price it is moved to `trail` behind it. Positions without a stop
+    (0.0) or not far enough in profit keep their current stop.
+    """
+    buy = np.asarray(trade_type) == 0
+    price = np.asarray(price, dtype=float)
+    stop_loss = np.asarray(stop_loss, dtype=float)
+    behind = np.where(buy, price - stop_loss, stop_loss - price)
+    target = np.where(buy, price - trail, price + trail)
+    return np.where((stop_loss > 0) & (behind >= max_distance), target, stop_loss)
+
+
+class StopManager:
+    """
+    Trailing stop modifications for every open position of the account.
+
+    Bots register a trailing rule per symbol and magic number; run() fetches the
+    open positions once and computes the desired stops for all of them in one
+    vectorized pass. A modification is only sent when the new stop beats the
+    current one by at least `min_step_pips`, while no other request for the same
+    ticket is in flight, and within the account-wide rate limit (a token bucket of
+    `rate_limit` requests per second, bursts up to `burst`). Desired stops are
+    recomputed from the latest price on every pass, so updates for a ticket that
+    had to wait coalesce into one request. Targets are rounded and moved out to the
+    broker's stops level before they are compared, so a stop the broker would
+    clamp back to its current value is never sent. Sent and suppressed
+    modifications are counted in `counters`; a reply of no changes gives its
+    token back and is counted under `no_change`.
+    """
+
+    def __init__(self, mt5_connector, symbol_specs, min_step_pips=1.0, rate_limit=5.0, burst=10, logger=None):
+        self.mt5_connector = mt5_connector
+        self.symbol_specs = symbol_specs
+        self.min_step_pips = min_step_pips
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.rules = {}  # (symbol, magic) -> (max_distance, trail) in price units
+        self.in_flight = set()
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.counters = {'sent': 0, 'failed': 0, 'no_change': 0, 'min_step': 0, 'in_flight': 0, 'rate_limited': 0}
+        self._lock = threading.Lock()
+
+    def set_trail(self, symbol, magic, max_distance, trail):
+        with self._lock:
+            self.rules[(symbol, magic)] = (max_distance, trail)
+
+    def clear_trail(self, symbol, magic):
+        with self._lock:
+            self.rules.pop((symbol, magic), None)
+
+    @property
+    def suppressed(self):
+        return self.counters['min_step'] + self.counters['in_flight'] + self.counters['rate_limited']
+
+    def run(self, symbols=None):
+        """One pass over the open positions (of `symbols`, default all). Returns the number of modifications sent."""
+        with self._lock:
+            rules = dict(self.rules)
+        if symbols is not None:
+            rules = {key: rule for key, rule in rules.items() if key[0] in symbols}
+        if not rules:
+            return 0
+        if symbols is not None and len(symbols) == 1:
+            positions = self.mt5_connector.call('positions_get', symbol=symbols[0])
+        else:
+            positions = self.mt5_connector.call('positions_get')
+        if not positions:
+            return 0
+
+        tickets = np.array([p.ticket for p in positions], dtype=np.int64)
+        types = np.array([p.type for p in positions])
+        magics = np.array([p.magic for p in positions])
+        names = np.array([p.symbol for p in positions])
+        prices = np.array([p.price_current for p in positions])
+        stops = np.array([p.sl for p in positions])
+        take_profits = np.array([p.tp for p in positions])
+
+        max_distance = np.full(len(positions), np.nan)
+        trail = np.full(len(positions), np.nan)
+        for (symbol, magic), (distance, amount) in rules.items():
+            matched = (names == symbol) & (magics == magic)
+            max_distance[matched] = distance
+            trail[matched] = amount
+        ruled = ~np.isnan(max_distance)
+        if not ruled.any():
+            return 0
+        tickets, types, names, prices, stops, take_profits, max_distance, trail = (
+            a[ruled] for a in (tickets, types, names, prices, stops, take_profits, max_distance, trail))
+
+        targets = desired_stops(types, prices, stops, max_distance, trail)
+        targets, take_profits = self._valid_stops(types, names, prices, stops, targets, take_profits)
+        buy = types == 0
+        improvement = np.where(buy, targets - stops, stops - targets)
+        pip_sizes = self.symbol_specs.pip_sizes(names)
+        wanted = improvement > 0
+        qualified = wanted & (improvement >= self.min_step_pips * pip_sizes)
+        with self._lock:
+            self.counters['min_step'] += int((wanted & ~qualified).sum())
+        if not qualified.any():
+            return 0
+
+        # Biggest moves first, so a tight rate limit goes to the stops that lag most
+        order = np.flatnonzero(qualified)
+        order = order[np.argsort(-(improvement[order] / pip_sizes[order]), kind='stable')]
+        sent = 0
+        for i in order:
+            ticket = int(tickets[i])
+            if not self._acquire(ticket):
+                continue
+            try:
+                if self._send(ticket, names[i], targets[i], take_profits[i]):
+                    sent += 1
+            finally:
+                with self._lock:
+                    self.in_flight.discard(ticket)
+        return sent
+
+    def _valid_stops(self, types, names, prices, stops, targets, take_profits):
+        """Targets and TPs as the broker will accept them, for the positions whose stop is due to move."""
+        targets = targets.copy()
+        take_profits = take_profits.copy()
+        moving = targets != stops
+        for symbol in np.unique(names[moving]):
+            spec = self.symbol_specs.get(symbol)
+            if spec is None:
+                continue
+            for trade_type in (0, 1):
+                rows = moving & (names == symbol) & (types == trade_type)
+                if rows.any():
+                    # price_current is the bid for buys and the ask for sells, which is what stops are checked against
+                    sl, tp = spec.valid_stops(trade_type, prices[rows], prices[rows], targets[rows], take_profits[rows])
+                    targets[rows] = sl
+                    take_profits[rows] = tp
+        return targets, take_profits
+
+    def _acquire(self, ticket):
+        """Claim a ticket and a rate limit token; counts the reason when either is unavailable."""
+        with self._lock:
+            if ticket in self.in_flight:
+                self.counters['in_flight'] += 1
+                return False
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate_limit)
+            self.refilled_at = now
+            if self.tokens < 1:
+                self.counters['rate_limited'] += 1
+                return False
+            self.tokens -= 1
+            self.in_flight.add(ticket)
+            return True
+
+    def _send(self, ticket, symbol, stop_loss, take_profit):
+        request = {
+            "action": mt5.TRADE_ACTION_SLTP,
+            "position": ticket,
+            "symbol": symbol,
+            "sl": float(stop_loss),
+            "tp": float(take_profit),
+        }
+        try:
+            result = self.mt5_connector.mt5.order_send(request)
+        except Exception as e:
+            self.logger.error(f"Exception while trailing stop for {symbol}, ticket {ticket}: {e}")
+            result = None
+        with self._lock:
+            if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+                self.counters['sent'] += 1
+                ok = True
+            elif result is not None and result.retcode == NO_CHANGES:
+                # Nothing was modified, so the request does not count against the rate limit
+                self.counters['no_change'] += 1
+                self.tokens = min(self.burst, self.tokens + 1)
+                ok = None
+            else:
+                self.counters['failed'] += 1
+                ok = False
+        if ok:
+            self.logger.info(f"Trailing stop for {symbol}, ticket {ticket} moved to {request['sl']}.")
+        elif ok is None:
+            self.logger.debug(f"Trailing stop for {symbol}, ticket {ticket} already at {request['sl']}.")
+        else:
+            self.logger.error(f"Failed to trail stop for {symbol}, ticket {ticket}. "
+                              f"Retcode: {result.retcode if result else None}, Comment: '{result.comment if result else self.mt5_connector.mt5.last_error()}'")
+        return ok
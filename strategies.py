@@ -0,0 +1,252 @@
+import logging
+import threading
+
+import numpy as np
+
+from bars import ticks_after
+
+
+# ----------------------------------------------------------------------
+# Indicators
+# ----------------------------------------------------------------------
+
+def atr(series, period):
+    """Average true range of the last `period` closed bars (None until period + 1 bars are held)."""
+    if series.count < period + 1:
+        return None
+    high = series.values('high', period)
+    low = series.values('low', period)
+    previous_close = series.values('close', period + 1)[:-1]
+    true_range = np.maximum(high, previous_close) - np.minimum(low, previous_close)
+    return float(true_range.mean())
+
+
+def sma(series, period, field='close'):
+    if series.count < period:
+        return None
+    return float(series.values(field, period).mean())
+
+
+def highest(series, period, field='high'):
+    if series.count < period:
+        return None
+    return float(series.values(field, period).max())
+
+
+def lowest(series, period, field='low'):
+    if series.count < period:
+        return None
+    return float(series.values(field, period).min())
+
+
+INDICATORS = {'atr': atr, 'sma': sma, 'highest': highest, 'lowest': lowest}
+
+
+class IndicatorCache:
+    """
+    Indicators over the closed bars of each symbol's BarAggregator, memoized by
+    (symbol, timeframe, indicator, params). A value is computed once per closed bar:
+    entries carry the series' stamp and are recomputed only after the next bar
+    closes, however many strategies ask for them in between. One cache is shared by
+    every bot of the engine; indicator functions take (series, *params).
+    """
+
+    def __init__(self, indicators=None, logger=None):
+        self.indicators = dict(INDICATORS, **(indicators or {}))
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.sources = {}  # symbol -> BarAggregator
+        self.entries = {}  # (symbol, timeframe, indicator, params) -> (stamp, value)
+        self.counters = {'hits': 0, 'computed': 0}
+        self._lock = threading.Lock()
+
+    def add_source(self, aggregator):
+        self.sources[aggregator.symbol] = aggregator
+
+    def register(self, name, function):
+        self.indicators[name] = function
+
+    def get(self, symbol, timeframe, indicator, *params):
+        """Value of `indicator` with `params` on the closed bars of (symbol, timeframe); None if not available."""
+        aggregator = self.sources.get(symbol)
+        series = aggregator.closed_series(timeframe) if aggregator else None
+        if series is None:
+            return None
+        key = (symbol, timeframe, indicator, params)
+        stamp = series.stamp()
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self.counters['hits'] += 1
+                return entry[1]
+        value = self.indicators[indicator](series, *params)
+        with self._lock:
+            self.counters['computed'] += 1
+            if value is not None:
+                self.entries[key] = (stamp, value)
+        return value
+
+    def clear(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self.entries.clear()
+            else:
+                self.entries = {key: entry for key, entry in self.entries.items() if key[0] != symbol}
+
+    def state(self):
+        """Entries as JSON-friendly lists [symbol, timeframe, indicator, params, stamp, value]."""
+        with self._lock:
+            return [[*key[:3], list(key[3]), list(stamp), value] for key, (stamp, value) in self.entries.items()]
+
+    def restore(self, state):
+        """Take entries saved with state(); each is used only while its series' stamp still matches."""
+        with self._lock:
+            for symbol, timeframe, indicator, params, stamp, value in state:
+                self.entries[(symbol, timeframe, indicator, tuple(params))] = (tuple(stamp), value)
+
+
+# ----------------------------------------------------------------------
+# Strategies
+# ----------------------------------------------------------------------
+
+class Strategy:
+    """
+    Base class of the trading strategies a bot hosts. The bot is the strategy's
+    host: it owns the symbol's feed, bars, orders and positions. Hooks:
+
+        on_tick(ticks)             every new batch of ticks (MT5 tick array)
+        on_bar(timeframe, bar)     every closed bar of the bot's bar aggregator
+        on_fill(fill)              an order of one of the strategy's magic numbers opened a position
+        on_timer(now)              once per bot cycle (UTC now, broker GMT with a scheduler)
+
+    Indicators should be read through indicator(), which shares computations with
+    the other strategies on the symbol.
+    """
+
+    name = 'strategy'
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.runtime = None
+
+    @property
+    def magics(self):
+        """Magic numbers whose fills are routed to this strategy."""
+        return ()
+
+    def attach(self, runtime):
+        self.runtime = runtime
+
+    def indicator(self, timeframe, indicator, *params):
+        return self.runtime.indicators.get(self.runtime.symbol, timeframe, indicator, *params)
+
+    def on_tick(self, ticks):
+        pass
+
+    def on_bar(self, timeframe, bar):
+        pass
+
+    def on_fill(self, fill):
+        pass
+
+    def on_timer(self, now):
+        pass
+
+
+class LondonBreakStrategy(Strategy):
+    """
+    The pre-London box breakout: the box is calculated once the box window has
+    closed, both breakout legs open on a break and a third trade follows on a 50%
+    retracement. The box, orders and positions are the bot's (they are part of its
+    persisted state), so this plugin only drives them.
+    """
+
+    name = 'london_break'
+
+    @property
+    def magics(self):
+        return (self.bot.magic1, self.bot.magic2, self.bot.magic3)
+
+    def on_timer(self, now):
+        bot = self.bot
+        # Shared with the position manager's ATR stops: computed once per closed bar
+        bot.atr = self.indicator(bot.timeframe, 'atr', bot.atr_period)
+        # With a scheduler the box is due once its window's last bar has closed,
+        # otherwise fall back to the hour check (e.g., between 2:00 GMT and 2:59 GMT)
+        box_due = bot.box_window_end is not None if bot.scheduler else 2 <= now.hour < 3
+        if box_due and not bot.levels_calculated:
+            bot.logger.info("------------------------------------------------------------------")
+            bot.logger.info(f"Time(GMT): {now}")
+            bot.calculate_levels()
+            bot.levels_calculated = True
+            bot.logger.info(f"Levels Calculated: {bot.symbol}: {bot.levels_calculated}")
+
+        # Only check for breakout if levels have been calculated and a trade hasn't been executed yet
+        if bot.levels_calculated and not bot.trade_executed:
+            bot.attempt_to_execute_trades()
+
+        # Once the breakout trade is in, wait for the retracement trade
+        if bot.trade_executed and not bot.retracement_trade_executed:
+            bot.check_for_retracement()
+
+
+# Strategies selectable by name (strategy_params.strategies)
+STRATEGIES = {'london_break': LondonBreakStrategy}
+
+
+class StrategyRuntime:
+    """
+    Hosts the strategies of one symbol on a single subscription to the bot's tick
+    scanner and bar aggregator: every batch of ticks and every closed bar is
+    received once and handed to each strategy in turn, so adding a strategy adds
+    no market data calls. A strategy that raises is logged and skipped; the others
+    still run.
+    """
+
+    def __init__(self, symbol, bar_aggregator, tick_scanner, indicators=None, logger=None):
+        self.symbol = symbol
+        self.bar_aggregator = bar_aggregator
+        self.indicators = indicators if indicators else IndicatorCache(logger=logger)
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.strategies = []
+        self.cursor = None  # Last tick handed on; a rewound scanner does not replay ticks
+        self.indicators.add_source(bar_aggregator)
+        bar_aggregator.listeners.append(self._on_bar)
+        tick_scanner.listeners.append(self._on_ticks)
+
+    def add(self, strategy):
+        clashes = set(strategy.magics) & {magic for other in self.strategies for magic in other.magics}
+        if clashes:
+            raise ValueError(f"{self.symbol}: magic number(s) {sorted(clashes)} of {strategy.name} are already in use")
+        strategy.attach(self)
+        self.strategies.append(strategy)
+        self.logger.info(f"{self.symbol}: strategy {strategy.name} added.")
+        return strategy
+
+    def remove(self, name):
+        self.strategies = [strategy for strategy in self.strategies if strategy.name != name]
+
+    def get(self, name):
+        return next((strategy for strategy in self.strategies if strategy.name == name), None)
+
+    def _dispatch(self, hook, strategies, *args):
+        for strategy in strategies:
+            try:
+                getattr(strategy, hook)(*args)
+            except Exception as e:
+                self.logger.error(f"{self.symbol}: {strategy.name}.{hook} failed: {e}", exc_info=True)
+
+    def _on_ticks(self, ticks):
+        ticks, self.cursor = ticks_after(ticks, self.cursor)
+        if len(ticks):
+            self._dispatch('on_tick', self.strategies, ticks)
+
+    def _on_bar(self, symbol, timeframe, bar):
+        self._dispatch('on_bar', self.strategies, timeframe, bar)
+
+    def on_fill(self, fill):
+        """Hand a fill to the strategies that own its magic number."""
+        owners = [strategy for strategy in self.strategies if fill['magic'] in strategy.magics]
+        self._dispatch('on_fill', owners, fill)
+
+    def on_timer(self, now):
+        self._dispatch('on_timer', self.strategies, now)
@@ -0,0 +1,148 @@
+import logging
+import threading
+
+import numpy as np
+
+
+def _scalar(value):
+    """Return plain floats for scalar input, arrays otherwise."""
+    return float(value) if np.ndim(value) == 0 else value
+
+
+class SymbolSpec:
+    """
+    Trading specification of one symbol as reported by symbol_info.
+
+    A pip is the fourth decimal (second for JPY pairs), i.e. ten points on
+    5 and 3 digit quotes and one point otherwise. The conversion and rounding
+    helpers accept scalars or numpy arrays.
+    """
+
+    def __init__(self, info):
+        self.name = info.name
+        self.digits = info.digits
+        self.point = info.point
+        self.tick_size = info.trade_tick_size or info.point
+        self.tick_value = info.trade_tick_value
+        self.contract_size = info.trade_contract_size
+        self.stops_level = info.trade_stops_level  # Minimum SL/TP distance from price, in points
+        self.freeze_level = info.trade_freeze_level
+        self.volume_min = info.volume_min
+        self.volume_max = info.volume_max
+        self.volume_step = info.volume_step
+        self.currency_base = info.currency_base
+        self.currency_profit = info.currency_profit
+        self.pip = self.point * 10 if self.digits in (3, 5) else self.point
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        """A spec saved with as_dict(), e.g. by the warm start."""
+        spec = cls.__new__(cls)
+        spec.__dict__.update(data)
+        return spec
+
+    def pips_to_price(self, pips):
+        return _scalar(np.asarray(pips, dtype=float) * self.pip)
+
+    def price_to_pips(self, distance):
+        return _scalar(np.asarray(distance, dtype=float) / self.pip)
+
+    def round_price(self, price):
+        """Round to the nearest valid tick."""
+        ticks = np.round(np.asarray(price, dtype=float) / self.tick_size)
+        return _scalar(np.round(ticks * self.tick_size, self.digits))
+
+    def _floor_price(self, price):
+        return np.round(np.floor(price / self.tick_size + 1e-9) * self.tick_size, self.digits)
+
+    def _ceil_price(self, price):
+        return np.round(np.ceil(price / self.tick_size - 1e-9) * self.tick_size, self.digits)
+
+    @property
+    def min_stop_distance(self):
+        return self.stops_level * self.point
+
+    def valid_stops(self, trade_type, bid, ask, stop_loss=None, take_profit=None):
+        """
+        Round SL/TP to the tick size and move them out to at least the broker's stops
+        level from the price they are checked against (bid for buys, ask for sells).
+        Zero or None means no level and is left as 0.0.
+        """
+        distance = self.min_stop_distance
+        sl = np.asarray(stop_loss if stop_loss is not None else 0.0, dtype=float)
+        tp = np.asarray(take_profit if take_profit is not None else 0.0, dtype=float)
+        if trade_type == 0:  # Buy: SL below bid, TP above
+            new_sl = np.minimum(self.round_price(sl), self._floor_price(bid - distance))
+            new_tp = np.maximum(self.round_price(tp), self._ceil_price(bid + distance))
+        else:  # Sell: SL above ask, TP below
+            new_sl = np.maximum(self.round_price(sl), self._ceil_price(ask + distance))
+            new_tp = np.minimum(self.round_price(tp), self._floor_price(ask - distance))
+        return _scalar(np.where(sl > 0, new_sl, 0.0)), _scalar(np.where(tp > 0, new_tp, 0.0))
+
+    def round_volume(self, volume):
+        steps = np.floor(np.asarray(volume, dtype=float) / self.volume_step + 1e-9)
+        volume = np.clip(steps * self.volume_step, self.volume_min, self.volume_max)
+        return _scalar(np.round(volume, 8))
+
+
+class SymbolSpecCache:
+    """
+    Symbol specifications loaded once per connection and shared by every bot.
+    Call load() after connecting; refresh() is registered as a reconnect listener
+    so broker-side changes (e.g. a wider stops level) are picked up.
+    """
+
+    def __init__(self, mt5_connector, symbols=(), logger=None):
+        self.mt5_connector = mt5_connector
+        self.symbols = list(symbols)
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.specs = {}
+        self._lock = threading.Lock()
+
+    def load(self, symbols=None):
+        """Fetch symbol_info for `symbols` (default: the configured ones). Returns how many were loaded."""
+        loaded = {}
+        for symbol in (self.symbols if symbols is None else symbols):
+            info = self.mt5_connector.call('symbol_info', symbol)
+            if info is None and self.mt5_connector.call('symbol_select', symbol, True):
+                # Symbols outside Market Watch have to be selected first
+                info = self.mt5_connector.call('symbol_info', symbol)
+            if info is None:
+                self.logger.error(f"Failed to load symbol specification for {symbol}.")
+                continue
+            loaded[symbol] = SymbolSpec(info)
+        with self._lock:
+            self.specs.update(loaded)
+        self.logger.info(f"Loaded symbol specifications for {len(loaded)} symbol(s).")
+        return len(loaded)
+
+    def refresh(self):
+        self.load(sorted(set(self.symbols) | set(self.specs)))
+
+    def state(self):
+        with self._lock:
+            return {symbol: spec.as_dict() for symbol, spec in self.specs.items()}
+
+    def restore(self, state):
+        """Take specs saved with state(); they stand in until the next load() or refresh()."""
+        with self._lock:
+            self.specs.update({symbol: SymbolSpec.from_dict(data) for symbol, data in state.items()})
+        self.logger.info(f"Restored symbol specifications for {len(state)} symbol(s).")
+
+    def get(self, symbol):
+        """The cached spec, loading it on first use; None if the terminal does not know the symbol."""
+        spec = self.specs.get(symbol)
+        if spec is None:
+            self.load([symbol])
+            spec = self.specs.get(symbol)
+        return spec
+
+    def pip_sizes(self, symbols):
+        return np.array([self.get(symbol).pip for symbol in symbols])
+
+    def pips_to_price(self, symbols, pips):
+        """Convert pips per symbol to price distances in one step."""
+        return self.pip_sizes(symbols) * np.asarray(pips, dtype=float)
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Run against the simulated broker; the MetaTrader5 package only exists on Windows
+os.environ.setdefault('TRACY_MT5', 'sim')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def engine_config(tmp_path):
+    """Config of a small engine on the simulated broker, with its files under tmp_path."""
+    import sim_mt5
+
+    def make(symbols=('EURUSD', 'GBPUSD'), **engine):
+        return {
+            'trading_config': {'symbols': list(symbols), 'timeframe': sim_mt5.TIMEFRAME_M15, 'lot': 0.01, 'deviation': 10, 'pip_range': 10},
+            'date_range': {'from_data': 1, 'to_data': 16},
+            'strategy_params': {'magic_numbers': {'magic1': 360, 'magic2': 361, 'magic3': 362}, 'tp_pips': 50,
+                                'atr_sl_multiplier': 1.5, 'atr_period': 14, 'max_dist_atr_multiplier': 2, 'trail_atr_multiplier': 1},
+            'details': {'webhook_url': 'http://127.0.0.1:9/'},
+            'engine': {'snapshot_name': None, 'status_port': None, 'data_dir': str(tmp_path), **engine},
+        }
+
+    return make
@@ -0,0 +1,100 @@
+import logging
+import os
+import time
+
+import pytest
+
+import core
+import sim_mt5
+from accounts import IPC_NO_CONNECTION, AccountManager, TerminalWorker
+from sessions import SessionCalendar
+from timers import TimerService
+
+
+INSPIRER_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'inspirer1.json')
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def accounts_config(engine_config, tmp_path):
+    config = engine_config(symbols=('EURUSD', 'GBPUSD'), data_dir=str(tmp_path), warm_start_file=None)
+    config['accounts'] = [
+        {'name': 'a', 'details': {'account': 1, 'password': 'x', 'server': 'Sim-Server', 'webhook_url': 'http://127.0.0.1:9/a'}},
+        {'name': 'b', 'details': {'account': 2, 'password': 'x', 'server': 'Sim-Server', 'webhook_url': 'http://127.0.0.1:9/b'},
+         'trading_config': {'symbols': ['GBPUSD', 'USDJPY']}},
+    ]
+    return config
+
+
+def test_two_accounts_on_one_server_share_its_market_data(accounts_config, tmp_path, caplog):
+    logger = logging.getLogger('test_accounts')
+    timer_service = TimerService(logger=logger)
+    brokers = {}
+
+    def terminal_factory(name, details):
+        brokers[name] = sim_mt5.SimBroker(seed=1)
+        return brokers[name]
+
+    manager = AccountManager(accounts_config, core.MarketStatus(SessionCalendar()), core.ThreadManager(logger), timer_service,
+                             logger, inspirer_file=INSPIRER_FILE, terminal_factory=terminal_factory)
+    a, b = manager.engines
+    timer_service.start()
+    try:
+        with caplog.at_level(logging.INFO, logger='bars'):
+            # One after the other, so account a is the one that pulls the shared symbol's history
+            for engine in (a, b):
+                assert engine.connect_to_market()
+            wait_for(lambda: all(len(engine.bots) == 2 and all(bot.status is not None for bot in engine.bots)
+                                 for engine in (a, b)))
+        status = manager.status()
+    finally:
+        manager.stop()
+        timer_service.stop()
+
+    assert list(manager.servers) == ['Sim-Server']
+    assert manager.workers == []
+    assert [account.connector.mt5 for account in manager.accounts] == [brokers['a'], brokers['b']]
+
+    # Each account keeps its own files
+    assert os.path.dirname(a.trades_db) == str(tmp_path / 'a')
+    assert os.path.dirname(b.trades_db) == str(tmp_path / 'b')
+    assert os.path.exists(a.trades_db) and os.path.exists(b.trades_db)
+
+    # A symbol traded by both accounts is published by the first one only
+    owners = manager.servers['Sim-Server'].feed_owners
+    assert owners == {'EURUSD': a, 'GBPUSD': a, 'USDJPY': b}
+
+    # Account b started GBPUSD from the bars account a seeded instead of pulling the history again
+    seeded = [record.getMessage() for record in caplog.records if record.name == 'bars']
+    assert sum(message.startswith('Seeded bars for GBPUSD') for message in seeded) == 1
+    assert sum(message.startswith('Warm started bars for GBPUSD') for message in seeded) == 1
+
+    assert {name: (entry['account'], len(entry['bots'])) for name, entry in status.items()} == {'a': (1, 2), 'b': (2, 2)}
+
+
+def test_terminal_worker_reports_a_dead_process_and_restarts_on_initialize():
+    worker = TerminalWorker('a', sim={'seed': 1}, timeout=30)
+    worker.start()
+    try:
+        assert worker.initialize()
+        assert worker.symbol_info_tick('EURUSD') is not None
+        first = worker.process.pid
+
+        worker.process.kill()
+        worker.process.join(5)
+        assert worker.symbol_info_tick('EURUSD') is None
+        assert worker.last_error()[0] == IPC_NO_CONNECTION
+
+        # The connector's reconnect calls initialize(), which brings up a new worker
+        assert worker.initialize()
+        assert worker.process.pid != first
+        assert worker.symbol_info_tick('EURUSD') is not None
+    finally:
+        worker.stop()
+    assert worker.process is None
@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+
+from bars import BAR_FIELDS, BarAggregator, BarSeries, RangeIndex, ticks_after
+from mt5api import mt5
+
+
+TICK_DTYPE = [('time_msc', np.int64), ('bid', float)]
+RATE_DTYPE = [('time', np.int64), ('open', float), ('high', float), ('low', float), ('close', float),
+              ('tick_volume', np.int64)]
+
+
+def ticks(*times):
+    return np.array([(t, 1.1 + i * 1e-5) for i, t in enumerate(times)], dtype=TICK_DTYPE)
+
+
+def test_none_cursor_takes_every_tick():
+    new, cursor = ticks_after(ticks(1000, 1000, 2000), None)
+    assert len(new) == 3
+    assert cursor == (2000, 1)
+
+
+def test_refetched_ticks_are_skipped_and_new_ones_at_the_same_millisecond_are_not():
+    batch = ticks(1000, 2000, 2000)
+    new, cursor = ticks_after(batch, None)
+    assert cursor == (2000, 2)
+
+    new, same = ticks_after(batch, cursor)
+    assert len(new) == 0
+    assert same == cursor
+
+    # The terminal fetch from 2000 returns the two seen ticks plus a third stamped in the same millisecond
+    new, cursor = ticks_after(ticks(2000, 2000, 2000, 3000), cursor)
+    assert new['time_msc'].tolist() == [2000, 3000]
+    assert cursor == (3000, 1)
+
+
+def test_seen_count_accumulates_while_the_millisecond_stays_the_same():
+    _, cursor = ticks_after(ticks(1000, 1000), None)
+    new, cursor = ticks_after(ticks(1000, 1000, 1000), cursor)
+    assert len(new) == 1
+    assert cursor == (1000, 3)
+
+
+def test_empty_or_old_ticks_leave_the_cursor_alone():
+    cursor = (5000, 1)
+    assert ticks_after(ticks(), cursor)[1] == cursor
+    new, same = ticks_after(ticks(1000, 4000, 5000), cursor)
+    assert len(new) == 0
+    assert same == cursor
+
+
+def m1_rates(start, count, seed=3):
+    rng = np.random.default_rng(seed)
+    opens = 1.1 + np.cumsum(rng.normal(0, 1e-4, count))
+    closes = opens + rng.normal(0, 1e-4, count)
+    highs = np.maximum(opens, closes) + rng.uniform(0, 1e-4, count)
+    lows = np.minimum(opens, closes) - rng.uniform(0, 1e-4, count)
+    volumes = rng.integers(1, 50, count)
+    times = start + 60 * np.arange(count)
+    return np.array(list(zip(times, opens, highs, lows, closes, volumes)), dtype=RATE_DTYPE)
+
+
+def aggregator():
+    return BarAggregator('EURUSD', (mt5.TIMEFRAME_M5, mt5.TIMEFRAME_M15, mt5.TIMEFRAME_H1), capacity=500)
+
+
+def assert_same_bars(a, b):
+    for timeframe, series in a.series.items():
+        other = b.series[timeframe]
+        assert series.count == other.count, timeframe
+        for field in BAR_FIELDS:
+            assert np.allclose(series.values(field, series.count), other.values(field, other.count)), (timeframe, field)
+        assert series.forming == pytest.approx(other.forming) if series.forming else other.forming is None
+
+
+@pytest.mark.parametrize('count', [1, 7, 60, 187])
+def test_seed_matches_closing_the_bars_one_by_one(count):
+    # Start mid-hour and mid-M5 so the first and last higher bars are partial
+    rates = m1_rates(1_700_000_000 // 3600 * 3600 + 37 * 60, count)
+    bulk = aggregator()
+    bulk.seed(rates)
+
+    one_by_one = aggregator()
+    for rate in rates:
+        one_by_one._close(one_by_one.base, [int(rate['time'])] + [float(rate[f]) for f in ('open', 'high', 'low', 'close')]
+                          + [int(rate['tick_volume'])])
+
+    assert_same_bars(bulk, one_by_one)
+
+
+def test_seed_in_chunks_continues_the_forming_bars():
+    rates = m1_rates(1_700_000_000 // 3600 * 3600 + 11 * 60, 150)
+    whole = aggregator()
+    whole.seed(rates)
+
+    chunked = aggregator()
+    for chunk in (rates[:23], rates[23:24], rates[24:101], rates[101:]):
+        chunked.seed(chunk)
+
+    assert_same_bars(whole, chunked)
+
+
+class StandInClock:
+    def __init__(self, now):
+        self.now = now
+
+    def server_now(self):
+        return self.now
+
+
+def test_late_tick_after_advance_does_not_close_the_minute_again():
+    clock = StandInClock(7150.0)
+    bars = BarAggregator('EURUSD', (mt5.TIMEFRAME_M15,), clock=clock)
+    events = []
+    bars.listeners.append(lambda symbol, timeframe, bar: events.append((timeframe, bar['time'])))
+    bars.on_ticks(np.array([(7140000, 1.0)], dtype=TICK_DTYPE))
+
+    # The bar-close timer closes the minute on time; its last tick arrives just after
+    clock.now = 7200.5
+    bars.advance(clock.now)
+    bars.on_ticks(np.array([(7199900, 1.1)], dtype=TICK_DTYPE))
+
+    m1, m15 = bars.series[mt5.TIMEFRAME_M1], bars.series[mt5.TIMEFRAME_M15]
+    assert m1.values('time', 10).tolist() == [7140]
+    assert m1.values('close', 10).tolist() == [1.0]
+    assert m15.values('time', 10).tolist() == [6300]
+    assert m1.forming is None and m15.forming is None
+    assert events == [(mt5.TIMEFRAME_M1, 7140), (mt5.TIMEFRAME_M15, 6300)]
+
+    # The next minute still opens normally
+    bars.on_ticks(np.array([(7201000, 1.2)], dtype=TICK_DTYPE))
+    assert m1.forming[0] == 7200
+
+
+def brute_extrema(series, first, end):
+    slots = np.arange(first, end) % series.capacity
+    return {'bars': end - first, 'high': series.high[slots].max(), 'low': series.low[slots].min(),
+            'close_high': series.close[slots].max(), 'close_low': series.close[slots].min()}
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_range_index_matches_a_brute_force_scan(seed):
+    rng = np.random.default_rng(seed)
+    capacity = int(rng.integers(8, 80))
+    series = BarSeries(mt5.TIMEFRAME_M1, capacity)
+    # A short max_span leaves some ranges to the direct reduction
+    index = RangeIndex(series, max_span=int(rng.integers(1, capacity + 1)))
+    for _ in range(int(rng.integers(1, 6))):
+        # Batches of new bars, some larger than the ring, queried in between so the tables extend lazily
+        n = int(rng.integers(1, 2 * capacity))
+        closes = rng.normal(1.1, 0.01, n)
+        series.extend(60 * np.arange(series.total, series.total + n), closes, closes + rng.uniform(0, 0.01, n),
+                      closes - rng.uniform(0, 0.01, n), closes, np.ones(n, dtype=np.int64))
+        oldest = series.total - series.count
+        firsts = rng.integers(oldest - 3, series.total + 2, 40)
+        ends = firsts + rng.integers(-1, capacity + 3, 40)
+        many = index.extrema_many(firsts, ends)
+        for i, (first, end) in enumerate(zip(firsts.tolist(), ends.tolist())):
+            held = first < end and first >= oldest and end <= series.total
+            result = index.extrema(first, end)
+            if not held:
+                assert result is None
+                assert np.isnan(many['high'][i]) and many['bars'][i] == 0
+                continue
+            expected = brute_extrema(series, first, end)
+            assert result == pytest.approx(expected)
+            if (end - first).bit_length() - 1 < index.levels:
+                assert {name: many[name][i] for name in expected} == pytest.approx(expected)
+            else:
+                # Longer than the tables cover: extrema_many leaves it to extrema()
+                assert np.isnan(many['high'][i]) and many['bars'][i] == 0
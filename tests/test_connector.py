@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+import sim_mt5
+from mt5utilities import MT5Connector
+
+
+@pytest.fixture
+def broker():
+    return sim_mt5.SimBroker(seed=1)
+
+
+@pytest.fixture
+def connector(broker):
+    connector = MT5Connector(1, 'x', 'Sim-Server', terminal=broker, backoff_base=0.01, backoff_max=0.05)
+    assert connector.connect()
+    yield connector
+    connector.disconnect()
+
+
+def test_probe_detects_a_dropped_terminal(connector, broker):
+    assert connector.probe()
+    broker.disconnect()
+    assert not connector.probe()
+    assert not connector.is_connected
+    assert connector.lost_at is not None
+
+
+def test_idempotent_read_is_replayed_after_reconnecting(connector, broker):
+    broker.disconnect()
+    assert connector.call('symbol_info_tick', 'EURUSD') is not None
+    assert connector.is_connected
+    assert connector.lost_at is None
+    assert connector.reconnect_stats()['count'] == 1
+
+
+def test_order_send_is_not_replayed(connector, broker):
+    request = {'action': sim_mt5.TRADE_ACTION_DEAL, 'symbol': 'EURUSD', 'volume': 0.01, 'type': 0, 'deviation': 100}
+    broker.disconnect()
+    assert connector.call('order_send', request, idempotent=False) is None
+    # Reconnected, but the order was not sent a second time behind the caller's back
+    assert connector.is_connected
+    assert broker.positions_total() == 0
+
+
+def test_reconnect_backs_off_through_failed_initializations(connector, broker):
+    broker.disconnect()
+    broker.fail_next_initializations(3)
+    assert not connector.probe()
+    started = time.time()
+    assert connector.reconnect(max_retries=5)
+    # Waits of 0.01, 0.02 and 0.04 s before the fourth attempt succeeds
+    assert time.time() - started >= 0.07
+    assert broker.failed_initializations == 0
+
+
+def test_call_makes_one_quick_attempt_and_leaves_the_rest_to_reconnect(connector, broker):
+    broker.disconnect()
+    broker.fail_next_initializations(5)
+    started = time.time()
+    assert connector.call('symbol_info_tick', 'EURUSD') is None
+    assert time.time() - started < 0.5
+    assert broker.failed_initializations == 4
+    assert not connector.is_connected
+
+
+def test_time_to_reconnect_counts_from_the_detected_loss(connector, broker):
+    broker.disconnect()
+    assert not connector.probe()
+    time.sleep(0.2)
+    assert connector.reconnect()
+    assert connector.reconnect_times[-1] >= 0.2
@@ -0,0 +1,40 @@
+from collections import namedtuple
+
+import pytest
+
+from portfolio import Portfolio
+
+
+Position = namedtuple('Position', 'ticket type magic symbol volume price_open sl tp')
+Tick = namedtuple('Tick', 'bid ask')
+
+
+class StandInSpec:
+    contract_size = 100000
+    currency_base = 'EUR'
+    currency_profit = 'USD'
+    tick_value = 1.0
+    tick_size = 0.00001
+
+
+class StandInSpecs:
+    def get(self, symbol):
+        return StandInSpec()
+
+
+def test_load_keeps_the_position_arrays_while_the_tickets_stay_the_same():
+    portfolio = Portfolio(StandInSpecs())
+    portfolio.load([Position(1, 0, 360, 'EURUSD', 0.1, 1.1000, 1.0950, 0.0)])
+    symbol = portfolio.symbol
+    assert portfolio.mark({'EURUSD': Tick(1.1000, 1.1001)})['risk_to_sl'] == pytest.approx(50.0)
+
+    # The stop moved and half the position was closed: same ticket, fields updated in place
+    portfolio.load([Position(1, 0, 360, 'EURUSD', 0.05, 1.1000, 1.0980, 0.0)])
+    assert portfolio.symbol is symbol
+    assert portfolio.mark()['risk_to_sl'] == pytest.approx(10.0)
+
+    portfolio.load([Position(1, 0, 360, 'EURUSD', 0.05, 1.1000, 1.0980, 0.0),
+                    Position(2, 1, 361, 'EURUSD', 0.1, 1.1000, 0.0, 0.0)])
+    assert portfolio.symbol is not symbol
+    assert portfolio.mark()['unprotected'] == 1
+    assert portfolio.magic.tolist() == [360, 361]
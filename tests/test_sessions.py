@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+
+from sessions import SessionCalendar
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_london_opens_an_hour_earlier_in_utc_during_british_summer_time():
+    calendar = SessionCalendar()
+    assert calendar.next_session_open('london', utc(2024, 1, 15, 5)) == utc(2024, 1, 15, 8)
+    assert calendar.next_session_open('london', utc(2024, 7, 15, 5)) == utc(2024, 7, 15, 7)
+    assert calendar.session_window('london', utc(2024, 7, 15, 12)) == (utc(2024, 7, 15, 7), utc(2024, 7, 15, 15, 30))
+    assert not calendar.in_session('london', utc(2024, 1, 15, 7, 30))
+    assert calendar.in_session('london', utc(2024, 7, 15, 7, 30))
+
+
+def test_weekend_opens_sunday_and_closes_friday_at_five_new_york_time():
+    calendar = SessionCalendar()
+    saturday = utc(2024, 1, 13, 12)
+    assert not calendar.is_open(saturday)
+    assert calendar.next_open(saturday) == utc(2024, 1, 14, 22)
+    assert calendar.next_close(saturday) == utc(2024, 1, 19, 22)
+    assert calendar.next_open(utc(2024, 7, 13, 12)) == utc(2024, 7, 14, 21)
+
+
+def test_week_of_the_us_clock_change_closes_in_winter_time_and_opens_in_summer_time():
+    calendar = SessionCalendar()
+    assert calendar.next_close(utc(2024, 3, 8, 12)) == utc(2024, 3, 8, 22)
+    assert calendar.next_open(utc(2024, 3, 9, 12)) == utc(2024, 3, 10, 21)
+
+
+def test_configured_holiday_closes_the_whole_day_in_new_york():
+    calendar = SessionCalendar(holidays=['2024-12-25'])
+    assert calendar.is_open(utc(2024, 12, 24, 12))
+    assert not calendar.is_open(utc(2024, 12, 25, 12))
+    assert calendar.next_close(utc(2024, 12, 24, 12)) == utc(2024, 12, 25, 5)
+    assert calendar.next_open(utc(2024, 12, 24, 12)) == utc(2024, 12, 26, 5)
+    assert SessionCalendar().is_open(utc(2024, 12, 25, 12))
+
+
+def test_seconds_until_transition_at_a_boundary_points_at_the_next_one():
+    calendar = SessionCalendar()
+    sunday_open = utc(2024, 1, 14, 22)
+    assert calendar.is_open(sunday_open)
+    assert calendar.seconds_until_transition(sunday_open) == 5 * 86400
+    assert calendar.seconds_until_transition(sunday_open.timestamp() - 1) == 1.0
+
+    friday_close = utc(2024, 1, 19, 22)
+    assert not calendar.is_open(friday_close)
+    assert calendar.next_transition(friday_close) == utc(2024, 1, 21, 22)
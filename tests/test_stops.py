@@ -0,0 +1,80 @@
+from collections import namedtuple
+
+import pytest
+
+from stops import NO_CHANGES, StopManager
+from symbols import SymbolSpecCache
+
+
+Position = namedtuple('Position', 'ticket type magic symbol price_current sl tp')
+SymbolInfo = namedtuple('SymbolInfo', 'name digits point trade_tick_size trade_tick_value trade_contract_size '
+                                      'trade_stops_level trade_freeze_level volume_min volume_max volume_step '
+                                      'currency_base currency_profit')
+Result = namedtuple('Result', 'retcode comment')
+
+
+class StandInConnector:
+    """Serves positions and symbol info from memory and records the SL/TP requests sent."""
+
+    def __init__(self, stops_level=0, retcode=10009):
+        self.mt5 = self
+        self.positions = []
+        self.requests = []
+        self.retcode = retcode
+        self.info = SymbolInfo('EURUSD', 5, 0.00001, 0.00001, 1.0, 100000, stops_level, 0, 0.01, 100.0, 0.01, 'EUR', 'USD')
+
+    def call(self, function_name, *args, **kwargs):
+        if function_name == 'positions_get':
+            return tuple(self.positions)
+        return self.info if function_name == 'symbol_info' else None
+
+    def order_send(self, request):
+        self.requests.append(request)
+        return Result(self.retcode, '')
+
+    def last_error(self):
+        return (0, '')
+
+
+def manager_for(connector, **kwargs):
+    manager = StopManager(connector, SymbolSpecCache(connector, ['EURUSD']), **kwargs)
+    manager.set_trail('EURUSD', 360, 0.0020, 0.0010)
+    return manager
+
+
+def test_rate_limit_sends_the_biggest_moves_first():
+    connector = StandInConnector()
+    # Stops 20, 30, 40 and 50 pips behind a buy at 1.10000
+    connector.positions = [Position(ticket, 0, 360, 'EURUSD', 1.10000, 1.10000 - pips * 0.0001, 0.0)
+                           for ticket, pips in ((1, 20), (2, 30), (3, 50), (4, 40))]
+    manager = manager_for(connector, rate_limit=0.0, burst=2)
+
+    assert manager.run() == 2
+    assert [request['position'] for request in connector.requests] == [3, 4]
+    assert all(request['sl'] == pytest.approx(1.09900) for request in connector.requests)
+    assert manager.counters['rate_limited'] == 2
+    assert manager.counters['sent'] == 2
+
+
+def test_target_clamped_back_to_the_current_stop_is_not_sent():
+    # A 30 pip stops level keeps the stop where it is even though the rule wants it 10 pips behind
+    connector = StandInConnector(stops_level=300)
+    connector.positions = [Position(1, 0, 360, 'EURUSD', 1.10000, 1.09700, 0.0)]
+    manager = manager_for(connector)
+
+    assert manager.run() == 0
+    assert connector.requests == []
+    assert manager.counters['min_step'] == 0
+
+
+def test_no_changes_reply_is_not_a_failure_and_returns_its_token():
+    connector = StandInConnector(retcode=NO_CHANGES)
+    connector.positions = [Position(1, 1, 360, 'EURUSD', 1.10000, 1.10300, 0.0)]
+    manager = manager_for(connector, rate_limit=0.0, burst=1)
+
+    manager.run()
+    manager.run()
+    assert len(connector.requests) == 2
+    assert manager.counters['no_change'] == 2
+    assert manager.counters['failed'] == 0
+    assert manager.counters['rate_limited'] == 0
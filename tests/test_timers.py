@@ -0,0 +1,81 @@
+import threading
+import time
+
+from timers import TimerService
+
+
+def test_blocking_job_does_not_delay_a_wake_up():
+    timer_service = TimerService(workers=1)
+    timer_service.start()
+    try:
+        release = threading.Event()
+        timer_service.call_later(0, release.wait, 5, name="slow sync", blocking=True)
+        woken = threading.Event()
+        started = time.time()
+        timer_service.call_later(0.05, woken.set, name="cycle")
+        assert woken.wait(2)
+        assert time.time() - started < 1
+        release.set()
+    finally:
+        timer_service.stop()
+
+
+def test_blocking_jobs_run_on_their_own_pool():
+    timer_service = TimerService(workers=1, blocking_workers=1)
+    timer_service.start()
+    try:
+        names = {}
+        done = threading.Event()
+
+        def record(key):
+            names[key] = threading.current_thread().name
+            if len(names) == 2:
+                done.set()
+
+        timer_service.call_later(0, record, 'blocking', blocking=True)
+        timer_service.call_later(0, record, 'shared')
+        assert done.wait(2)
+        assert names['blocking'].startswith("TimerBlockingWorker")
+        assert names['shared'].startswith("TimerWorker")
+    finally:
+        timer_service.stop()
+
+
+def test_long_blocking_jobs_do_not_delay_short_recurring_ones():
+    timer_service = TimerService(workers=1, blocking_workers=1)
+    timer_service.start()
+    try:
+        release = threading.Event()
+        # More long jobs than blocking workers, as in a broker outage on several accounts
+        for i in range(3):
+            timer_service.call_later(0, release.wait, 5, name=f"reconnect {i}", blocking=True)
+        runs = []
+        job = timer_service.call_every(0.05, lambda: runs.append(time.time()), name="bar close", first=time.time())
+        time.sleep(0.5)
+        assert len(runs) >= 5
+        assert job.max_lateness < 0.2
+        release.set()
+    finally:
+        timer_service.stop()
+
+
+def test_engine_runs_terminal_and_rebuild_jobs_on_the_blocking_pool(engine_config):
+    import logging
+
+    import core
+    import mt5utilities as util
+    from sessions import SessionCalendar
+
+    logger = logging.getLogger('test_timers')
+    timer_service = TimerService(logger=logger)
+    engine = core.TradeEngine(util.MT5Connector(1, 'x', 'Sim-Server'), core.MarketStatus(SessionCalendar()), engine_config(),
+                              None, None, logger, core.ThreadManager(logger), timer_service=timer_service)
+    engine.start()
+    try:
+        blocking = {job['name'] for job in timer_service.stats() if job['blocking']}
+    finally:
+        engine.stop_bots()
+        timer_service.stop()
+    assert {"market status", "bot watchdog", "connection health", "deal history sync", "stop management",
+            "portfolio mark"} <= blocking
+    assert "position reconciliation" not in blocking
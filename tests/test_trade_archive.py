@@ -0,0 +1,78 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import trade_archive
+from bot import CLOSED_TRADE_SCHEMA
+from trade_archive import TradeArchive
+
+
+NOW = datetime(2024, 6, 1)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    db_name = str(tmp_path / 'trades.db')
+    with sqlite3.connect(db_name) as conn:
+        conn.execute(f'CREATE TABLE closed_trade ({CLOSED_TRADE_SCHEMA})')
+        # Two old months and one recent trade
+        for ticket, close_time in ((1, '2024-01-10 10:00:00'), (2, '2024-01-20 10:00:00'),
+                                   (3, '2024-02-05 10:00:00'), (4, '2024-05-30 10:00:00')):
+            conn.execute('INSERT INTO closed_trade VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         (ticket, 'EURUSD', '0', 1.1, close_time, 1.1, close_time, ticket * 1.0, 360, 0.1, 0.0, 0.0, 10, 1))
+    return TradeArchive(db_name, str(tmp_path / 'archive'))
+
+
+def live_tickets(archive):
+    with sqlite3.connect(archive.db_name) as conn:
+        return [row[0] for row in conn.execute('SELECT ticket_id FROM closed_trade ORDER BY ticket_id')]
+
+
+def leftovers(archive):
+    return sorted(os.listdir(archive.directory)) if os.path.isdir(archive.directory) else []
+
+
+def test_archive_moves_old_trades_and_read_returns_each_once(archive):
+    assert archive.archive(days=90, now=NOW) == 3
+    assert live_tickets(archive) == [4]
+    assert leftovers(archive) == ['closed_trade_2024-01.npz', 'closed_trade_2024-02.npz']
+    assert archive.columns(columns=['ticket_id'])['ticket_id'].tolist() == [1, 2, 3, 4]
+
+
+def test_failed_partition_write_keeps_every_trade_live(archive, monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(trade_archive.np, 'savez_compressed', fail)
+    assert archive.archive(days=90, now=NOW) == 0
+    assert live_tickets(archive) == [1, 2, 3, 4]
+    assert leftovers(archive) == []
+
+
+def test_failure_between_partition_swaps_rolls_back_the_delete(archive, monkeypatch):
+    replace = os.replace
+    calls = []
+
+    def fail_second(source, target):
+        calls.append(target)
+        if len(calls) == 2:
+            raise OSError("interrupted")
+        replace(source, target)
+
+    monkeypatch.setattr(trade_archive.os, 'replace', fail_second)
+    assert archive.archive(days=90, now=NOW) == 0
+    assert live_tickets(archive) == [1, 2, 3, 4]
+    # The first month was swapped in before the failure and the second's staging file was removed
+    assert leftovers(archive) == ['closed_trade_2024-01.npz']
+    tickets = archive.columns(columns=['ticket_id'])['ticket_id']
+    assert tickets.tolist() == [1, 2, 3, 4]
+
+    # The next run archives again without duplicating the trades already in the partition
+    monkeypatch.setattr(trade_archive.os, 'replace', replace)
+    assert archive.archive(days=90, now=NOW) == 3
+    with np.load(archive.path(2024, 1)) as partition:
+        assert partition['ticket_id'].tolist() == [1, 2]
+    assert archive.columns(columns=['ticket_id'])['ticket_id'].tolist() == [1, 2, 3, 4]
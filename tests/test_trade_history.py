@@ -0,0 +1,71 @@
+from collections import namedtuple
+
+import pytest
+
+from mt5api import mt5
+from trade_history import DEAL_COLUMNS, TradeHistory
+
+
+Deal = namedtuple('Deal', DEAL_COLUMNS)
+
+
+def deal(ticket, time_msc, entry, magic, position_id=1, profit=0.0, symbol='EURUSD', type=mt5.DEAL_TYPE_BUY):
+    return Deal(ticket=ticket, order=ticket, time=time_msc // 1000, time_msc=time_msc, type=type, entry=entry, magic=magic,
+                position_id=position_id, reason=0, volume=0.1, price=1.1, commission=0.0, swap=0.0, profit=profit,
+                fee=0.0, symbol=symbol, comment='')
+
+
+class StandInConnector:
+    """Serves history_deals_get from a list, honouring date_from like the terminal."""
+
+    mt5 = mt5
+
+    def __init__(self):
+        self.deals = []
+        self.requests = []
+
+    def call(self, function_name, date_from, date_to):
+        self.requests.append(date_from)
+        return tuple(d for d in self.deals if d.time >= date_from.timestamp())
+
+
+@pytest.fixture
+def history(tmp_path):
+    connector = StandInConnector()
+    return connector, TradeHistory(connector, db_name=str(tmp_path / 'trades.db'))
+
+
+def test_close_without_magic_in_the_same_batch_counts_under_the_opening_magic(history):
+    connector, trades = history
+    connector.deals = [deal(1, 1_000_000, mt5.DEAL_ENTRY_IN, 360),
+                       deal(2, 1_005_000, mt5.DEAL_ENTRY_OUT, 0, profit=-10.0, type=mt5.DEAL_TYPE_SELL)]
+    assert trades.sync() == 2
+    assert trades.stats(magic=360)['trades'] == 1
+    assert trades.stats(magic=360)['realized'] == -10.0
+    assert trades.stats(magic=0)['trades'] == 0
+
+
+def test_sync_only_takes_deals_after_the_cursor(history):
+    connector, trades = history
+    connector.deals = [deal(1, 1_000_000, mt5.DEAL_ENTRY_IN, 360), deal(2, 1_000_500, mt5.DEAL_ENTRY_IN, 361, position_id=2)]
+    assert trades.sync() == 2
+    assert trades.sync() == 0
+
+    # A later deal at the cursor's millisecond is new, the ones already seen there are not
+    connector.deals.append(deal(3, 1_000_500, mt5.DEAL_ENTRY_OUT, 361, position_id=2, profit=5.0, type=mt5.DEAL_TYPE_SELL))
+    assert trades.sync() == 1
+    assert trades.stats(magic=361)['wins'] == 1
+    assert connector.requests[-1].timestamp() == 1000
+
+
+def test_cursor_and_aggregates_survive_a_restart(history, tmp_path):
+    connector, trades = history
+    connector.deals = [deal(1, 1_000_000, mt5.DEAL_ENTRY_IN, 360),
+                       deal(2, 2_000_000, mt5.DEAL_ENTRY_OUT, 360, profit=7.5, type=mt5.DEAL_TYPE_SELL)]
+    trades.sync()
+
+    restarted = TradeHistory(connector, db_name=str(tmp_path / 'trades.db'))
+    assert restarted.cursor == (2_000_000, (2,))
+    assert restarted.sync() == 0
+    assert restarted.stats(symbol='EURUSD')['realized'] == 7.5
+    assert restarted.position_result(1)['profit_loss'] == 7.5
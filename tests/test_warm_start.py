@@ -0,0 +1,47 @@
+import logging
+import time
+
+import sim_mt5
+import core
+import mt5utilities as util
+from sessions import SessionCalendar
+from strategies import IndicatorCache
+from timers import TimerService
+from warm_start import WarmStart
+
+
+def wait_for(condition, timeout=30):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_shutdown_saves_bars_and_indicator_state(engine_config, tmp_path):
+    sim_mt5.reset(seed=1)
+    logger = logging.getLogger('test_warm_start')
+    timer_service = TimerService(logger=logger)
+    engine = core.TradeEngine(util.MT5Connector(1, 'x', 'Sim-Server'), core.MarketStatus(SessionCalendar()), engine_config(),
+                              None, None, logger, core.ThreadManager(logger), timer_service=timer_service)
+    timer_service.start()
+    try:
+        assert engine.connect_to_market()
+        wait_for(lambda: len(engine.bots) == 2 and all(bot.status is not None for bot in engine.bots))
+        bot = engine.bots[0]
+    finally:
+        engine.stop_bots()
+        engine.bar_scheduler.stop()
+        timer_service.stop()
+
+    saved = WarmStart(str(tmp_path / 'warm_start.npz'))
+    assert saved.load(engine.account_identity())
+    assert set(saved.bar_states) == {'EURUSD', 'GBPUSD'}
+    # Every bot read its ATR through the cache in its cycle, so the indicator state is not empty
+    assert {(entry[0], entry[2]) for entry in saved.indicators} == {('EURUSD', 'atr'), ('GBPUSD', 'atr')}
+
+    # Restored entries are served without recomputing while the bars they were computed on are unchanged
+    cache = IndicatorCache()
+    cache.restore(saved.indicators)
+    cache.add_source(bot.bar_aggregator)
+    assert cache.get(bot.symbol, bot.timeframe, 'atr', bot.atr_period) == bot.atr
+    assert cache.counters == {'hits': 1, 'computed': 0}
@@ -0,0 +1,249 @@
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+
+def daily_at(hhmm):
+    """Deadline function for a job that runs every day at hh:mm local time."""
+    hour, minute = (int(part) for part in hhmm.split(':'))
+
+    def next_deadline(after):
+        candidate = datetime.fromtimestamp(after).replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate.timestamp() <= after:
+            candidate += timedelta(days=1)
+        return candidate.timestamp(), ()
+
+    return next_deadline
+
+
+class TimerJob:
+    def __init__(self, job_id, name, callback, args, next_deadline, jitter, blocking=False):
+        self.job_id = job_id
+        self.name = name
+        self.callback = callback
+        self.args = args
+        self.next_deadline = next_deadline  # function(after) -> (deadline, extra args) or None when done
+        self.jitter = jitter
+        self.blocking = blocking  # Runs on the blocking lane so it cannot hold up short jobs
+        self.deadline = None
+        self.fire_args = ()
+        self.cancelled = False
+        self.running = False
+
+        # Observability
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_run = None
+        self.last_lateness = None
+        self.max_lateness = 0.0
+        self.last_duration = None
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'blocking': self.blocking,
+            'next_run': self.deadline,
+            'runs': self.runs,
+            'failures': self.failures,
+            'skipped': self.skipped,
+            'last_run': self.last_run,
+            'last_lateness': self.last_lateness,
+            'max_lateness': self.max_lateness,
+            'last_duration': self.last_duration,
+        }
+
+
+class TimerService:
+    """
+    One shared timer for every scheduled job in the engine.
+
+    Jobs live in a heap ordered by deadline; a single dispatcher thread waits
+    until the earliest deadline (or until a new, earlier job is added) and hands
+    due jobs to a small worker pool. Recurring jobs are described by a deadline
+    function, which covers fixed intervals, daily times and broker bar closes
+    alike. A recurring job never overlaps itself: if it is still running when
+    its next deadline arrives, that occurrence is skipped and counted.
+
+    Jobs scheduled with blocking=True (terminal round trips, reconnects, disk
+    writes, bot rebuilds) run on a separate pool, so a slow sync or a broker
+    outage never delays a bot's cycle wake-up or a bar close.
+    """
+
+    def __init__(self, workers=4, logger=None, blocking_workers=4):
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.workers = workers
+        self.blocking_workers = blocking_workers
+        self._heap = []
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._sequence = itertools.count()  # Heap tie-breaker
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._blocking_executor = None
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def call_at(self, when, callback, *args, name=None, blocking=False):
+        """Run callback(*args) once at epoch time `when`."""
+        fired = []
+
+        def next_deadline(after):
+            if fired:
+                return None
+            fired.append(True)
+            return when, ()
+
+        return self.schedule(next_deadline, callback, *args, name=name, blocking=blocking)
+
+    def call_later(self, delay, callback, *args, name=None, blocking=False):
+        """Run callback(*args) once after `delay` seconds."""
+        return self.call_at(time.time() + delay, callback, *args, name=name, blocking=blocking)
+
+    def call_every(self, interval, callback, *args, name=None, jitter=0.0, first=None, blocking=False):
+        """Run callback(*args) every `interval` seconds, first at `first` (default: one interval from now)."""
+        state = {'last': None}
+
+        def next_deadline(after):
+            if state['last'] is None:
+                state['last'] = first if first is not None else time.time() + interval
+            else:
+                state['last'] += interval
+                if state['last'] <= after:
+                    # Fell behind (e.g. system sleep): resume on the fixed-rate grid
+                    state['last'] += ((after - state['last']) // interval + 1) * interval
+            return state['last'], ()
+
+        return self.schedule(next_deadline, callback, *args, name=name, jitter=jitter, blocking=blocking)
+
+    def schedule(self, next_deadline, callback, *args, name=None, jitter=0.0, blocking=False):
+        """
+        Schedule a job from a deadline function.
+        next_deadline(after) returns (epoch deadline, extra callback args) for the first
+        occurrence after `after`, or None when the job has no further occurrences.
+        blocking=True runs the job on the blocking pool instead of the shared one.
+        """
+        with self._condition:
+            job = TimerJob(next(self._ids), name or getattr(callback, '__name__', str(callback)), callback, args, next_deadline, jitter,
+                           blocking)
+            self._jobs[job.job_id] = job
+            self._arm(job, time.time())
+            self._condition.notify()
+        return job
+
+    def cancel(self, job):
+        """Cancel a job; it is dropped lazily when it reaches the top of the heap."""
+        if job is None:
+            return
+        with self._condition:
+            job.cancelled = True
+            self._jobs.pop(job.job_id, None)
+            self._condition.notify()
+
+    def reschedule(self, job, after=None):
+        """Recompute a job's next deadline, e.g. after the clock it depends on moved."""
+        with self._condition:
+            now = time.time()
+            if job.cancelled or (job.deadline is not None and job.deadline <= now):
+                return  # Jobs that are already due keep their slot
+            # Push a fresh entry; the stale one is skipped because its deadline no longer matches
+            self._arm(job, now if after is None else after)
+            self._condition.notify()
+
+    def _arm(self, job, after):
+        result = job.next_deadline(after)
+        if result is None:
+            job.deadline = None
+            self._jobs.pop(job.job_id, None)
+            return
+        deadline, fire_args = result
+        if job.jitter:
+            deadline += random.uniform(0, job.jitter)
+        job.deadline = deadline
+        job.fire_args = fire_args
+        heapq.heappush(self._heap, (deadline, next(self._sequence), job))
+
+    # ------------------------------------------------------------------
+    # Dispatch
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="TimerWorker")
+            self._blocking_executor = ThreadPoolExecutor(max_workers=self.blocking_workers,
+                                                         thread_name_prefix="TimerBlockingWorker")
+            self._thread = threading.Thread(target=self.run, name="TimerService", daemon=True)
+            self._thread.start()
+            self.logger.info(f"TimerService started with {self.workers} workers "
+                             f"and {self.blocking_workers} blocking workers.")
+
+    def stop(self, wait=True):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+        if self._blocking_executor is not None:
+            self._blocking_executor.shutdown(wait=wait)
+        self.logger.info("TimerService stopped.")
+
+    def run(self):
+        while not self._stopped.is_set():
+            with self._condition:
+                due = self._pop_due()
+                if not due:
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._condition.wait(timeout)
+                    continue
+            for job, deadline, fire_args in due:
+                executor = self._blocking_executor if job.blocking else self._executor
+                executor.submit(self._run_job, job, deadline, fire_args)
+
+    def _pop_due(self):
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, job = heapq.heappop(self._heap)
+            if job.cancelled or deadline != job.deadline:
+                continue  # Cancelled or superseded by reschedule()
+            if job.running:
+                job.skipped += 1
+                self.logger.warning(f"Timer job '{job.name}' still running at its next deadline, skipping one run.")
+            else:
+                job.running = True
+                due.append((job, deadline, job.fire_args))
+            # Arm the next occurrence from the scheduled deadline so timing does not drift
+            self._arm(job, deadline)
+        return due
+
+    def _run_job(self, job, deadline, fire_args):
+        started = time.time()
+        job.last_lateness = started - deadline
+        job.max_lateness = max(job.max_lateness, job.last_lateness)
+        try:
+            job.callback(*job.args, *fire_args)
+        except Exception as e:
+            job.failures += 1
+            self.logger.error(f"Timer job '{job.name}' failed: {e}", exc_info=True)
+        finally:
+            job.running = False
+            job.runs += 1
+            job.last_run = started
+            job.last_duration = time.time() - started
+
+    def stats(self):
+        """Snapshot of every live job's timing statistics."""
+        with self._condition:
+            return [job.stats() for job in self._jobs.values()]
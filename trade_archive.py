@@ -0,0 +1,249 @@
+"""
+Archive of old closed trades in compressed, month-partitioned columnar files.
+
+archive() moves the closed trades older than N days out of the live database into
+one .npz file per close month (one compressed array per column), so the live
+tables stay small. read() returns any date range as columns, opening only the
+months it covers and decompressing only the columns asked for; the live trades
+of the range are included by default, so callers see one table.
+
+    python trade_archive.py archive --days 90
+    python trade_archive.py read --start 2023-01-01 --end 2024-01-01 --columns close_time profit_loss lot
+"""
+import argparse
+import logging
+import os
+import re
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+
+# closed_trade columns and their archived dtypes (times as naive UTC datetime64)
+COLUMNS = {
+    'ticket_id': np.int64,
+    'symbol': str,
+    'trade_type': str,
+    'open_price': np.float64,
+    'open_time': 'datetime64[us]',
+    'close_price': np.float64,
+    'close_time': 'datetime64[us]',
+    'profit_loss': np.float64,
+    'magic_number': np.int64,
+    'lot': np.float64,
+    'stop_loss': np.float64,
+    'take_profit': np.float64,
+    'deviation': np.float64,
+    'status': str,
+}
+
+PARTITION = re.compile(r'^closed_trade_(\d{4})-(\d{2})\.npz$')
+
+
+def to_columns(rows, columns):
+    """Rows of the closed_trade table as {column: array} with the archived dtypes."""
+    import pandas as pd
+    data = {}
+    for i, column in enumerate(columns):
+        values = [row[i] for row in rows]
+        dtype = COLUMNS[column]
+        if dtype is str:
+            data[column] = np.array(['' if value is None else str(value) for value in values], dtype=str)
+        elif str(dtype).startswith('datetime64'):
+            # Times are stored as text, some naive and some with an offset; keep them as naive UTC
+            parsed = pd.to_datetime(pd.Series(values, dtype=object).astype(str), format='ISO8601', utc=True, errors='coerce')
+            data[column] = parsed.dt.tz_localize(None).to_numpy(dtype=dtype)
+        else:
+            data[column] = np.array(values, dtype=dtype)
+    return data
+
+
+class TradeArchive:
+    """Moves old closed trades out of the live database and reads them back as columns."""
+
+    def __init__(self, db_name='trades.db', directory='archive', logger=None):
+        self.db_name = db_name
+        self.directory = directory
+        self.logger = logger if logger else logging.getLogger(__name__)
+
+    def _connect(self):
+        # Autocommit mode, so archive() controls the transaction itself
+        return sqlite3.connect(self.db_name, timeout=30, isolation_level=None)
+
+    def path(self, year, month):
+        return os.path.join(self.directory, f'closed_trade_{year:04d}-{month:02d}.npz')
+
+    def partitions(self, start=None, end=None):
+        """(year, month, path) of the partitions holding trades closed in [start, end), oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        first = (start.year, start.month) if start is not None else (0, 0)
+        last = (end.year, end.month) if end is not None else (9999, 12)
+        found = []
+        for name in os.listdir(self.directory):
+            match = PARTITION.match(name)
+            if match and first <= (int(match[1]), int(match[2])) <= last:
+                found.append((int(match[1]), int(match[2]), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    # ------------------------------------------------------------------
+    # Archiving
+    # ------------------------------------------------------------------
+
+    def archive(self, days=90, now=None):
+        """
+        Move the closed trades that closed more than `days` ago into their month's partition.
+        Returns the number of trades moved.
+
+        The live database is locked for writing from the select to the delete, and the
+        delete is committed only after every partition has been replaced, so a failure at
+        any point leaves each trade in the live table (and possibly already archived too,
+        which the next run and read() both de-duplicate by ticket).
+        """
+        now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+        cutoff = (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        columns = list(COLUMNS)
+        written, staged = [], []
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            rows = conn.execute(f'SELECT {", ".join(columns)} FROM closed_trade WHERE close_time < ?', (cutoff,)).fetchall()
+            if not rows:
+                conn.execute('ROLLBACK')
+                return 0
+            data = to_columns(rows, columns)
+            os.makedirs(self.directory, exist_ok=True)
+            months = data['close_time'].astype('datetime64[M]')
+            for month in np.unique(months):
+                year, month_number = int(str(month)[:4]), int(str(month)[5:7])
+                path = self.path(year, month_number)
+                selected = months == month
+                partition = self._merge(path, {column: values[selected] for column, values in data.items()})
+                staging = path + '.tmp'
+                staged.append((staging, path))
+                with open(staging, 'wb') as f:
+                    np.savez_compressed(f, **partition)
+            for staging, path in staged:
+                os.replace(staging, path)
+                written.append(path)
+            staged = []
+            conn.execute('DELETE FROM closed_trade WHERE close_time < ?', (cutoff,))
+            conn.execute('COMMIT')
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            for staging, _ in staged:
+                if os.path.exists(staging):
+                    os.remove(staging)
+            self.logger.error(f"Trade archive failed, live trades kept: {e}", exc_info=True)
+            return 0
+        finally:
+            conn.close()
+        self.logger.info("-------------------------------------------------")
+        self.logger.info(f"Archived {len(rows)} closed trade(s) before {cutoff} into {len(written)} partition(s).")
+        return len(rows)
+
+    def _merge(self, path, data):
+        """A partition's existing columns plus `data`, one row per ticket, ordered by close time."""
+        if os.path.exists(path):
+            with np.load(path) as existing:
+                old = {column: existing[column] for column in COLUMNS}
+            keep = ~np.isin(old['ticket_id'], data['ticket_id'])
+            data = {column: np.concatenate([old[column][keep], data[column]]) for column in COLUMNS}
+        order = np.argsort(data['close_time'], kind='stable')
+        return {column: values[order] for column, values in data.items()}
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def columns(self, start=None, end=None, columns=None, symbol=None, magic=None, include_live=True):
+        """
+        Trades closed in [start, end) as {column: array}, ordered by close time. Only the
+        partitions of the months in range are opened, and only the requested columns (plus
+        those needed to filter) are decompressed.
+        """
+        import pandas as pd
+        start = pd.Timestamp(start).to_datetime64() if start is not None else None
+        end = pd.Timestamp(end).to_datetime64() if end is not None else None
+        wanted = list(columns or COLUMNS)
+        needed = list(dict.fromkeys(wanted + ['ticket_id', 'close_time']
+                                    + (['symbol'] if symbol is not None else [])
+                                    + (['magic_number'] if magic is not None else [])))
+        live = self._live(needed, start, end) if include_live else None
+        parts = []
+        last = pd.Timestamp(end - np.timedelta64(1, 'us')) if end is not None else None
+        for year, month, path in self.partitions(pd.Timestamp(start) if start is not None else None, last):
+            with np.load(path) as partition:
+                part = {column: partition[column] for column in needed}
+            if live is not None and len(live['ticket_id']):
+                # A trade archived by a run that failed before its delete committed is also still live
+                keep = ~np.isin(part['ticket_id'], live['ticket_id'])
+                part = {column: values[keep] for column, values in part.items()}
+            parts.append(part)
+        if live is not None:
+            parts.append(live)
+
+        data = {column: np.concatenate([part[column] for part in parts]) if parts else np.array([], dtype=COLUMNS[column])
+                for column in needed}
+        mask = np.ones(len(data['ticket_id']), dtype=bool)
+        if start is not None:
+            mask &= data['close_time'] >= start
+        if end is not None:
+            mask &= data['close_time'] < end
+        if symbol is not None:
+            mask &= data['symbol'] == symbol
+        if magic is not None:
+            mask &= data['magic_number'] == magic
+        order = np.argsort(data['close_time'][mask], kind='stable')
+        return {column: data[column][mask][order] for column in wanted}
+
+    def _live(self, columns, start, end):
+        sql = f'SELECT {", ".join(columns)} FROM closed_trade WHERE 1 = 1'
+        params = []
+        # Text bounds only narrow the scan; the exact range is applied on the parsed times
+        if start is not None:
+            sql += ' AND close_time >= ?'
+            params.append(str(start - np.timedelta64(1, 'D')).replace('T', ' '))
+        if end is not None:
+            sql += ' AND close_time < ?'
+            params.append(str(end + np.timedelta64(1, 'D')).replace('T', ' '))
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            self.logger.error(f"Could not read live closed trades: {e}")
+            rows = []
+        finally:
+            conn.close()
+        return to_columns(rows, columns)
+
+    def read(self, start=None, end=None, columns=None, symbol=None, magic=None, include_live=True):
+        """Trades closed in [start, end) as a DataFrame; see columns()."""
+        import pandas as pd
+        return pd.DataFrame(self.columns(start, end, columns, symbol, magic, include_live))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive and read old closed trades.")
+    parser.add_argument('command', choices=['archive', 'read'])
+    parser.add_argument('--db', default='trades.db')
+    parser.add_argument('--dir', default='archive')
+    parser.add_argument('--days', type=int, default=90, help="archive trades closed more than this many days ago")
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--columns', nargs='+')
+    parser.add_argument('--symbol')
+    parser.add_argument('--magic', type=int)
+    args = parser.parse_args()
+
+    archive = TradeArchive(args.db, args.dir)
+    if args.command == 'archive':
+        print(f"{archive.archive(args.days)} trade(s) archived")
+    else:
+        print(archive.read(args.start, args.end, args.columns, args.symbol, args.magic).to_string())
+
+
+if __name__ == '__main__':
+    main()
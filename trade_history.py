@@ -0,0 +1,185 @@
+from mt5api import mt5
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+DEAL_COLUMNS = ('ticket', 'order', 'time', 'time_msc', 'type', 'entry', 'magic', 'position_id', 'reason',
+                'volume', 'price', 'commission', 'swap', 'profit', 'fee', 'symbol', 'comment')
+
+STAT_FIELDS = ('deals', 'trades', 'wins', 'losses', 'volume', 'realized', 'gross_profit', 'gross_loss',
+               'commission', 'swap', 'fee', 'r_sum', 'r_count')
+
+# Deals that take volume out of a position (MT5 DEAL_ENTRY_OUT, _INOUT, _OUT_BY)
+CLOSING_ENTRIES = (mt5.DEAL_ENTRY_OUT, getattr(mt5, 'DEAL_ENTRY_INOUT', 2), getattr(mt5, 'DEAL_ENTRY_OUT_BY', 3))
+
+
+class TradeHistory:
+    """
+    Broker deal history, synced incrementally into the local database.
+
+    sync() asks history_deals_get only for deals after the persisted cursor
+    (last deal time, plus the tickets already seen at that millisecond) and
+    stores them together with running aggregates per symbol and magic number:
+    realized PnL, wins/losses, average R and commission/swap/fee. Each new deal
+    updates its aggregate in O(1), so stats() never rescans the history.
+
+    A trade's outcome is taken per closing deal (profit + swap + commission + fee
+    of that deal); commission charged on entry counts towards the realized PnL
+    and the commission totals. R multiples need the position's initial risk in
+    account currency, which the bot records with record_risk() when it opens.
+    """
+
+    def __init__(self, mt5_connector, db_name='trades.db', logger=None):
+        self.mt5_connector = mt5_connector
+        self.db_name = db_name
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.cursor = (0, ())  # (time_msc, tickets seen at that millisecond)
+        self.stats_by_key = {}  # (symbol, magic) -> {field: value}
+        self.risks = {}  # position_id -> initial risk in account currency
+        self._create_tables()
+        self._load()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_name, timeout=30)
+
+    def _create_tables(self):
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS deals(ticket INTEGER PRIMARY KEY, "order" INTEGER, time INTEGER, '
+                         'time_msc INTEGER, type INTEGER, entry INTEGER, magic INTEGER, position_id INTEGER, '
+                         'reason INTEGER, volume REAL, price REAL, commission REAL, swap REAL, profit REAL, fee REAL, '
+                         'symbol TEXT, comment TEXT)')
+            conn.execute('CREATE INDEX IF NOT EXISTS deals_position ON deals(position_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS deal_stats(symbol TEXT, magic INTEGER, '
+                         + ', '.join(f'{field} REAL' for field in STAT_FIELDS) + ', PRIMARY KEY(symbol, magic))')
+            conn.execute('CREATE TABLE IF NOT EXISTS position_risk(position_id INTEGER PRIMARY KEY, risk REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS sync_state(name TEXT PRIMARY KEY, time_msc INTEGER, tickets TEXT)')
+
+    def _load(self):
+        """Restore the cursor, the aggregates and the recorded risks."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT time_msc, tickets FROM sync_state WHERE name = 'deals'").fetchone()
+            if row:
+                self.cursor = (row[0], tuple(int(t) for t in row[1].split(',') if t))
+            for row in conn.execute('SELECT symbol, magic, ' + ', '.join(STAT_FIELDS) + ' FROM deal_stats'):
+                self.stats_by_key[(row[0], row[1])] = dict(zip(STAT_FIELDS, row[2:]))
+            self.risks = dict(conn.execute('SELECT position_id, risk FROM position_risk'))
+        self.logger.info(f"Trade history loaded: {len(self.stats_by_key)} aggregate(s), cursor at {self.cursor[0]}.")
+
+    # ------------------------------------------------------------------
+    # Sync
+    # ------------------------------------------------------------------
+
+    def record_risk(self, position_id, risk):
+        """Initial risk (loss at the stop, account currency) of a position, for R multiples."""
+        if not risk or risk <= 0:
+            return
+        with self._lock:
+            self.risks[position_id] = risk
+            with self._connect() as conn:
+                conn.execute('INSERT OR REPLACE INTO position_risk(position_id, risk) VALUES (?, ?)', (position_id, risk))
+
+    def sync(self):
+        """Fetch and store the deals made since the last sync. Returns how many were new."""
+        with self._lock:
+            cursor_msc, seen = self.cursor
+            # history_deals_get works in whole seconds; the upper bound leaves room for the server's timezone
+            date_from = datetime.fromtimestamp(cursor_msc // 1000, tz=timezone.utc)
+            date_to = datetime.now(timezone.utc) + timedelta(days=2)
+            deals = self.mt5_connector.call('history_deals_get', date_from, date_to)
+            if deals is None:
+                self.logger.error(f"Failed to sync deal history: {self.mt5_connector.mt5.last_error()}")
+                return 0
+            seen = set(seen)
+            new = sorted((d for d in deals if d.time_msc > cursor_msc or (d.time_msc == cursor_msc and d.ticket not in seen)),
+                         key=lambda d: (d.time_msc, d.ticket))
+            if not new:
+                return 0
+
+            touched = set()
+            with self._connect() as conn:
+                # Stored first, so a close without magic finds an opening deal of the same batch
+                conn.executemany('INSERT OR IGNORE INTO deals VALUES (' + ', '.join('?' * len(DEAL_COLUMNS)) + ')',
+                                 [tuple(getattr(d, c) for c in DEAL_COLUMNS) for d in new])
+                for deal in new:
+                    touched.add(self._apply(conn, deal))
+                conn.executemany('INSERT OR REPLACE INTO deal_stats VALUES (?, ?, ' + ', '.join('?' * len(STAT_FIELDS)) + ')',
+                                 [(key[0], key[1], *(self.stats_by_key[key][f] for f in STAT_FIELDS))
+                                  for key in touched if key is not None])
+                last = new[-1].time_msc
+                tickets = [d.ticket for d in new if d.time_msc == last]
+                if last == cursor_msc:
+                    tickets += list(seen)
+                self.cursor = (last, tuple(tickets))
+                conn.execute("INSERT OR REPLACE INTO sync_state(name, time_msc, tickets) VALUES ('deals', ?, ?)",
+                             (last, ','.join(str(t) for t in tickets)))
+            self.logger.info(f"Synced {len(new)} new deal(s) from the broker.")
+            return len(new)
+
+    def _apply(self, conn, deal):
+        """Fold one deal into its aggregate; returns the aggregate's key (None for non-trade deals)."""
+        if deal.type not in (mt5.DEAL_TYPE_BUY, mt5.DEAL_TYPE_SELL):
+            return None  # Balance, credit, etc.
+        magic = deal.magic
+        if not magic and deal.entry != mt5.DEAL_ENTRY_IN:
+            # Closes done by the server or by hand may carry no magic; use the opening deal's
+            row = conn.execute('SELECT magic FROM deals WHERE position_id = ? AND entry = ? LIMIT 1',
+                               (deal.position_id, mt5.DEAL_ENTRY_IN)).fetchone()
+            magic = row[0] if row else 0
+        key = (deal.symbol, magic)
+        stats = self.stats_by_key.get(key)
+        if stats is None:
+            stats = self.stats_by_key[key] = dict.fromkeys(STAT_FIELDS, 0.0)
+        costs = deal.commission + deal.swap + deal.fee
+        stats['deals'] += 1
+        stats['commission'] += deal.commission
+        stats['swap'] += deal.swap
+        stats['fee'] += deal.fee
+        stats['realized'] += deal.profit + costs
+        if deal.entry in CLOSING_ENTRIES:
+            net = deal.profit + costs
+            stats['trades'] += 1
+            stats['volume'] += deal.volume
+            if net > 0:
+                stats['wins'] += 1
+                stats['gross_profit'] += net
+            else:
+                stats['losses'] += 1
+                stats['gross_loss'] += net
+            risk = self.risks.get(deal.position_id)
+            if risk:
+                stats['r_sum'] += net / risk
+                stats['r_count'] += 1
+        return key
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def stats(self, symbol=None, magic=None):
+        """Aggregates for a symbol and/or magic number (all trades by default), with derived ratios."""
+        with self._lock:
+            matching = [s for (sym, mag), s in self.stats_by_key.items()
+                        if (symbol is None or sym == symbol) and (magic is None or mag == magic)]
+            total = {field: sum(s[field] for s in matching) for field in STAT_FIELDS}
+        total['win_rate'] = total['wins'] / total['trades'] if total['trades'] else None
+        total['average_r'] = total['r_sum'] / total['r_count'] if total['r_count'] else None
+        total['profit_factor'] = total['gross_profit'] / -total['gross_loss'] if total['gross_loss'] else None
+        return total
+
+    def position_result(self, position_id):
+        """Close price, close time and net PnL of a position from its stored deals; None if it has no closing deal."""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT entry, time_msc, price, volume, profit + swap + commission + fee FROM deals '
+                                'WHERE position_id = ? ORDER BY time_msc', (position_id,)).fetchall()
+        closes = [row for row in rows if row[0] in CLOSING_ENTRIES]
+        if not closes:
+            return None
+        volume = sum(row[3] for row in closes)
+        return {
+            'close_price': sum(row[2] * row[3] for row in closes) / volume if volume else closes[-1][2],
+            'close_time': datetime.fromtimestamp(closes[-1][1] / 1000, tz=timezone.utc),
+            'profit_loss': sum(row[4] for row in rows),
+        }
@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from bars import BAR_FIELDS
+
+
+VERSION = 1
+
+
+class WarmStart:
+    """
+    State saved between runs so a start does not pull everything from the terminal
+    again: symbol specifications, the last `keep_bars` bars of every symbol and
+    timeframe, and the indicator cache.
+
+    The file is one .npz: the bars as one array per (symbol, timeframe, field) and
+    everything else as JSON. A saved file is only used by the same server and
+    account and while it is younger than `max_age` (a weekend by default); each
+    symbol's bars are then checked against the broker's history when they are
+    restored (BarAggregator.warm_start), so a stale file costs a cold seed and
+    never a wrong bar. Saved bars are handed out once; a bot rebuilt later seeds
+    from the terminal.
+    """
+
+    def __init__(self, path='warm_start.npz', keep_bars=2000, max_age=4 * 86400, logger=None):
+        self.path = path
+        self.keep_bars = keep_bars
+        self.max_age = max_age
+        self.logger = logger if logger else logging.getLogger(__name__)
+        self.specs = {}
+        self.indicators = []
+        self.bar_states = {}  # symbol -> BarAggregator.state() waiting for its bot
+
+    def save(self, identity, specs, bar_states, indicators=()):
+        """Write the state atomically; identity is what load() must be given to accept it (e.g. [server, login])."""
+        arrays = {}
+        forming = {}
+        for symbol, state in bar_states.items():
+            forming[symbol] = {}
+            for timeframe, entry in state.items():
+                forming[symbol][str(timeframe)] = entry['forming']
+                for field in BAR_FIELDS:
+                    arrays[f'{symbol}/{timeframe}/{field}'] = entry['bars'][field]
+        meta = {'version': VERSION, 'saved': time.time(), 'identity': identity, 'specs': specs,
+                'indicators': list(indicators), 'forming': forming}
+        arrays['meta'] = np.array(json.dumps(meta))
+        staging = self.path + '.tmp'
+        try:
+            with open(staging, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(staging, self.path)
+        except OSError as e:
+            self.logger.error(f"Could not save the warm start file {self.path}: {e}")
+            return False
+        self.logger.info(f"Warm start saved: {len(bar_states)} symbol(s), {len(specs)} spec(s), {len(meta['indicators'])} indicator value(s).")
+        return True
+
+    def load(self, identity):
+        """Read the saved state if it belongs to `identity` and is recent enough; False otherwise."""
+        self.specs, self.indicators, self.bar_states = {}, [], {}
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as data:
+                meta = json.loads(str(data['meta']))
+                arrays = {key: data[key] for key in data.files if key != 'meta'}
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.error(f"Could not read the warm start file {self.path}: {e}")
+            return False
+        age = time.time() - meta.get('saved', 0)
+        if meta.get('version') != VERSION or meta.get('identity') != identity:
+            self.logger.info(f"Warm start file {self.path} belongs to another account or version, starting cold.")
+            return False
+        if age > self.max_age:
+            self.logger.info(f"Warm start file {self.path} is {age / 3600:.1f}h old, starting cold.")
+            return False
+
+        for symbol, timeframes in meta['forming'].items():
+            self.bar_states[symbol] = {
+                int(timeframe): {'bars': {field: arrays[f'{symbol}/{timeframe}/{field}'] for field in BAR_FIELDS},
+                                 'forming': forming}
+                for timeframe, forming in timeframes.items()
+            }
+        self.specs = meta['specs']
+        self.indicators = meta['indicators']
+        self.logger.info(f"Warm start loaded ({age / 60:.0f} min old): {len(self.bar_states)} symbol(s), {len(self.specs)} spec(s).")
+        return True
+
+    def bars(self, symbol):
+        """The saved bars of `symbol` (taken once), or None."""
+        return self.bar_states.pop(symbol, None)